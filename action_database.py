@@ -3,6 +3,12 @@
 按舞蹈风格分类，包含丰富的动作词汇和维度描述
 """
 
+import heapq
+import random
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+from keyword_matcher import KeywordMatcher
+
 # 动作维度词汇
 ACTION_DIMENSIONS = {
     'level': ['high', 'mid', 'low', 'floor'],
@@ -144,6 +150,175 @@ DANCE_ACTION_DATABASE = {
     }
 }
 
+# 各类别的抽样权重（未列出的类别为1.0，全部为1.0时等价于均匀抽样）
+CATEGORY_WEIGHTS: Dict[str, float] = {}
+
+
+def _build_alias_table(weights: Sequence[float]) -> Tuple[List[float], List[int]]:
+    """Vose别名表：之后每次按权重抽样只需O(1)"""
+    n = len(weights)
+    total = float(sum(weights))
+    scaled = [w * n / total for w in weights]
+    prob = [1.0] * n
+    alias = list(range(n))
+    small = [i for i, p in enumerate(scaled) if p < 1.0]
+    large = [i for i, p in enumerate(scaled) if p >= 1.0]
+    while small and large:
+        less, more = small.pop(), large.pop()
+        prob[less] = scaled[less]
+        alias[less] = more
+        scaled[more] -= 1.0 - scaled[less]
+        (small if scaled[more] < 1.0 else large).append(more)
+    return prob, alias
+
+
+class _Pool:
+    """一组动作ID及其别名表"""
+
+    def __init__(self, ids: Sequence[int], weights: Sequence[float]):
+        self.ids = tuple(ids)
+        self.weights = tuple(weights)
+        self.members = frozenset(self.ids)
+        self.uniform = len(set(self.weights)) <= 1
+        self.prob, self.alias = _build_alias_table(self.weights) if self.ids else ([], [])
+
+    def draw(self) -> int:
+        i = random.randrange(len(self.ids))
+        return self.ids[i] if random.random() < self.prob[i] else self.ids[self.alias[i]]
+
+    def sample(self, k: int, excluded: FrozenSet[int]) -> List[int]:
+        """
+        按权重无放回抽取k个不在excluded中的ID
+
+        均匀权重时多抽取与池重叠的排除数量再过滤（对称性保证结果仍是均匀的）；
+        加权且可用动作远多于k时用别名表拒绝抽样，期望O(k)；否则退回对过滤后列表的一次线性抽样。
+        """
+        overlap = len(excluded & self.members) if excluded else 0
+        available = len(self.ids) - overlap
+        k = min(k, available)
+        if k <= 0:
+            return []
+        if self.uniform:
+            picked = random.sample(self.ids, k + overlap)
+            return [move_id for move_id in picked if move_id not in excluded][:k] if overlap else picked
+        if 2 * k <= available and 2 * available >= len(self.ids):
+            chosen: List[int] = []
+            seen = set()
+            while len(chosen) < k:
+                move_id = self.draw()
+                if move_id not in seen and move_id not in excluded:
+                    seen.add(move_id)
+                    chosen.append(move_id)
+            return chosen
+        candidates = [(move_id, w) for move_id, w in zip(self.ids, self.weights) if move_id not in excluded]
+        # Efraimidis-Spirakis：key = u^(1/w)，取最大的k个
+        return [move_id for _, move_id in heapq.nlargest(
+            k, ((random.random() ** (1.0 / w), move_id) for move_id, w in candidates))]
+
+
+class ActionIndex:
+    """动作词库索引，导入时构建一次
+
+    - 动作名称驻留为整数ID（names[ID] / ids[名称]），跨风格和类别的同名动作共用一个ID
+    - 每个风格、每个 (风格, 类别) 的ID数组，以及本风格之外的补充池
+    - 需避免动作转换为ID的frozenset，按集合判断排除
+    - 每个池带别名表（加权时使用），候选抽样的期望开销为O(k + 排除数)，与词库大小无关
+    """
+
+    def __init__(self, database: Dict[str, Dict[str, List[str]]],
+                 category_weights: Optional[Dict[str, float]] = None):
+        category_weights = category_weights or {}
+        self.names: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self.default_style = next(iter(database))
+        self.category_ids: Dict[Tuple[str, str], Tuple[int, ...]] = {}
+        self._style_pools: Dict[str, _Pool] = {}
+        self._other_pools: Dict[str, _Pool] = {}
+
+        move_weights: Dict[int, float] = {}
+        for style, categories in database.items():
+            style_weights: Dict[int, float] = {}
+            for category, actions in categories.items():
+                weight = float(category_weights.get(category, 1.0))
+                ids = tuple(self.intern(action) for action in actions)
+                self.category_ids[(style, category)] = ids
+                for move_id in ids:
+                    # 同一动作出现在多个类别中时取最大权重，只计一次
+                    style_weights[move_id] = max(style_weights.get(move_id, 0.0), weight)
+            self._style_pools[style] = _Pool(list(style_weights), list(style_weights.values()))
+            for move_id, weight in style_weights.items():
+                move_weights[move_id] = max(move_weights.get(move_id, 0.0), weight)
+
+        for style, pool in self._style_pools.items():
+            others = [move_id for move_id in move_weights if move_id not in pool.members]
+            self._other_pools[style] = _Pool(others, [move_weights[move_id] for move_id in others])
+
+    def intern(self, name: str) -> int:
+        """动作名称的ID（新名称分配新ID）"""
+        move_id = self.ids.get(name)
+        if move_id is None:
+            move_id = len(self.names)
+            self.ids[name] = move_id
+            self.names.append(name)
+        return move_id
+
+    def exclusion(self, actions: Optional[Iterable[str]]) -> FrozenSet[int]:
+        """需避免动作的ID集合，不在词库中的名称忽略"""
+        if not actions:
+            return frozenset()
+        if isinstance(actions, str):
+            actions = [actions]
+        return frozenset(self.ids[name] for name in actions if name in self.ids)
+
+    def style_moves(self, style: str) -> List[str]:
+        """风格的全部动作（去重，保持词库顺序）"""
+        return [self.names[move_id] for move_id in self._style_pools[style].ids]
+
+    def candidates(self, style: str, k: int, avoid_actions: Optional[Iterable[str]] = None) -> List[str]:
+        """
+        抽取候选动作
+
+        优先从本风格抽取；本风格可用动作不足k个时全部选入，再从其他风格补足，结果顺序随机。
+
+        Args:
+            style: 舞蹈风格，未知风格使用默认风格
+            k: 候选数量
+            avoid_actions: 需避免的动作（名称列表或 exclusion() 的结果）
+
+        Returns:
+            不重复的候选动作名称
+        """
+        if style not in self._style_pools:
+            style = self.default_style
+        excluded = avoid_actions if isinstance(avoid_actions, frozenset) else self.exclusion(avoid_actions)
+        chosen = self._style_pools[style].sample(k, excluded)
+        if len(chosen) < k:
+            chosen += self._other_pools[style].sample(k - len(chosen), excluded)
+            random.shuffle(chosen)
+        return [self.names[move_id] for move_id in chosen]
+
+
+ACTION_INDEX = ActionIndex(DANCE_ACTION_DATABASE, CATEGORY_WEIGHTS)
+
+# 动作分类关键词（动作名称包含关键词即属于该类，下划线与连字符等同，用于难度和能量评估）
+MOVE_KEYWORDS = {
+    'complex': ['windmill', 'headspin', 'flare', 'turtle', 'cricket', 'airflare'],
+    'rotation': ['spin', 'turn', 'jump', 'leap'],
+    'control': ['slide', 'freeze'],
+    'high_energy': ['jump', 'leap', 'bounce', 'pop', 'hit', 'punch'],
+    'explosive': ['explosive'],
+    'medium_energy': ['run', 'fast', 'quick'],
+    'dynamic': ['dynamic'],
+    'complex_transition': ['full-turn', 'spin', 'level-drop', 'travel-diagonal'],
+    'air_transition': ['air-step']
+}
+
+# 同义词词根和动作分类各编译为一个匹配器
+SYNONYM_MATCHER = KeywordMatcher({key: [key] for key in SYNONYMS})
+_SYNONYM_ORDER = {key: order for order, key in enumerate(SYNONYMS)}
+MOVE_MATCHER = KeywordMatcher(MOVE_KEYWORDS)
+
+
 def get_action_candidates(style, num_candidates=12, avoid_actions=None):
     """
     根据舞蹈风格获取候选动作
@@ -154,34 +329,9 @@ def get_action_candidates(style, num_candidates=12, avoid_actions=None):
         avoid_actions: 需要避免的动作列表
     
     Returns:
-        候选动作列表
+        候选动作列表（不重复）
     """
-    if avoid_actions is None:
-        avoid_actions = []
-    
-    if style not in DANCE_ACTION_DATABASE:
-        style = 'Hip-Hop'  # 默认风格
-    
-    style_actions = DANCE_ACTION_DATABASE[style]
-    all_actions = []
-    
-    # 收集所有动作
-    for category, actions in style_actions.items():
-        all_actions.extend(actions)
-    
-    # 过滤掉需要避免的动作
-    available_actions = [action for action in all_actions if action not in avoid_actions]
-    
-    # 如果可用动作不足，从其他风格补充
-    if len(available_actions) < num_candidates:
-        for other_style, other_actions in DANCE_ACTION_DATABASE.items():
-            if other_style != style:
-                for category, actions in other_actions.items():
-                    available_actions.extend([action for action in actions if action not in avoid_actions])
-    
-    # 随机选择候选动作
-    import random
-    return random.sample(available_actions, min(num_candidates, len(available_actions)))
+    return ACTION_INDEX.candidates(style, num_candidates, avoid_actions)
 
 def get_synonym_replacement(word):
     """
@@ -193,13 +343,27 @@ def get_synonym_replacement(word):
     Returns:
         同义词或原词
     """
-    import random
+    return replace_synonyms([word])[0]
+
+def replace_synonyms(moves):
+    """
+    对一组动作做同义词替换（一次扫描）
     
-    for key, synonyms in SYNONYMS.items():
-        if key in word.lower():
-            return word.lower().replace(key, random.choice(synonyms))
+    每个动作按 SYNONYMS 的顺序取第一个包含的词根替换为随机同义词，不含词根的动作保持原样。
     
-    return word
+    Args:
+        moves: 动作列表
+    
+    Returns:
+        替换后的动作列表
+    """
+    result = []
+    for move, keys in zip(moves, SYNONYM_MATCHER.matches(moves)):
+        if keys:
+            key = min(keys, key=_SYNONYM_ORDER.__getitem__)
+            move = move.lower().replace(key, random.choice(SYNONYMS[key]))
+        result.append(move)
+    return result
 
 def get_action_dimensions():
     """
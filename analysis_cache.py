@@ -0,0 +1,254 @@
+"""
+音频分析结果磁盘缓存
+以解码后音频内容的哈希加分析器配置指纹为键，
+标量特征存为JSON、数组存为.npz，按总大小做LRU淘汰，
+多个Streamlit工作进程可以安全地并发读写
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows没有fcntl，退化为无锁淘汰
+    fcntl = None
+
+RESULT_FILE = 'result.json'
+ARRAYS_FILE = 'arrays.npz'
+ARRAY_MARKER = '__ndarray__'
+# 写入中的临时目录（.tmp-*）超过该时长仍未改名，视为崩溃残留
+STALE_TMP_SECONDS = 3600.0
+
+
+def _split_arrays(obj: Any, arrays: Dict[str, np.ndarray]) -> Any:
+    """把结果中的numpy数组替换为占位符，并把numpy标量转换为Python类型"""
+    if isinstance(obj, np.ndarray):
+        name = f"a{len(arrays)}"
+        arrays[name] = obj
+        return {ARRAY_MARKER: name}
+    if isinstance(obj, dict):
+        return {key: _split_arrays(value, arrays) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_split_arrays(value, arrays) for value in obj]
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+def _join_arrays(obj: Any, arrays) -> Any:
+    """把占位符还原为numpy数组"""
+    if isinstance(obj, dict):
+        if set(obj) == {ARRAY_MARKER}:
+            return arrays[obj[ARRAY_MARKER]]
+        return {key: _join_arrays(value, arrays) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [_join_arrays(value, arrays) for value in obj]
+    return obj
+
+
+def _dir_size(path: str) -> int:
+    """目录中文件的总字节数"""
+    total = 0
+    for name in os.listdir(path):
+        try:
+            total += os.path.getsize(os.path.join(path, name))
+        except OSError:
+            pass
+    return total
+
+
+class AnalysisCache:
+    """内容寻址的分析结果缓存
+
+    每个条目是缓存目录下以键命名的子目录，写入时先写临时目录再原子重命名，
+    因此读者只会看到完整的条目；条目目录的mtime即LRU访问时间。
+    进程崩溃留下的 .tmp-* / .evict-* 目录计入总大小，并在淘汰时清理。
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024 * 1024,
+                 stale_seconds: float = STALE_TMP_SECONDS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.stale_seconds = stale_seconds
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock_path = os.path.join(self.cache_dir, '.lock')
+
+    @staticmethod
+    def make_key(y: np.ndarray, sr: int, fingerprint: Dict) -> str:
+        """
+        生成缓存键
+
+        Args:
+            y: 解码后的音频数据
+            sr: 采样率
+            fingerprint: 分析器配置指纹（采样率、帧移、启用的后端、代码版本等）
+
+        Returns:
+            十六进制SHA-256键
+        """
+        digest = hashlib.sha256()
+        audio = np.ascontiguousarray(y)
+        digest.update(f"{audio.dtype.str}|{audio.shape}|{sr}|".encode())
+        digest.update(audio.tobytes())
+        digest.update(json.dumps(fingerprint, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_file_key(file_path: str, fingerprint: Dict, chunk_size: int = 1 << 20) -> str:
+        """
+        按文件字节分块生成缓存键，用于不把整条音轨解码进内存的流式模式
+
+        Args:
+            file_path: 音频文件路径
+            fingerprint: 分析器配置指纹
+            chunk_size: 每次读取的字节数
+
+        Returns:
+            十六进制SHA-256键
+        """
+        digest = hashlib.sha256(b"file|")
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        digest.update(json.dumps(fingerprint, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    @contextmanager
+    def _locked(self):
+        """跨进程互斥锁，只用于淘汰"""
+        with open(self._lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        读取缓存条目
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            命中时返回分析结果，未命中或条目损坏时返回None
+        """
+        entry = self._entry_path(key)
+        try:
+            with open(os.path.join(entry, RESULT_FILE), 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+            arrays_path = os.path.join(entry, ARRAYS_FILE)
+            if os.path.exists(arrays_path):
+                with np.load(arrays_path, allow_pickle=False) as npz:
+                    arrays = {name: npz[name] for name in npz.files}
+            else:
+                arrays = {}
+            result = _join_arrays(payload, arrays)
+            # 更新访问时间用于LRU
+            os.utime(entry, None)
+            return result
+        except FileNotFoundError:
+            # 条目不存在或正被淘汰；目录在但文件缺失的残缺条目删除，之后可以重新写入
+            if os.path.isdir(entry) and not os.path.exists(os.path.join(entry, RESULT_FILE)):
+                self._discard(entry)
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ 分析缓存条目损坏，已删除: {e}")
+            self._discard(entry)
+            return None
+
+    def put(self, key: str, result: Dict) -> None:
+        """
+        写入缓存条目
+
+        Args:
+            key: 缓存键
+            result: comprehensive_analysis 的结果
+        """
+        entry = self._entry_path(key)
+        if os.path.exists(entry):
+            return
+
+        arrays: Dict[str, np.ndarray] = {}
+        payload = _split_arrays(result, arrays)
+
+        tmp_dir = tempfile.mkdtemp(prefix='.tmp-', dir=self.cache_dir)
+        try:
+            with open(os.path.join(tmp_dir, RESULT_FILE), 'w', encoding='utf-8') as f:
+                json.dump(payload, f, ensure_ascii=False)
+            if arrays:
+                np.savez(os.path.join(tmp_dir, ARRAYS_FILE), **arrays)
+            try:
+                os.rename(tmp_dir, entry)
+            except OSError:
+                # 其他进程已经写入了同一个键
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                return
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        self._evict()
+
+    def _discard(self, path: str) -> bool:
+        """先原子改名再删除条目，避免读者看到半删除的条目"""
+        doomed = os.path.join(self.cache_dir, f".evict-{os.path.basename(path)}-{time.time_ns()}")
+        try:
+            os.rename(path, doomed)
+        except OSError:
+            return False
+        shutil.rmtree(doomed, ignore_errors=True)
+        return True
+
+    def _evict(self) -> None:
+        """清理崩溃残留的临时目录，再按LRU淘汰条目直到总大小不超过上限"""
+        with self._locked():
+            entries = []
+            total = 0
+            now = time.time()
+            for name in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, name)
+                if not os.path.isdir(path):
+                    continue
+                try:
+                    size = _dir_size(path)
+                    mtime = os.path.getmtime(path)
+                except OSError:
+                    continue
+                if name.startswith('.'):
+                    # .evict-* 只会被删除，残留的直接清理；.tmp-* 可能仍在写入，超过宽限时间才清理
+                    if name.startswith('.evict-') or now - mtime > self.stale_seconds:
+                        shutil.rmtree(path, ignore_errors=True)
+                    else:
+                        total += size
+                    continue
+                entries.append((mtime, path, size))
+                total += size
+
+            entries.sort()
+            for mtime, path, size in entries:
+                if total <= self.max_bytes:
+                    break
+                if self._discard(path):
+                    total -= size
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._locked():
+            for name in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
@@ -3,19 +3,25 @@ import os
 import json
 import tempfile
 import base64
-# 自动选择生成器版本
-try:
-    # 尝试导入专业版本（需要高级库）
-    from enhanced_choreography_generator_pro import EnhancedChoreographyGeneratorPro
-    GENERATOR_CLASS = EnhancedChoreographyGeneratorPro
+import capabilities
+# 生成器始终是专业版（其高级库导入都有保护），第一次生成时才导入；
+# 能力注册表只决定加载哪些高级分析后端，以及侧边栏显示的模式
+if any(capabilities.available_backends().values()):
     GENERATION_MODE = "professional_enhanced"
-    print("🎭 使用专业版编舞生成器（支持madmom、essentia、musicnn）")
-except ImportError as e:
-    # 回退到兼容版本
-    from streamlit_cloud_choreography_generator import StreamlitCloudChoreographyGenerator
-    GENERATOR_CLASS = StreamlitCloudChoreographyGenerator
+else:
     GENERATION_MODE = "enhanced_compatible"
-    print(f"🔄 使用兼容版编舞生成器（{e}）")
+
+def get_generator_class():
+    """延迟导入专业版生成器类，导入失败时才回退到兼容版本"""
+    try:
+        from enhanced_choreography_generator_pro import EnhancedChoreographyGeneratorPro
+        backends = [name for name, available in capabilities.available_backends().items() if available]
+        print(f"🎭 使用专业版编舞生成器（高级后端: {', '.join(backends) or '无，使用librosa'}）")
+        return EnhancedChoreographyGeneratorPro
+    except ImportError as e:
+        from streamlit_cloud_choreography_generator import StreamlitCloudChoreographyGenerator
+        print(f"🔄 使用兼容版编舞生成器（{e}）")
+        return StreamlitCloudChoreographyGenerator
 import config
 from dance_references import get_youtube_search_url, get_video_search_suggestions
 from language_config import get_text, language_selector, init_language
@@ -133,15 +139,28 @@ with tab1:
                     # 显示进度
                     progress_bar = st.progress(0)
                     status_text = st.empty()
+                    live_segments = st.empty()
+                    live_container = live_segments.container()
                     
                     # 初始化生成器（自动选择版本）
-                    generator = GENERATOR_CLASS()
+                    generator = get_generator_class()()
+                    
+                    # 每个片段生成后立即显示，不必等待整首歌完成
+                    def show_segment(index, segment):
+                        status_text.text(f"{get_text('generating', language)} {get_text('segment', language)} {index + 1}")
+                        moves = segment.get('moves') or segment.get('dance_elements') or []
+                        live_container.markdown(
+                            f"**{get_text('segment', language)} {index + 1}** {segment.get('time', '')}: "
+                            f"{', '.join(str(move) for move in moves)}"
+                        )
                     
                     # 生成编舞
                     status_text.text(get_text('analyzing', language))
                     progress_bar.progress(20)
                     
-                    result = generator.generate_choreography_from_file(tmp_file_path)
+                    result = generator.generate_choreography_from_file(tmp_file_path, on_segment=show_segment,
+                                                                 deadline=config.APP_LLM_DEADLINE)
+                    live_segments.empty()
                     
                     status_text.text(get_text('generating', language))
                     progress_bar.progress(80)
@@ -0,0 +1,109 @@
+"""
+单次STFT特征库
+每条音轨只计算一次幅度/功率谱，所有频谱特征都从同一组矩阵派生，
+供整体特征、情绪、风格和片段分析共享
+"""
+
+import librosa
+import numpy as np
+from functools import cached_property
+from onset_layer import OnsetLayer
+
+
+class AudioFeatureBank:
+    """按音轨缓存的帧级特征库
+
+    所有属性在第一次访问时计算并缓存，之后的访问直接返回同一个矩阵。
+    """
+
+    def __init__(self, y: np.ndarray, sr: int, n_fft: int = 2048,
+                 hop_length: int = 512, n_mfcc: int = 13):
+        self.y = y
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.n_mfcc = n_mfcc
+
+    @property
+    def duration(self) -> float:
+        """音频时长（秒）"""
+        return len(self.y) / self.sr
+
+    @property
+    def n_frames(self) -> int:
+        """帧数"""
+        return self.magnitude.shape[1]
+
+    @cached_property
+    def magnitude(self) -> np.ndarray:
+        """幅度谱 |STFT|，整条音轨唯一的一次STFT"""
+        return np.abs(librosa.stft(self.y, n_fft=self.n_fft, hop_length=self.hop_length))
+
+    @cached_property
+    def power(self) -> np.ndarray:
+        """功率谱"""
+        return self.magnitude ** 2
+
+    @cached_property
+    def mel(self) -> np.ndarray:
+        """Mel功率谱"""
+        return librosa.feature.melspectrogram(S=self.power, sr=self.sr)
+
+    @cached_property
+    def onset(self) -> OnsetLayer:
+        """起音层（起音包络、速度图、节拍同步峰值），每条音轨只计算一次"""
+        return OnsetLayer(self)
+
+    @cached_property
+    def spectral_centroid(self) -> np.ndarray:
+        """频谱重心（逐帧）"""
+        return librosa.feature.spectral_centroid(
+            S=self.magnitude, sr=self.sr, n_fft=self.n_fft, hop_length=self.hop_length)[0]
+
+    @cached_property
+    def spectral_rolloff(self) -> np.ndarray:
+        """频谱滚降（逐帧）"""
+        return librosa.feature.spectral_rolloff(
+            S=self.magnitude, sr=self.sr, n_fft=self.n_fft, hop_length=self.hop_length)[0]
+
+    @cached_property
+    def spectral_bandwidth(self) -> np.ndarray:
+        """频谱带宽（逐帧）"""
+        return librosa.feature.spectral_bandwidth(
+            S=self.magnitude, sr=self.sr, n_fft=self.n_fft, hop_length=self.hop_length)[0]
+
+    @cached_property
+    def mfcc(self) -> np.ndarray:
+        """MFCC矩阵 (n_mfcc, n_frames)"""
+        return librosa.feature.mfcc(S=librosa.power_to_db(self.mel), n_mfcc=self.n_mfcc)
+
+    @cached_property
+    def rms(self) -> np.ndarray:
+        """RMS能量（逐帧）"""
+        return librosa.feature.rms(S=self.magnitude, frame_length=self.n_fft,
+                                   hop_length=self.hop_length)[0]
+
+    @cached_property
+    def chroma(self) -> np.ndarray:
+        """色度特征 (12, n_frames)"""
+        return librosa.feature.chroma_stft(S=self.power, sr=self.sr, n_fft=self.n_fft,
+                                           hop_length=self.hop_length)
+
+    @cached_property
+    def tonnetz(self) -> np.ndarray:
+        """调性网络特征，由色度特征派生"""
+        return librosa.feature.tonnetz(sr=self.sr, chroma=self.chroma)
+
+    @cached_property
+    def zero_crossing_rate(self) -> np.ndarray:
+        """过零率（逐帧，时域计算）"""
+        return librosa.feature.zero_crossing_rate(
+            self.y, frame_length=self.n_fft, hop_length=self.hop_length)[0]
+
+    def frame_slice(self, start_time: float, end_time: float) -> slice:
+        """把时间区间映射为帧区间，至少包含一帧"""
+        start = int(librosa.time_to_frames(start_time, sr=self.sr, hop_length=self.hop_length))
+        end = int(librosa.time_to_frames(end_time, sr=self.sr, hop_length=self.hop_length))
+        start = min(max(start, 0), self.n_frames - 1)
+        end = min(max(end, start + 1), self.n_frames)
+        return slice(start, end)
@@ -1,7 +1,10 @@
 import librosa
 import numpy as np
-from typing import Tuple, List
+from typing import Tuple, List, Optional
 import config
+from audio_feature_bank import AudioFeatureBank
+from streaming_audio import stream_feature_bank
+from local_tempo import estimate_local_tempo
 
 class AudioProcessor:
     """音频处理类，负责BPM检测和节拍分割"""
@@ -28,39 +31,42 @@ class AudioProcessor:
         except Exception as e:
             raise Exception(f"无法加载音频文件: {e}")
     
-    def detect_bpm_and_beats(self, audio_data: np.ndarray) -> Tuple[float, np.ndarray]:
+    def detect_bpm_and_beats(self, audio_data: Optional[np.ndarray],
+                             bank: Optional[AudioFeatureBank] = None) -> Tuple[float, np.ndarray]:
         """
         检测BPM和节拍点
         
         Args:
-            audio_data: 音频数据
+            audio_data: 音频数据（提供bank时可为None）
+            bank: 可选的共享特征库，节拍跟踪复用其缓存的起音包络
             
         Returns:
             bpm: 每分钟节拍数
             beat_times: 节拍时间点数组
         """
+        if bank is None:
+            bank = self.build_feature_bank(audio_data)
+        
         # 使用librosa检测节拍
-        tempo, beats = librosa.beat.beat_track(
-            y=audio_data, 
-            sr=self.sample_rate,
-            hop_length=self.hop_length
-        )
+        tempo, beats = bank.onset.track_beats()
         
         # 将节拍帧转换为时间
         beat_times = librosa.frames_to_time(beats, sr=self.sample_rate, hop_length=self.hop_length)
         
         return float(tempo), beat_times
     
-    def segment_into_8beats(self, beat_times: np.ndarray, bpm: float) -> List[dict]:
+    def segment_into_8beats(self, beat_times: np.ndarray, bpm: float,
+                            onset_envelope: Optional[np.ndarray] = None) -> List[dict]:
         """
         将音乐分割成8拍片段
         
         Args:
             beat_times: 节拍时间点数组
             bpm: 每分钟节拍数
+            onset_envelope: 可选的起音强度包络，用于局部速度加权
             
         Returns:
-            segments: 8拍片段列表，每个片段包含开始时间、结束时间和节拍数
+            segments: 8拍片段列表，每个片段包含开始时间、结束时间、节拍数和局部速度
         """
         segments = []
         beats_per_second = bpm / 60.0
@@ -90,22 +96,60 @@ class AudioProcessor:
             current_time = end_time
             segment_index += 1
         
+        # 局部速度直接来自整轨节拍网格
+        local_tempo = estimate_local_tempo(beat_times, segments, onset_envelope=onset_envelope,
+                                           sr=self.sample_rate, hop_length=self.hop_length)
+        for segment, tempo_info in zip(segments, local_tempo['segments']):
+            segment['tempo'] = tempo_info['tempo']
+            segment['tempo_drift'] = tempo_info['tempo_drift']
+        
         return segments
     
-    def analyze_audio_features(self, audio_data: np.ndarray) -> dict:
+    def build_feature_bank(self, audio_data: np.ndarray) -> AudioFeatureBank:
         """
-        分析音频特征
+        创建共享的STFT特征库
         
         Args:
             audio_data: 音频数据
             
+        Returns:
+            bank: 整条音轨只做一次STFT的特征库
+        """
+        return AudioFeatureBank(audio_data, self.sample_rate,
+                                n_fft=self.frame_length, hop_length=self.hop_length)
+    
+    def stream_feature_bank(self, file_path: str) -> AudioFeatureBank:
+        """
+        分块解码音频文件并增量创建特征库，用于长时间的混音
+        
+        Args:
+            file_path: 音频文件路径
+            
+        Returns:
+            bank: 只包含帧级特征和起音包络的特征库，内存占用与音轨长度无关
+        """
+        return stream_feature_bank(file_path, sample_rate=self.sample_rate,
+                                   n_fft=self.frame_length, hop_length=self.hop_length)
+    
+    def analyze_audio_features(self, audio_data: Optional[np.ndarray],
+                               bank: Optional[AudioFeatureBank] = None) -> dict:
+        """
+        分析音频特征
+        
+        Args:
+            audio_data: 音频数据（提供bank时可为None）
+            bank: 可选的共享特征库，未提供时自动创建
+            
         Returns:
             features: 音频特征字典
         """
-        # 提取音频特征
-        spectral_centroids = librosa.feature.spectral_centroid(y=audio_data, sr=self.sample_rate)[0]
-        spectral_rolloff = librosa.feature.spectral_rolloff(y=audio_data, sr=self.sample_rate)[0]
-        mfccs = librosa.feature.mfcc(y=audio_data, sr=self.sample_rate, n_mfcc=13)
+        if bank is None:
+            bank = self.build_feature_bank(audio_data)
+        
+        # 提取音频特征（同一次STFT派生）
+        spectral_centroids = bank.spectral_centroid
+        spectral_rolloff = bank.spectral_rolloff
+        mfccs = bank.mfcc
         
         # 计算统计特征
         features = {
@@ -114,7 +158,8 @@ class AudioProcessor:
             'spectral_rolloff_mean': float(np.mean(spectral_rolloff)),
             'spectral_rolloff_std': float(np.std(spectral_rolloff)),
             'mfcc_mean': [float(np.mean(mfcc)) for mfcc in mfccs],
-            'energy_mean': float(np.mean(librosa.feature.rms(y=audio_data)[0]))
+            'chroma_mean': [float(x) for x in np.mean(bank.chroma, axis=1)],
+            'energy_mean': float(np.mean(bank.rms))
         }
         
         return features
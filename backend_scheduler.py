@@ -0,0 +1,177 @@
+"""
+分析后端调度器
+在进程池中并发运行相互独立的分析后端（madmom、essentia、musicnn），
+每个后端有独立的超时；失败或超时的后端返回默认结果，其余结果照常收集。
+进程池在进程内共享并保持存活，工作进程里导入过的后端（TensorFlow等）在之后的分析中直接复用；
+只有后端超时（工作进程可能卡住）时才结束整个进程池，下次分析时重新创建。
+"""
+
+import atexit
+import multiprocessing
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import capabilities
+
+_shared_pool = None
+_shared_pool_size = 0
+_shared_pool_lock = threading.Lock()
+
+
+def _get_shared_pool(workers: int):
+    """获取至少有workers个工作进程的共享进程池"""
+    global _shared_pool, _shared_pool_size
+    with _shared_pool_lock:
+        if _shared_pool is not None and _shared_pool_size < workers:
+            # 不等待：正在使用旧进程池的调度仍持有引用，其任务完成后工作进程自行退出
+            _shared_pool.close()
+            _shared_pool = None
+        if _shared_pool is None:
+            _shared_pool = multiprocessing.Pool(processes=workers)
+            _shared_pool_size = workers
+        return _shared_pool
+
+
+def discard_shared_pool() -> None:
+    """强制结束共享进程池（有后端卡住时，或进程退出时）"""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is not None:
+            _shared_pool.terminate()
+            _shared_pool.join()
+            _shared_pool = None
+
+
+atexit.register(discard_shared_pool)
+
+
+def _run_in_worker(func: Callable, args: tuple):
+    """在工作进程中执行后端，连同本进程的后端导入记录一起返回"""
+    return func(*args), capabilities.import_records()
+
+
+class BackendScheduler:
+    """分析后端调度器
+
+    add() 登记后端，start() 把它们提交到共享进程池后立即返回，
+    调用方可以在主进程里继续做librosa分析，最后用 collect() 收集结果。
+    并行不可用时（或parallel=False）退化为在 collect() 中顺序执行，此时不强制超时。
+    后端的参数会被pickle发送到工作进程，只应传入该后端需要的数据。
+    """
+
+    def __init__(self, parallel: bool = True, max_workers: Optional[int] = None,
+                 default_timeout: float = 120.0):
+        self.parallel = parallel
+        self.max_workers = max_workers
+        self.default_timeout = default_timeout
+        self.tasks: Dict[str, Dict] = {}
+        self.status: Dict[str, Dict] = {}
+        self._pool = None
+        self._started_at = None
+
+    def add(self, name: str, func: Callable, *args, timeout: Optional[float] = None,
+            default: Any = None) -> None:
+        """
+        登记一个后端
+
+        Args:
+            name: 后端名称
+            func: 可pickle的可调用对象（模块级函数或绑定方法）
+            *args: 调用参数
+            timeout: 超时秒数，默认使用 default_timeout
+            default: 失败或超时时的结果
+        """
+        self.tasks[name] = {
+            'func': func,
+            'args': args,
+            'timeout': self.default_timeout if timeout is None else timeout,
+            'default': default,
+            'async_result': None
+        }
+
+    def start(self) -> None:
+        """把所有后端提交到进程池"""
+        self._started_at = time.time()
+        if not self.parallel or len(self.tasks) == 0:
+            return
+        # 后端数量很少，每个后端一个工作进程，避免卡住的后端让排队的后端一起超时
+        workers = self.max_workers or len(self.tasks)
+        try:
+            self._pool = _get_shared_pool(workers)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 无法创建进程池，后端改为顺序执行: {e}")
+            self._pool = None
+            return
+        for task in self.tasks.values():
+            task['async_result'] = self._pool.apply_async(_run_in_worker, (task['func'], task['args']))
+
+    def collect(self) -> Dict[str, Any]:
+        """
+        等待所有后端完成或超时
+
+        Returns:
+            {后端名称: 结果}，失败或超时的后端为其默认结果；
+            每个后端的状态和耗时记录在 self.status 中
+        """
+        if self._started_at is None:
+            self.start()
+
+        results = {}
+        timed_out = False
+        for name, task in self.tasks.items():
+            if self._pool is None:
+                results[name] = self._run_inline(name, task)
+                continue
+
+            deadline = self._started_at + task['timeout']
+            try:
+                results[name], records = task['async_result'].get(max(0.0, deadline - time.time()))
+                # 工作进程中的导入耗时和失败汇总到主进程的能力报告
+                capabilities.merge_import_records(records)
+                self.status[name] = {'state': 'ok', 'elapsed': time.time() - self._started_at}
+            except multiprocessing.TimeoutError:
+                print(f"⚠️ {name} 超时（{task['timeout']:.0f}秒），使用默认结果")
+                results[name] = task['default']
+                self.status[name] = {'state': 'timeout', 'elapsed': task['timeout']}
+                timed_out = True
+            except Exception as e:
+                print(f"⚠️ {name} 执行失败: {e}")
+                results[name] = task['default']
+                self.status[name] = {'state': 'failed', 'elapsed': time.time() - self._started_at}
+
+        self.shutdown(terminate=timed_out)
+        return results
+
+    def _run_inline(self, name: str, task: Dict) -> Any:
+        """在当前进程中执行后端"""
+        started = time.time()
+        try:
+            result = task['func'](*task['args'])
+            self.status[name] = {'state': 'ok', 'elapsed': time.time() - started}
+            return result
+        except Exception as e:
+            print(f"⚠️ {name} 执行失败: {e}")
+            self.status[name] = {'state': 'failed', 'elapsed': time.time() - started}
+            return task['default']
+
+    def shutdown(self, terminate: bool = False) -> None:
+        """
+        释放本次调度使用的进程池
+
+        共享进程池保持存活；terminate为True且仍有后端在运行（超时或收集中途出错）时，
+        强制结束整个共享进程池，避免卡住的工作进程占用后续的分析
+        """
+        if self._pool is None:
+            return
+        pending = any(task['async_result'] is not None and not task['async_result'].ready()
+                      for task in self.tasks.values())
+        if terminate and pending:
+            discard_shared_pool()
+        self._pool = None
+
+    def __enter__(self) -> 'BackendScheduler':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.shutdown(terminate=exc_type is not None)
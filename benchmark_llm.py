@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+LLM编舞生成压测脚本
+默认在进程内启动本地模拟服务（mock_openai_server），不消耗API配额；
+统计每次生成的耗时分位数和吞吐量。
+
+使用方法:
+    python benchmark_llm.py --runs 20 --concurrency 4 --segments 24 --latency lognormal:0.8,0.5
+    python benchmark_llm.py --base-url http://127.0.0.1:8765/v1   # 使用已启动的模拟服务
+    python benchmark_llm.py --mode structured --token-delay 0.01 --full-output   # 对比完整schema输出
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+
+import config
+from mock_openai_server import LatencyModel, MockChatBackend, MockOpenAIServer
+
+
+def create_segments(num_segments: int, bpm: float = 120.0) -> List[Dict]:
+    """创建8拍片段"""
+    length = 8 * 60.0 / bpm
+    return [{'start_time': i * length, 'end_time': (i + 1) * length, 'beat_count': 8,
+             'tempo': bpm, 'tempo_drift': 0.0} for i in range(num_segments)]
+
+
+def run_structured(segments: List[Dict], on_segment=None) -> None:
+    """结构化编舞（EnhancedLLMChoreographer）"""
+    from enhanced_llm_choreographer import EnhancedLLMChoreographer
+    EnhancedLLMChoreographer().generate_enhanced_choreography(
+        {'bpm': 120.0, 'energy_level': 'high'}, segments, 'Hip-Hop', cache_mode='off', on_segment=on_segment)
+
+
+def run_segments(segments: List[Dict], on_segment=None) -> None:
+    """逐片段编舞（LLMChoreographer）"""
+    from llm_choreographer import LLMChoreographer
+    choreographer = LLMChoreographer()
+    choreographer.cache_mode = 'off'
+    choreographer.generate_full_choreography(segments, 120.0, 'Hip-Hop', {'energy_mean': 0.3},
+                                             on_segment=on_segment)
+
+
+def benchmark(mode: str, runs: int, concurrency: int, num_segments: int) -> Dict:
+    """执行压测并返回统计结果"""
+    segments = create_segments(num_segments)
+    target = run_structured if mode == 'structured' else run_segments
+
+    def one_run(_):
+        started = time.perf_counter()
+        first = []
+        target(segments, on_segment=lambda index, segment: first or first.append(time.perf_counter() - started))
+        return time.perf_counter() - started, first[0] if first else None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(one_run, range(runs)))
+    wall = time.perf_counter() - started
+
+    latencies = np.array([total for total, _ in results])
+    first_segments = np.array([first for _, first in results if first is not None])
+    return {
+        'mode': mode,
+        'runs': runs,
+        'wall_seconds': wall,
+        'generations_per_second': runs / wall,
+        'segments_per_second': runs * num_segments / wall,
+        'latency_p50': float(np.percentile(latencies, 50)),
+        'latency_p95': float(np.percentile(latencies, 95)),
+        'latency_p99': float(np.percentile(latencies, 99)),
+        'first_segment_p50': float(np.percentile(first_segments, 50)) if len(first_segments) else None
+    }
+
+
+def print_report(stats: Dict) -> None:
+    print(f"\n📊 {stats['mode']}: {stats['runs']} 次生成，用时 {stats['wall_seconds']:.2f}s")
+    print(f"   吞吐量: {stats['generations_per_second']:.2f} 次/秒, {stats['segments_per_second']:.1f} 片段/秒")
+    print(f"   耗时: p50={stats['latency_p50']:.2f}s p95={stats['latency_p95']:.2f}s p99={stats['latency_p99']:.2f}s")
+    if stats['first_segment_p50'] is not None:
+        print(f"   首个片段: p50={stats['first_segment_p50']:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='LLM编舞生成压测')
+    parser.add_argument('--mode', choices=['structured', 'segments', 'both'], default='both')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, default=4, help='同时进行的生成数')
+    parser.add_argument('--segments', type=int, default=16, help='每次生成的8拍片段数')
+    parser.add_argument('--base-url', help='已运行的OpenAI兼容服务地址，不指定时启动进程内模拟服务')
+    parser.add_argument('--latency', default='lognormal:0.3,0.5', help='模拟服务的首字节延迟分布')
+    parser.add_argument('--token-delay', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--full-output', action='store_true', help='结构化编舞输出完整schema而不是紧凑编码')
+    args = parser.parse_args()
+    if args.full_output:
+        config.LLM_COMPACT_OUTPUT = False
+
+    server = None
+    if args.base_url:
+        config.OPENAI_BASE_URL = args.base_url
+    else:
+        backend = MockChatBackend(LatencyModel.parse(args.latency), args.token_delay, args.error_rate,
+                                  args.rate_limit_rate, retry_after=0.2, seed=args.seed)
+        server = MockOpenAIServer(backend).start()
+        config.OPENAI_BASE_URL = server.base_url
+        os.environ.setdefault('OPENAI_API_KEY', 'mock')
+    print(f"🧪 压测目标: {config.OPENAI_BASE_URL}")
+
+    try:
+        modes = ['structured', 'segments'] if args.mode == 'both' else [args.mode]
+        reports = [benchmark(mode, args.runs, args.concurrency, args.segments) for mode in modes]
+        for stats in reports:
+            print_report(stats)
+        if server is not None:
+            print(f"\n🧾 模拟服务请求统计: {server.backend.stats}")
+    finally:
+        if server is not None:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
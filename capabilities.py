@@ -0,0 +1,115 @@
+"""
+高级音频分析库能力注册表
+用 importlib.util.find_spec 低成本探测 madmom、essentia、musicnn 是否安装，
+真正的导入推迟到第一次使用，并记录每个后端的导入耗时；
+在分析进程池的工作进程中导入的后端，其记录由调度器带回主进程合并
+"""
+
+import importlib
+import importlib.util
+import time
+from typing import Dict, Optional
+
+# 后端名称 -> (探测用的顶层包, 实际导入的模块)
+BACKENDS = {
+    'madmom': ('madmom', 'madmom'),
+    'essentia': ('essentia', 'essentia.standard'),
+    'musicnn': ('musicnn', 'musicnn'),
+}
+
+_probed: Dict[str, bool] = {}
+_modules: Dict[str, object] = {}
+_import_seconds: Dict[str, float] = {}
+_import_errors: Dict[str, str] = {}
+# 工作进程中的导入耗时（由 merge_import_records 合并）
+_worker_import_seconds: Dict[str, float] = {}
+
+
+def is_available(name: str) -> bool:
+    """
+    后端是否可用，只查找模块规格而不导入
+
+    Args:
+        name: 后端名称（madmom / essentia / musicnn）
+
+    Returns:
+        已安装且没有导入失败过时为True
+    """
+    if name in _import_errors:
+        return False
+    if name not in _probed:
+        package = BACKENDS[name][0]
+        try:
+            _probed[name] = importlib.util.find_spec(package) is not None
+        except (ImportError, ValueError):
+            _probed[name] = False
+    return _probed[name]
+
+
+def load(name: str) -> Optional[object]:
+    """
+    第一次使用时导入后端模块
+
+    Args:
+        name: 后端名称
+
+    Returns:
+        导入的模块；未安装或导入失败时返回None，之后is_available也返回False
+    """
+    if name in _modules:
+        return _modules[name]
+    if not is_available(name):
+        return None
+
+    started = time.perf_counter()
+    try:
+        module = importlib.import_module(BACKENDS[name][1])
+    except Exception as e:
+        # 已安装但无法导入（例如TensorFlow版本不兼容）
+        _import_errors[name] = str(e)
+        print(f"⚠️ {name} 导入失败，使用替代方案: {e}")
+        return None
+    _import_seconds[name] = time.perf_counter() - started
+    _modules[name] = module
+    print(f"✅ {name} 已加载（{_import_seconds[name]:.2f}秒）")
+    return module
+
+
+def available_backends() -> Dict[str, bool]:
+    """所有后端的可用性"""
+    return {name: is_available(name) for name in BACKENDS}
+
+
+def import_records() -> Dict[str, Dict[str, object]]:
+    """本进程的导入记录（耗时和错误），工作进程用它把记录带回主进程"""
+    return {'seconds': dict(_import_seconds), 'errors': dict(_import_errors)}
+
+
+def merge_import_records(records: Dict[str, Dict[str, object]]) -> None:
+    """
+    合并工作进程的导入记录
+
+    工作进程中导入失败的后端在主进程中也标记为不可用，之后不再调度
+    """
+    _worker_import_seconds.update(records.get('seconds', {}))
+    for name, error in records.get('errors', {}).items():
+        _import_errors.setdefault(name, error)
+
+
+def report() -> Dict[str, Dict]:
+    """
+    后端状态报告
+
+    Returns:
+        {后端名称: {'available', 'loaded', 'loaded_in_worker', 'import_seconds', 'error'}}
+    """
+    return {
+        name: {
+            'available': is_available(name),
+            'loaded': name in _modules,
+            'loaded_in_worker': name in _worker_import_seconds,
+            'import_seconds': _import_seconds.get(name, _worker_import_seconds.get(name)),
+            'error': _import_errors.get(name)
+        }
+        for name in BACKENDS
+    }
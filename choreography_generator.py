@@ -1,8 +1,12 @@
 import os
 import json
-from typing import Dict, Any, Optional
+import random
+from typing import Dict, Any, Callable, Optional
 from audio_processor import AudioProcessor
+from streaming_audio import should_stream
 from llm_choreographer import LLMChoreographer
+from segment_aggregator import aggregate_segment_features
+from style_classifier import get_default_classifier, record_label
 import config
 
 class ChoreographyGenerator:
@@ -11,13 +15,21 @@ class ChoreographyGenerator:
     def __init__(self):
         self.audio_processor = AudioProcessor()
         self.llm_choreographer = LLMChoreographer()
+        # 本地风格分类器，置信度不足时才请求LLM推荐风格
+        self.style_classifier = get_default_classifier()
     
-    def generate_choreography_from_file(self, audio_file_path: str) -> Dict[str, Any]:
+    def generate_choreography_from_file(self, audio_file_path: str,
+                                        on_segment: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+                                        deadline: Optional[float] = None,
+                                        cache_mode: Optional[str] = None) -> Dict[str, Any]:
         """
         从音频文件生成编舞
         
         Args:
             audio_file_path: 音频文件路径
+            on_segment: 每个片段编舞完成时的回调 (片段序号, 片段编舞)
+            deadline: 编舞生成阶段的截止时间（秒），超时的片段使用默认结构
+            cache_mode: LLM响应缓存模式，'replay' 回放相同请求；None 使用 config.LLM_CACHE_MODE
             
         Returns:
             choreography_result: 编舞结果
@@ -26,46 +38,92 @@ class ChoreographyGenerator:
             raise FileNotFoundError(f"音频文件不存在: {audio_file_path}")
         
         print(f"开始处理音频文件: {audio_file_path}")
-        
-        # 1. 加载音频
-        audio_data, sample_rate = self.audio_processor.load_audio(audio_file_path)
-        print(f"音频加载完成，采样率: {sample_rate}Hz，时长: {len(audio_data)/sample_rate:.2f}秒")
-        
-        # 2. 检测BPM和节拍
-        bpm, beat_times = self.audio_processor.detect_bpm_and_beats(audio_data)
+        telemetry = self.llm_choreographer.start_telemetry()
+        
+        # 1. 加载音频（长音频分块流式解码，不保留完整信号）
+        if should_stream(audio_file_path):
+            audio_data = None
+            bank = self.audio_processor.stream_feature_bank(audio_file_path)
+            print("长音频使用流式分块分析")
+        else:
+            audio_data, _ = self.audio_processor.load_audio(audio_file_path)
+            bank = self.audio_processor.build_feature_bank(audio_data)
+        sample_rate = bank.sr
+        print(f"音频加载完成，采样率: {sample_rate}Hz，时长: {bank.duration:.2f}秒")
+        
+        # 2. 检测BPM和节拍（整条音轨共享一次STFT和一次起音检测）
+        bpm, beat_times = self.audio_processor.detect_bpm_and_beats(audio_data, bank)
         print(f"BPM检测完成: {bpm:.1f}，检测到{len(beat_times)}个节拍点")
         
         # 3. 分析音频特征
-        audio_features = self.audio_processor.analyze_audio_features(audio_data)
+        audio_features = self.audio_processor.analyze_audio_features(audio_data, bank)
         print("音频特征分析完成")
         
         # 4. 分割成8拍片段
-        segments = self.audio_processor.segment_into_8beats(beat_times, bpm)
+        segments = self.audio_processor.segment_into_8beats(beat_times, bpm, bank.onset.envelope)
+        # 每个片段的能量、亮度、复杂度和MFCC均值（用于片段索引的近邻查找）
+        for segment, stats in zip(segments, aggregate_segment_features(bank, segments)):
+            segment.update(stats)
         print(f"音乐分割完成，共{len(segments)}个8拍片段")
         
         # 5. 推荐舞蹈风格
-        dance_style = self.llm_choreographer.generate_choreography_style(bpm, audio_features)
+        style_classification = self.classify_style(bpm, audio_features, cache_mode)
+        dance_style = style_classification['style']
         print(f"推荐舞蹈风格: {dance_style}")
         
         # 6. 生成编舞
-        choreography = self.llm_choreographer.generate_full_choreography(segments, bpm, dance_style, audio_features)
+        choreography = self.llm_choreographer.generate_full_choreography(segments, bpm, dance_style, audio_features,
+                                                                   cache_mode=cache_mode, on_segment=on_segment,
+                                                                   deadline=deadline)
         
         # 7. 整理结果
         result = {
             "audio_info": {
                 "file_path": audio_file_path,
-                "duration": len(audio_data) / sample_rate,
+                "duration": bank.duration,
                 "sample_rate": sample_rate,
                 "bpm": bpm,
                 "total_beats": len(beat_times)
             },
             "audio_features": audio_features,
             "segments": segments,
-            "choreography": choreography
+            "choreography": choreography,
+            "style_classification": style_classification,
+            "llm_telemetry": telemetry.summary()
         }
         
         return result
     
+    def classify_style(self, bpm: float, audio_features: Dict[str, Any],
+                       cache_mode: Optional[str] = None) -> Dict[str, Any]:
+        """
+        推荐舞蹈风格：先用本地分类器
+        
+        只有拟合过的模型、置信度不低于 config.STYLE_CLASSIFIER_MIN_CONFIDENCE 时才跳过LLM；
+        其中按 config.STYLE_LABEL_AUDIT_RATE 抽样的一部分仍请求LLM，使置信区域也能得到标注样本。
+        
+        Returns:
+            {'style', 'confidence'（本地分类器的置信度）, 'local_style', 'source': 'local' | 'llm'}
+        """
+        local_style, confidence = None, 0.0
+        if self.style_classifier is not None:
+            local_style, confidence = self.style_classifier.predict(bpm, audio_features)
+            if not self.style_classifier.fitted:
+                print(f"🧭 本地风格模型尚未用样本拟合（参考: {local_style} {confidence:.2f}），请求LLM推荐")
+            elif confidence < config.STYLE_CLASSIFIER_MIN_CONFIDENCE:
+                print(f"🧭 本地风格分类置信度不足（{local_style} {confidence:.2f}），请求LLM推荐")
+            elif random.random() >= config.STYLE_LABEL_AUDIT_RATE:
+                print(f"🧭 本地风格分类: {local_style}（置信度 {confidence:.2f}），跳过LLM风格推荐")
+                return {'style': local_style, 'confidence': confidence, 'local_style': local_style,
+                        'source': 'local'}
+            else:
+                print(f"🧭 本地风格分类: {local_style}（置信度 {confidence:.2f}），抽样请求LLM核对")
+        
+        dance_style = self.llm_choreographer.generate_choreography_style(bpm, audio_features, cache_mode)
+        # LLM的选择作为标注样本，供重新拟合本地分类器
+        record_label(bpm, audio_features, dance_style)
+        return {'style': dance_style, 'confidence': confidence, 'local_style': local_style, 'source': 'llm'}
+    
     def save_choreography(self, choreography_result: Dict[str, Any], 
                          output_path: str) -> None:
         """
@@ -96,8 +154,16 @@ class ChoreographyGenerator:
         print(f"⏱️  时长: {audio_info['duration']:.2f}秒")
         print(f"🎶 BPM: {audio_info['bpm']:.1f}")
         print(f"💃 舞蹈风格: {choreography['dance_style']}")
+        style_classification = choreography_result.get("style_classification")
+        if style_classification:
+            source = "本地分类器" if style_classification['source'] == 'local' else "LLM"
+            print(f"🧭 风格来源: {source}（本地置信度 {style_classification['confidence']:.2f}）")
         print(f"📊 总片段数: {choreography['total_segments']}")
         print(f"📝 编舞总结: {choreography['summary']}")
+        telemetry = choreography_result.get("llm_telemetry")
+        if telemetry:
+            print(f"📈 LLM调用: {telemetry['calls']}次（缓存{telemetry['cached_calls']}次，重试{telemetry['retries']}次），"
+                  f"{telemetry['total_tokens']} tokens，约${telemetry['cost_usd']:.4f}")
         print("="*50)
         
         # 打印每个片段的动作
@@ -0,0 +1,163 @@
+"""
+结构化编舞的紧凑输出格式
+模型只输出短整数编码：枚举字段为 ACTION_DIMENSIONS 等词表中的位置，动作为按风格编号的动作ID，
+每个片段是一个定长数组；本地解码器再展开为原有的完整schema，大幅减少输出token。
+
+格式：
+    {"g":[能量,"情绪","特点",...],"segments":[[片段编号,重音,层次,平面,[动态...],[动作ID...],过渡],...]}
+"""
+
+from functools import lru_cache
+from typing import Dict, List, Sequence
+
+from action_database import ACTION_DIMENSIONS, ACTION_INDEX, DANCE_ACTION_DATABASE
+
+ENERGY_LEVELS = ['low', 'medium', 'high', 'very_high']
+ACCENTS = ['strong', 'medium', 'weak']
+LEVELS = ACTION_DIMENSIONS['level']
+PLANES = ACTION_DIMENSIONS['plane']
+MOTIFS = ACTION_DIMENSIONS['dynamics']
+# 词表中用下划线，输出的完整schema与备用方案一致使用连字符
+TRANSITIONS = [transition.replace('_', '-') for transition in ACTION_DIMENSIONS['transition']]
+
+ROW_FIELDS = ('idx', 'accent', 'level', 'plane', 'motifs', 'moves', 'transition')
+
+
+@lru_cache(maxsize=None)
+def move_table(style: str) -> List[str]:
+    """
+    风格的动作ID表
+
+    本风格的动作在前，其后依次是其他风格的动作（候选动作池可能从其他风格补充），
+    同名动作只出现一次；同一风格的ID在进程内和不同进程之间保持不变。
+    """
+    if style not in DANCE_ACTION_DATABASE:
+        style = 'Hip-Hop'
+    table = ACTION_INDEX.style_moves(style)
+    own = set(table)
+    return table + [name for name in ACTION_INDEX.names if name not in own]
+
+
+@lru_cache(maxsize=None)
+def move_ids(style: str) -> Dict[str, int]:
+    """动作名称到ID的映射"""
+    return {move: index for index, move in enumerate(move_table(style))}
+
+
+def format_candidates(style: str, candidates: Sequence[str]) -> str:
+    """候选动作池的 "ID=动作" 列表，不在ID表中的动作跳过"""
+    ids = move_ids(style)
+    return ', '.join(f"{ids[move]}={move}" for move in candidates if move in ids)
+
+
+def _codes(values: Sequence[str]) -> str:
+    return ' '.join(f"{code}={value}" for code, value in enumerate(values))
+
+
+def codebook_text() -> str:
+    """系统提示中的格式说明和编码表（与风格无关，可放在静态前缀中）"""
+    return f"""输出格式（紧凑编码的JSON，只输出JSON本身）：
+{{"g":[能量,"情绪","特点1","特点2"],"segments":[[片段编号,重音,层次,平面,[动态...],[动作ID...],过渡],...]}}
+编码表（数字即编码）：
+- 能量: {_codes(ENERGY_LEVELS)}
+- 重音: {_codes(ACCENTS)}
+- 层次: {_codes(LEVELS)}
+- 平面: {_codes(PLANES)}
+- 动态: {_codes(MOTIFS)}
+- 过渡: {_codes(TRANSITIONS)}
+- 动作ID: 使用候选动作池中 "ID=动作" 的ID
+
+示例：
+{{"g":[2,"aggressive and confident","bounce","isolation"],"segments":[[0,0,1,0,[2,3],[0,6,15,2],0],[1,1,2,1,[2,8],[1,9,24,3],6]]}}"""
+
+
+def _is_code(code) -> bool:
+    """整数编码（JSON中的 true/false 在Python里是bool，不算编码）"""
+    return isinstance(code, int) and not isinstance(code, bool)
+
+
+def _lookup(values: Sequence[str], code, field: str) -> str:
+    if not _is_code(code) or not 0 <= code < len(values):
+        raise ValueError(f"{field}编码无效: {code!r}")
+    return values[code]
+
+
+def decode_segment(row: Sequence, style: str, time: str) -> Dict:
+    """
+    把一个片段数组展开为完整schema的片段
+
+    Args:
+        row: [片段编号, 重音, 层次, 平面, [动态...], [动作ID...], 过渡]
+        style: 舞蹈风格（决定动作ID表）
+        time: 片段时间范围，由调用方根据片段起止时间给出
+
+    Returns:
+        完整schema的片段；无效的动态或动作编码会被跳过
+
+    Raises:
+        ValueError: 数组长度不对、枚举编码无效或没有有效动作
+    """
+    if not isinstance(row, list) or len(row) != len(ROW_FIELDS):
+        raise ValueError(f"片段数组应包含{len(ROW_FIELDS)}个元素: {row!r}")
+    idx, accent, level, plane, motifs, moves, transition = row
+    if not _is_code(idx) or not isinstance(motifs, list) or not isinstance(moves, list):
+        raise ValueError(f"片段数组格式无效: {row!r}")
+    table = move_table(style)
+    decoded_moves = [table[code] for code in moves
+                     if _is_code(code) and 0 <= code < len(table)]
+    if not decoded_moves:
+        raise ValueError(f"没有有效的动作ID: {moves!r}")
+    return {
+        "idx": idx,
+        "time": time,
+        "accent": _lookup(ACCENTS, accent, '重音'),
+        "level": _lookup(LEVELS, level, '层次'),
+        "plane": _lookup(PLANES, plane, '平面'),
+        "motifs": [MOTIFS[code] for code in motifs if _is_code(code) and 0 <= code < len(MOTIFS)],
+        "moves": decoded_moves,
+        "transition": _lookup(TRANSITIONS, transition, '过渡')
+    }
+
+
+def decode_choreography(data: Dict, style: str, times: Sequence[str]) -> Dict:
+    """
+    把紧凑格式的完整响应展开为原有schema
+
+    Args:
+        data: 解析后的紧凑JSON
+        style: 舞蹈风格
+        times: 本批各片段的时间范围，按顺序对应 segments 中的数组
+
+    Raises:
+        ValueError: 格式或编码无效
+    """
+    if not isinstance(data, dict) or not isinstance(data.get('segments'), list):
+        raise ValueError("缺少segments数组")
+    cues = data.get('g')
+    if not isinstance(cues, list) or len(cues) < 2:
+        raise ValueError(f"g应为 [能量, 情绪, 特点...]: {cues!r}")
+    segments = [decode_segment(row, style, times[offset] if offset < len(times) else "")
+                for offset, row in enumerate(data['segments'])]
+    return {
+        "style": style,
+        "global_cues": {
+            "energy_level": _lookup(ENERGY_LEVELS, cues[0], '能量'),
+            "mood": str(cues[1]),
+            "key_characteristics": [str(item) for item in cues[2:]]
+        },
+        "segments": segments
+    }
+
+
+def encode_segment(segment: Dict, style: str) -> List:
+    """完整schema的片段编码为数组（decode_segment的逆操作，不在词表中的动态和动作被跳过）"""
+    ids = move_ids(style)
+    return [
+        segment['idx'],
+        ACCENTS.index(segment['accent']),
+        LEVELS.index(segment['level']),
+        PLANES.index(segment['plane']),
+        [MOTIFS.index(motif) for motif in segment.get('motifs', []) if motif in MOTIFS],
+        [ids[move] for move in segment['moves'] if move in ids],
+        TRANSITIONS.index(segment['transition'])
+    ]
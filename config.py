@@ -6,12 +6,107 @@ load_dotenv()
 
 # OpenAI API configuration
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+# OpenAI-compatible endpoint, e.g. the local mock server (python mock_openai_server.py): http://127.0.0.1:8765/v1
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL') or None
+MOCK_OPENAI_PORT = int(os.getenv('MOCK_OPENAI_PORT', '8765'))
+# Maximum number of concurrent LLM requests per choreography (1 = sequential)
+LLM_MAX_CONCURRENCY = max(1, int(os.getenv('LLM_MAX_CONCURRENCY', '8')))
+# Output token budget per structured-choreography request; longer songs are split into batches
+LLM_BATCH_MAX_TOKENS = int(os.getenv('LLM_BATCH_MAX_TOKENS', '1200'))
+# Stream structured-choreography responses and emit each segment as soon as it is parsed
+LLM_STREAMING = os.getenv('LLM_STREAMING', '1') != '0'
+# Structured choreography output as short integer codes (compact_format), expanded locally to the full schema
+LLM_COMPACT_OUTPUT = os.getenv('LLM_COMPACT_OUTPUT', '1') != '0'
+# Latency budget (seconds) for the choreography LLM stage in the web app; late segments use the local fallback. 0 disables
+APP_LLM_DEADLINE = float(os.getenv('APP_LLM_DEADLINE', '45')) or None
+
+# Retry / circuit breaker around OpenAI calls
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '4'))
+LLM_REQUEST_DEADLINE = float(os.getenv('LLM_REQUEST_DEADLINE', '60'))  # seconds per request, retries included
+LLM_RETRY_BASE_DELAY = float(os.getenv('LLM_RETRY_BASE_DELAY', '0.5'))
+LLM_RETRY_MAX_DELAY = float(os.getenv('LLM_RETRY_MAX_DELAY', '20'))
+LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', '5'))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv('LLM_BREAKER_RESET_SECONDS', '30'))
+
+# Process-wide pooled OpenAI clients (one per API key + base URL) and their HTTP connection limits
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv('LLM_HTTP_MAX_CONNECTIONS', '100'))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv('LLM_HTTP_MAX_KEEPALIVE', '20'))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv('LLM_HTTP_KEEPALIVE_EXPIRY', '30'))  # seconds an idle connection is kept
+LLM_CLIENT_IDLE_SECONDS = float(os.getenv('LLM_CLIENT_IDLE_SECONDS', '600'))  # unused clients are dropped from the pool
+
+# LLM response cache (SQLite). LLM_CACHE_MODE is the default per-call mode: 'fresh' | 'replay' | 'off'.
+# 'fresh' always samples a new response (and stores it); replay is opt-in per call via cache_mode='replay',
+# e.g. generator.generate_choreography_from_file(path, cache_mode='replay')
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', '1') != '0'
+LLM_CACHE_MODE = os.getenv('LLM_CACHE_MODE', 'fresh')
+LLM_CACHE_PATH = os.getenv(
+    'LLM_CACHE_PATH',
+    os.path.join(os.path.expanduser('~'), '.cache', 'ai_choreography', 'llm_responses.sqlite3')
+)
+LLM_CACHE_TTL_SECONDS = float(os.getenv('LLM_CACHE_TTL_HOURS', '168')) * 3600
+LLM_CACHE_MAX_BYTES = int(os.getenv('LLM_CACHE_MAX_MB', '64')) * 1024 * 1024
+
+# Nearest-neighbour index of validated segment choreographies (JSONL), reused for similar segments
+# in every cache mode; SEGMENT_INDEX_MIN_SIMILARITY and the diversity rules decide reuse
+SEGMENT_INDEX_ENABLED = os.getenv('SEGMENT_INDEX_ENABLED', '1') != '0'
+SEGMENT_INDEX_PATH = os.getenv(
+    'SEGMENT_INDEX_PATH',
+    os.path.join(os.path.expanduser('~'), '.cache', 'ai_choreography', 'segment_index.jsonl')
+)
+SEGMENT_INDEX_MIN_SIMILARITY = float(os.getenv('SEGMENT_INDEX_MIN_SIMILARITY', '0.5'))  # 1 / (1 + scaled distance)
+SEGMENT_INDEX_TOP_K = int(os.getenv('SEGMENT_INDEX_TOP_K', '5'))  # random pick among the k best matches
+
+# Local nearest-centroid style classifier. Only a model fitted on recorded labels may skip the LLM style
+# recommendation (at or above the confidence threshold); the hand-written prior model never does
+STYLE_CLASSIFIER_ENABLED = os.getenv('STYLE_CLASSIFIER_ENABLED', '1') != '0'
+STYLE_CLASSIFIER_PATH = os.getenv(
+    'STYLE_CLASSIFIER_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'style_centroids.npz')
+)
+STYLE_CLASSIFIER_MIN_CONFIDENCE = float(os.getenv('STYLE_CLASSIFIER_MIN_CONFIDENCE', '0.6'))
+# Fraction of confident local predictions that still ask the LLM, so confident regions keep getting labels
+STYLE_LABEL_AUDIT_RATE = float(os.getenv('STYLE_LABEL_AUDIT_RATE', '0.1'))
+# (features, style) samples recorded whenever the LLM picks the style; refit with: python style_classifier.py fit
+STYLE_LABELS_PATH = os.getenv(
+    'STYLE_LABELS_PATH',
+    os.path.join(os.path.expanduser('~'), '.cache', 'ai_choreography', 'style_labels.jsonl')
+)
+
+# LLM call telemetry: optional JSONL sink (one line per chat-completions call) and USD prices per 1K tokens
+LLM_TELEMETRY_PATH = os.getenv('LLM_TELEMETRY_PATH') or None
+LLM_PRICES_PER_1K_TOKENS = {
+    # model: (prompt, completion)
+    'gpt-3.5-turbo': (0.0005, 0.0015),
+    'gpt-4o-mini': (0.00015, 0.0006),
+    'gpt-4o': (0.0025, 0.01),
+}
 
 # Audio processing configuration
 SAMPLE_RATE = 22050
 HOP_LENGTH = 512
 FRAME_LENGTH = 2048
 
+# Analysis result cache (content-addressed, shared by all worker processes)
+ANALYSIS_CACHE_ENABLED = os.getenv('ANALYSIS_CACHE_ENABLED', '1') != '0'
+ANALYSIS_CACHE_DIR = os.getenv(
+    'ANALYSIS_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'ai_choreography', 'analysis')
+)
+ANALYSIS_CACHE_MAX_BYTES = int(os.getenv('ANALYSIS_CACHE_MAX_MB', '512')) * 1024 * 1024
+
+# Streaming (block-wise) audio loading for long mixes: 'auto' | 'on' | 'off'
+STREAMING_AUDIO = os.getenv('STREAMING_AUDIO', 'auto')
+STREAMING_MIN_DURATION = float(os.getenv('STREAMING_MIN_DURATION', '900'))  # seconds, used by 'auto'
+STREAMING_BLOCK_SECONDS = float(os.getenv('STREAMING_BLOCK_SECONDS', '30'))
+
+# Analysis backends (madmom / essentia / musicnn) run concurrently in a process pool
+ANALYSIS_BACKEND_PARALLEL = os.getenv('ANALYSIS_BACKEND_PARALLEL', '1') != '0'
+ANALYSIS_BACKEND_TIMEOUTS = {
+    'madmom': float(os.getenv('MADMOM_TIMEOUT', '120')),
+    'essentia': float(os.getenv('ESSENTIA_TIMEOUT', '120')),
+    'musicnn': float(os.getenv('MUSICNN_TIMEOUT', '180')),
+}
+
 # Dance generation configuration
 BEATS_PER_SEGMENT = 8  # 8-beat segments for choreography
 DANCE_STYLES = [
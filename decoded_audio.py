@@ -0,0 +1,100 @@
+"""
+一次解码的共享音频对象
+文件只解码一次，按采样率缓存重采样后的缓冲区，
+供librosa、madmom、essentia、musicnn等后端直接使用
+"""
+
+import os
+import shutil
+import tempfile
+from typing import Dict, Optional
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+# 各后端模型要求的输入采样率
+MADMOM_SAMPLE_RATE = 44100
+MUSICNN_SAMPLE_RATE = 16000
+
+
+class DecodedAudio:
+    """解码后的单声道音频
+
+    原始采样率的缓冲区在解码时保存，其他采样率在第一次请求时重采样并缓存；
+    只接受文件路径的后端可以通过 wav_path 拿到对应采样率的临时WAV文件。
+    """
+
+    def __init__(self, y: np.ndarray, sr: int, file_path: Optional[str] = None):
+        self.native_sr = sr
+        self.file_path = file_path
+        self._buffers: Dict[int, np.ndarray] = {sr: np.ascontiguousarray(y, dtype=np.float32)}
+        self._wav_paths: Dict[int, str] = {}
+        self._tmp_dir: Optional[str] = None
+
+    @classmethod
+    def from_file(cls, file_path: str) -> 'DecodedAudio':
+        """
+        以原始采样率解码音频文件
+
+        Args:
+            file_path: 音频文件路径
+
+        Returns:
+            DecodedAudio
+        """
+        try:
+            y, sr = librosa.load(file_path, sr=None, mono=True)
+        except Exception as e:
+            raise Exception(f"Error loading audio: {e}")
+        return cls(y, int(sr), file_path=file_path)
+
+    @property
+    def duration(self) -> float:
+        return len(self._buffers[self.native_sr]) / self.native_sr
+
+    def at(self, sr: int) -> np.ndarray:
+        """
+        获取指定采样率的音频缓冲区
+
+        Args:
+            sr: 目标采样率
+
+        Returns:
+            float32单声道音频，同一采样率只重采样一次
+        """
+        if sr not in self._buffers:
+            self._buffers[sr] = librosa.resample(self._buffers[self.native_sr],
+                                                 orig_sr=self.native_sr, target_sr=sr)
+        return self._buffers[sr]
+
+    def wav_path(self, sr: int) -> str:
+        """
+        把指定采样率的缓冲区写成临时WAV文件，供只接受路径的后端使用
+
+        Args:
+            sr: 目标采样率
+
+        Returns:
+            临时WAV文件路径，在close()时删除
+        """
+        if sr not in self._wav_paths:
+            if self._tmp_dir is None:
+                self._tmp_dir = tempfile.mkdtemp(prefix='decoded_audio_')
+            path = os.path.join(self._tmp_dir, f"audio_{sr}.wav")
+            sf.write(path, self.at(sr), sr, subtype='FLOAT')
+            self._wav_paths[sr] = path
+        return self._wav_paths[sr]
+
+    def close(self) -> None:
+        """删除临时WAV文件"""
+        if self._tmp_dir is not None:
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+            self._tmp_dir = None
+            self._wav_paths.clear()
+
+    def __enter__(self) -> 'DecodedAudio':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
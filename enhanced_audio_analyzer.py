@@ -8,28 +8,140 @@ import numpy as np
 import soundfile as sf
 from typing import Dict, List, Tuple, Optional
 import warnings
+import config
+import capabilities
+from audio_feature_bank import AudioFeatureBank
+from backend_scheduler import BackendScheduler
+from decoded_audio import DecodedAudio, MADMOM_SAMPLE_RATE, MUSICNN_SAMPLE_RATE
+from segment_aggregator import reduce_segment_frames
+from local_tempo import estimate_local_tempo
 warnings.filterwarnings('ignore')
 
-try:
-    import madmom
-    MADMOM_AVAILABLE = True
-except ImportError:
-    MADMOM_AVAILABLE = False
-    print("Warning: madmom not available, using librosa beat tracking")
+# madmom / essentia / musicnn 由能力注册表在第一次使用时导入
 
-try:
-    import essentia.standard as es
-    ESSENTIA_AVAILABLE = True
-except ImportError:
-    ESSENTIA_AVAILABLE = False
-    print("Warning: essentia not available, using basic features")
+# 后端函数定义在模块级，只接收各自需要的缓冲区或文件路径：
+# 提交到进程池时只pickle这一份数据，而不是整个DecodedAudio和分析器
 
-try:
-    import musicnn
-    MUSICNN_AVAILABLE = True
-except ImportError:
-    MUSICNN_AVAILABLE = False
-    print("Warning: musicnn not available, using basic genre detection")
+def madmom_backend(signal_44k: np.ndarray) -> Dict:
+    """使用madmom提取精确节拍特征（输入44.1kHz单声道信号）"""
+    madmom = capabilities.load('madmom')
+    if madmom is None:
+        return {}
+    
+    try:
+        # 使用madmom的DBNDownBeatTrackingProcessor，输入已解码的44.1kHz信号
+        signal = madmom.audio.signal.Signal(signal_44k, sample_rate=MADMOM_SAMPLE_RATE)
+        proc = madmom.features.downbeat.DBNDownBeatTrackingProcessor(beats_per_bar=[4])
+        act = madmom.features.downbeat.RNNDownBeatProcessor()(signal)
+        downbeats = proc(act)
+        
+        # 提取节拍点
+        beats = []
+        for beat in downbeats:
+            beats.append(beat[0])  # 时间点
+        
+        # 计算BPM
+        if len(beats) > 1:
+            intervals = np.diff(beats)
+            bpm = 60.0 / np.mean(intervals)
+        else:
+            bpm = 120.0
+        
+        return {
+            'madmom_bpm': float(bpm),
+            'madmom_beats': beats,
+            'downbeats': downbeats.tolist()
+        }
+    except Exception as e:
+        print(f"Madmom analysis failed: {e}")
+        return {}
+
+def essentia_backend(audio: np.ndarray) -> Dict:
+    """使用Essentia提取高级音频特征（输入与librosa相同采样率的缓冲区）"""
+    es = capabilities.load('essentia')
+    if es is None:
+        return {}
+    
+    try:
+        # 提取特征
+        rhythm_extractor = es.RhythmExtractor2013(method="multifeature")
+        bpm, beats, beats_confidence, _, beats_intervals = rhythm_extractor(audio)
+        
+        # 情绪和能量特征
+        mood_extractor = es.PredominantPitchMelodia()
+        pitch, pitch_confidence = mood_extractor(audio)
+        
+        # 频谱特征
+        spectral_peaks = es.SpectralPeaks()
+        frequencies, magnitudes = spectral_peaks(audio)
+        
+        # 和声特征
+        hpcp = es.HPCP()
+        hpcp_values = hpcp(frequencies, magnitudes)
+        
+        return {
+            'essentia_bpm': float(bpm),
+            'essentia_beats': beats.tolist(),
+            'beats_confidence': float(np.mean(beats_confidence)),
+            'pitch_mean': float(np.mean(pitch)) if len(pitch) > 0 else 0,
+            'pitch_confidence': float(np.mean(pitch_confidence)) if len(pitch_confidence) > 0 else 0,
+            'hpcp_mean': [float(x) for x in np.mean(hpcp_values, axis=0)],
+            'energy': float(np.mean(audio**2))
+        }
+    except Exception as e:
+        print(f"Essentia analysis failed: {e}")
+        return {}
+
+def musicnn_backend(wav_path: str) -> Dict:
+    """使用musicnn进行音乐风格识别（musicnn只接受文件路径，传入16kHz的WAV）"""
+    musicnn = capabilities.load('musicnn')
+    if musicnn is None:
+        return basic_genre_detection()
+    
+    try:
+        taggram, tags, features = musicnn.predict(wav_path)
+        
+        # 获取最可能的风格标签
+        top_tags = tags[np.argsort(taggram.mean(axis=0))[-5:]]
+        
+        # 映射到舞蹈风格
+        dance_style = map_genre_to_dance_style(top_tags)
+        
+        return {
+            'musicnn_tags': top_tags.tolist(),
+            'dance_style': dance_style,
+            'style_confidence': float(np.max(taggram.mean(axis=0)))
+        }
+    except Exception as e:
+        print(f"Musicnn analysis failed: {e}")
+        return basic_genre_detection()
+
+def basic_genre_detection() -> Dict:
+    """基础风格检测（当musicnn不可用时）"""
+    return {
+        'dance_style': 'Hip-Hop',
+        'style_confidence': 0.5,
+        'musicnn_tags': ['electronic', 'dance', 'hip-hop']
+    }
+
+def map_genre_to_dance_style(tags: List[str]) -> str:
+    """将音乐风格标签映射到舞蹈风格"""
+    tag_str = ' '.join(tags).lower()
+    
+    if any(word in tag_str for word in ['hip', 'hop', 'rap', 'urban']):
+        return 'Hip-Hop'
+    elif any(word in tag_str for word in ['house', 'electronic', 'techno', 'edm']):
+        return 'House'
+    elif any(word in tag_str for word in ['k-pop', 'pop', 'korean']):
+        return 'K-pop'
+    elif any(word in tag_str for word in ['jazz', 'blues', 'swing']):
+        return 'Jazz'
+    elif any(word in tag_str for word in ['contemporary', 'modern', 'ballet']):
+        return 'Contemporary'
+    elif any(word in tag_str for word in ['break', 'breaking', 'b-boy']):
+        return 'Breaking'
+    else:
+        return 'Hip-Hop'  # 默认风格
 
 class EnhancedAudioAnalyzer:
     """增强音频分析器"""
@@ -39,24 +151,32 @@ class EnhancedAudioAnalyzer:
         self.hop_length = 512
         self.frame_length = 2048
         
+    def decode(self, file_path: str) -> DecodedAudio:
+        """解码音频文件，所有后端共享这一次解码的结果"""
+        return DecodedAudio.from_file(file_path)
+    
     def load_audio(self, file_path: str) -> Tuple[np.ndarray, int]:
         """加载音频文件"""
-        try:
-            y, sr = librosa.load(file_path, sr=self.sample_rate)
-            return y, sr
-        except Exception as e:
-            raise Exception(f"Error loading audio: {e}")
+        return self.decode(file_path).at(self.sample_rate), self.sample_rate
+    
+    def build_feature_bank(self, y: np.ndarray, sr: int) -> AudioFeatureBank:
+        """为整条音轨创建共享的STFT特征库"""
+        return AudioFeatureBank(y, sr, n_fft=self.frame_length, hop_length=self.hop_length)
     
-    def extract_basic_features(self, y: np.ndarray, sr: int) -> Dict:
+    def extract_basic_features(self, y: np.ndarray, sr: int,
+                               bank: Optional[AudioFeatureBank] = None) -> Dict:
         """提取基础音频特征"""
-        # BPM检测
-        tempo, beats = librosa.beat.beat_track(y=y, sr=sr, hop_length=self.hop_length)
+        if bank is None:
+            bank = self.build_feature_bank(y, sr)
         
-        # 频谱特征
-        spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
-        spectral_rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr)[0]
-        mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-        rms = librosa.feature.rms(y=y)[0]
+        # BPM检测（复用缓存的起音包络）
+        tempo, beats = bank.onset.track_beats()
+        
+        # 频谱特征（同一次STFT派生）
+        spectral_centroids = bank.spectral_centroid
+        spectral_rolloff = bank.spectral_rolloff
+        mfccs = bank.mfcc
+        rms = bank.rms
         
         # 节拍点
         beat_times = librosa.frames_to_time(beats, sr=sr, hop_length=self.hop_length)
@@ -72,127 +192,23 @@ class EnhancedAudioAnalyzer:
             'duration': len(y) / sr
         }
     
-    def extract_madmom_features(self, file_path: str) -> Dict:
+    def extract_madmom_features(self, audio: DecodedAudio) -> Dict:
         """使用madmom提取精确节拍特征"""
-        if not MADMOM_AVAILABLE:
-            return {}
-        
-        try:
-            # 使用madmom的DBNDownBeatTrackingProcessor
-            proc = madmom.features.downbeat.DBNDownBeatTrackingProcessor(beats_per_bar=[4])
-            act = madmom.features.downbeat.RNNDownBeatProcessor()(file_path)
-            downbeats = proc(act)
-            
-            # 提取节拍点
-            beats = []
-            for beat in downbeats:
-                beats.append(beat[0])  # 时间点
-            
-            # 计算BPM
-            if len(beats) > 1:
-                intervals = np.diff(beats)
-                bpm = 60.0 / np.mean(intervals)
-            else:
-                bpm = 120.0
-            
-            return {
-                'madmom_bpm': float(bpm),
-                'madmom_beats': beats,
-                'downbeats': downbeats.tolist()
-            }
-        except Exception as e:
-            print(f"Madmom analysis failed: {e}")
-            return {}
+        return madmom_backend(audio.at(MADMOM_SAMPLE_RATE))
     
-    def extract_essentia_features(self, file_path: str) -> Dict:
+    def extract_essentia_features(self, decoded: DecodedAudio) -> Dict:
         """使用Essentia提取高级音频特征"""
-        if not ESSENTIA_AVAILABLE:
-            return {}
-        
-        try:
-            # 加载音频
-            loader = es.MonoLoader(filename=file_path, sampleRate=self.sample_rate)
-            audio = loader()
-            
-            # 提取特征
-            rhythm_extractor = es.RhythmExtractor2013(method="multifeature")
-            bpm, beats, beats_confidence, _, beats_intervals = rhythm_extractor(audio)
-            
-            # 情绪和能量特征
-            mood_extractor = es.PredominantPitchMelodia()
-            pitch, pitch_confidence = mood_extractor(audio)
-            
-            # 频谱特征
-            spectral_peaks = es.SpectralPeaks()
-            frequencies, magnitudes = spectral_peaks(audio)
-            
-            # 和声特征
-            hpcp = es.HPCP()
-            hpcp_values = hpcp(frequencies, magnitudes)
-            
-            return {
-                'essentia_bpm': float(bpm),
-                'essentia_beats': beats.tolist(),
-                'beats_confidence': float(np.mean(beats_confidence)),
-                'pitch_mean': float(np.mean(pitch)) if len(pitch) > 0 else 0,
-                'pitch_confidence': float(np.mean(pitch_confidence)) if len(pitch_confidence) > 0 else 0,
-                'hpcp_mean': [float(x) for x in np.mean(hpcp_values, axis=0)],
-                'energy': float(np.mean(audio**2))
-            }
-        except Exception as e:
-            print(f"Essentia analysis failed: {e}")
-            return {}
+        return essentia_backend(decoded.at(self.sample_rate))
     
-    def extract_musicnn_features(self, file_path: str) -> Dict:
+    def extract_musicnn_features(self, audio: DecodedAudio) -> Dict:
         """使用musicnn进行音乐风格识别"""
-        if not MUSICNN_AVAILABLE:
-            return self._basic_genre_detection()
-        
-        try:
-            # 使用musicnn进行风格识别
-            taggram, tags, features = musicnn.predict(file_path)
-            
-            # 获取最可能的风格标签
-            top_tags = tags[np.argsort(taggram.mean(axis=0))[-5:]]
-            
-            # 映射到舞蹈风格
-            dance_style = self._map_genre_to_dance_style(top_tags)
-            
-            return {
-                'musicnn_tags': top_tags.tolist(),
-                'dance_style': dance_style,
-                'style_confidence': float(np.max(taggram.mean(axis=0)))
-            }
-        except Exception as e:
-            print(f"Musicnn analysis failed: {e}")
-            return self._basic_genre_detection()
+        if not capabilities.is_available('musicnn'):
+            return basic_genre_detection()
+        return musicnn_backend(audio.wav_path(MUSICNN_SAMPLE_RATE))
     
     def _basic_genre_detection(self) -> Dict:
         """基础风格检测（当musicnn不可用时）"""
-        return {
-            'dance_style': 'Hip-Hop',
-            'style_confidence': 0.5,
-            'musicnn_tags': ['electronic', 'dance', 'hip-hop']
-        }
-    
-    def _map_genre_to_dance_style(self, tags: List[str]) -> str:
-        """将音乐风格标签映射到舞蹈风格"""
-        tag_str = ' '.join(tags).lower()
-        
-        if any(word in tag_str for word in ['hip', 'hop', 'rap', 'urban']):
-            return 'Hip-Hop'
-        elif any(word in tag_str for word in ['house', 'electronic', 'techno', 'edm']):
-            return 'House'
-        elif any(word in tag_str for word in ['k-pop', 'pop', 'korean']):
-            return 'K-pop'
-        elif any(word in tag_str for word in ['jazz', 'blues', 'swing']):
-            return 'Jazz'
-        elif any(word in tag_str for word in ['contemporary', 'modern', 'ballet']):
-            return 'Contemporary'
-        elif any(word in tag_str for word in ['break', 'breaking', 'b-boy']):
-            return 'Breaking'
-        else:
-            return 'Hip-Hop'  # 默认风格
+        return basic_genre_detection()
     
     def segment_audio_by_beats(self, beat_times: np.ndarray, beats_per_segment: int = 8) -> List[Dict]:
         """按节拍分割音频"""
@@ -213,49 +229,70 @@ class EnhancedAudioAnalyzer:
         
         return segments
     
-    def analyze_audio_segment(self, y: np.ndarray, sr: int, start_time: float, end_time: float) -> Dict:
-        """分析音频片段特征"""
-        start_sample = int(start_time * sr)
-        end_sample = int(end_time * sr)
-        segment = y[start_sample:end_sample]
-        
-        if len(segment) == 0:
-            return {}
+    def schedule_backends(self, audio: DecodedAudio) -> BackendScheduler:
+        """
+        登记可用的高级分析后端
         
-        # 提取片段特征
-        tempo, _ = librosa.beat.beat_track(y=segment, sr=sr)
-        spectral_centroid = librosa.feature.spectral_centroid(y=segment, sr=sr)[0]
-        rms = librosa.feature.rms(y=segment)[0]
-        
-        return {
-            'tempo': float(tempo),
-            'energy': float(np.mean(rms)),
-            'brightness': float(np.mean(spectral_centroid)),
-            'complexity': float(np.std(spectral_centroid))
-        }
+        Args:
+            audio: 共享的解码音频
+            
+        Returns:
+            尚未启动的后端调度器，不可用的后端不会登记
+        """
+        scheduler = BackendScheduler(parallel=config.ANALYSIS_BACKEND_PARALLEL)
+        timeouts = config.ANALYSIS_BACKEND_TIMEOUTS
+        if capabilities.is_available('madmom'):
+            print("🎯 提取精确节拍特征...")
+            scheduler.add('madmom', madmom_backend, audio.at(MADMOM_SAMPLE_RATE),
+                          timeout=timeouts['madmom'], default={})
+        if capabilities.is_available('essentia'):
+            print("🎨 提取高级音频特征...")
+            scheduler.add('essentia', essentia_backend, audio.at(self.sample_rate),
+                          timeout=timeouts['essentia'], default={})
+        if capabilities.is_available('musicnn'):
+            print("🎭 识别音乐风格...")
+            # 临时WAV在主进程写好，由主进程负责清理；工作进程只拿到路径
+            scheduler.add('musicnn', musicnn_backend, audio.wav_path(MUSICNN_SAMPLE_RATE),
+                          timeout=timeouts['musicnn'], default=basic_genre_detection())
+        return scheduler
     
-    def comprehensive_analysis(self, file_path: str) -> Dict:
-        """综合分析音频文件"""
+    def comprehensive_analysis(self, file_path: str, audio: Optional[DecodedAudio] = None) -> Dict:
+        """综合分析音频文件，已解码的音频可通过audio传入"""
         print("🎵 开始综合分析音频...")
         
-        # 加载音频
-        y, sr = self.load_audio(file_path)
-        
-        # 基础特征
-        print("📊 提取基础特征...")
-        basic_features = self.extract_basic_features(y, sr)
-        
-        # Madmom特征
-        print("🎯 提取精确节拍特征...")
-        madmom_features = self.extract_madmom_features(file_path)
+        # 解码一次，各后端共享
+        owns_audio = audio is None
+        if owns_audio:
+            audio = self.decode(file_path)
+        try:
+            return self._analyze_decoded(audio)
+        finally:
+            if owns_audio:
+                audio.close()
+    
+    def _analyze_decoded(self, audio: DecodedAudio) -> Dict:
+        """基于已解码音频的综合分析"""
+        sr = self.sample_rate
+        y = audio.at(sr)
         
-        # Essentia特征
-        print("🎨 提取高级音频特征...")
-        essentia_features = self.extract_essentia_features(file_path)
+        # 高级库后端相互独立，先提交到进程池，与主进程的基础特征提取并行
+        scheduler = self.schedule_backends(audio)
+        scheduler.start()
         
-        # Musicnn特征
-        print("🎭 识别音乐风格...")
-        musicnn_features = self.extract_musicnn_features(file_path)
+        try:
+            # 基础特征
+            print("📊 提取基础特征...")
+            bank = self.build_feature_bank(y, sr)
+            basic_features = self.extract_basic_features(y, sr, bank)
+            
+            if scheduler.tasks:
+                print("⏳ 等待高级分析后端...")
+            backend_results = scheduler.collect()
+        finally:
+            scheduler.shutdown(terminate=True)
+        madmom_features = backend_results.get('madmom', {})
+        essentia_features = backend_results.get('essentia', {})
+        musicnn_features = backend_results.get('musicnn', self._basic_genre_detection())
         
         # 选择最佳BPM
         bpm_candidates = [basic_features['tempo']]
@@ -275,13 +312,22 @@ class EnhancedAudioAnalyzer:
         # 分割音频
         segments = self.segment_audio_by_beats(beat_times)
         
-        # 分析每个片段
+        # 一次归约得到所有片段的帧级特征
+        stats = reduce_segment_frames(bank, segments)
+        local_tempo = estimate_local_tempo(beat_times, segments, onset_envelope=bank.onset.envelope,
+                                           sr=sr, hop_length=self.hop_length)
+        accent_strength = bank.onset.segment_accent_strength(beat_times, segments)
         segment_features = []
-        for segment in segments:
-            seg_features = self.analyze_audio_segment(
-                y, sr, segment['start_time'], segment['end_time']
-            )
-            segment_features.append({**segment, **seg_features})
+        for i, segment in enumerate(segments):
+            segment_features.append({
+                **segment,
+                **local_tempo['segments'][i],
+                'energy': float(stats['energy'][i]),
+                'brightness': float(stats['brightness'][i]),
+                'complexity': float(stats['brightness_std'][i]),
+                'mfcc_mean': [float(x) for x in stats['mfcc_mean'][i]],
+                'accent_strength': float(accent_strength[i])
+            })
         
         # 合并所有特征
         result = {
@@ -295,9 +341,11 @@ class EnhancedAudioAnalyzer:
                 **basic_features,
                 **madmom_features,
                 **essentia_features,
-                **musicnn_features
+                **musicnn_features,
+                'tempo_drift': local_tempo['tempo_drift']
             },
             'segments': segment_features,
+            'backend_status': scheduler.status,
             'dance_style': musicnn_features.get('dance_style', 'Hip-Hop'),
             'style_confidence': musicnn_features.get('style_confidence', 0.5)
         }
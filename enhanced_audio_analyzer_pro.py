@@ -8,32 +8,19 @@ import numpy as np
 import soundfile as sf
 from typing import Dict, List, Tuple, Optional
 import warnings
+import capabilities
+from audio_feature_bank import AudioFeatureBank
+from decoded_audio import DecodedAudio, MADMOM_SAMPLE_RATE, MUSICNN_SAMPLE_RATE
+from streaming_audio import stream_feature_bank
+from onset_layer import OnsetLayer
+from segment_aggregator import aggregate_segment_features
+from local_tempo import estimate_local_tempo
 warnings.filterwarnings('ignore')
 
-# 尝试导入高级音频分析库
-try:
-    import madmom
-    MADMOM_AVAILABLE = True
-    print("✅ madmom 已加载")
-except ImportError:
-    MADMOM_AVAILABLE = False
-    print("⚠️ madmom 不可用，使用librosa替代")
+# madmom / essentia / musicnn 由能力注册表在第一次使用时导入
 
-try:
-    import essentia.standard as es
-    ESSENTIA_AVAILABLE = True
-    print("✅ essentia 已加载")
-except ImportError:
-    ESSENTIA_AVAILABLE = False
-    print("⚠️ essentia 不可用，使用librosa替代")
-
-try:
-    import musicnn
-    MUSICNN_AVAILABLE = True
-    print("✅ musicnn 已加载")
-except ImportError:
-    MUSICNN_AVAILABLE = False
-    print("⚠️ musicnn 不可用，使用特征工程替代")
+# 分析代码版本，修改分析逻辑时递增以使旧的缓存结果失效
+ANALYZER_VERSION = "pro-3"
 
 class EnhancedAudioAnalyzerPro:
     """专业级音频分析器"""
@@ -43,37 +30,77 @@ class EnhancedAudioAnalyzerPro:
         self.hop_length = 512
         self.frame_length = 2048
         
+    def decode(self, file_path: str) -> DecodedAudio:
+        """解码音频文件，所有后端共享这一次解码的结果"""
+        return DecodedAudio.from_file(file_path)
+    
     def load_audio(self, file_path: str) -> Tuple[np.ndarray, int]:
         """加载音频文件"""
-        try:
-            y, sr = librosa.load(file_path, sr=self.sample_rate)
-            return y, sr
-        except Exception as e:
-            raise Exception(f"Error loading audio: {e}")
+        return self.decode(file_path).at(self.sample_rate), self.sample_rate
+    
+    def cache_fingerprint(self, streaming: bool = False) -> Dict:
+        """分析器配置指纹，作为结果缓存键的一部分"""
+        return {
+            'analyzer': self.__class__.__name__,
+            'version': ANALYZER_VERSION,
+            'streaming': streaming,
+            'sample_rate': self.sample_rate,
+            'hop_length': self.hop_length,
+            'frame_length': self.frame_length,
+            'backends': capabilities.available_backends()
+        }
     
-    def extract_enhanced_features(self, y: np.ndarray, sr: int) -> Dict:
-        """提取增强音频特征"""
+    def build_feature_bank(self, y: np.ndarray, sr: int) -> AudioFeatureBank:
+        """为整条音轨创建共享的STFT特征库"""
+        return AudioFeatureBank(y, sr, n_fft=self.frame_length, hop_length=self.hop_length)
+    
+    def stream_feature_bank(self, file_path: str) -> AudioFeatureBank:
+        """分块解码长音频并增量计算特征库，内存占用与音轨长度无关"""
+        return stream_feature_bank(file_path, sample_rate=self.sample_rate,
+                                   n_fft=self.frame_length, hop_length=self.hop_length)
+    
+    def extract_enhanced_features(self, y: Optional[np.ndarray], sr: int,
+                                  bank: Optional[AudioFeatureBank] = None,
+                                  audio: Optional[DecodedAudio] = None) -> Dict:
+        """提取增强音频特征
+
+        高级库从共享的解码结果audio取对应采样率的缓冲区；
+        流式模式下y和audio均为None，只使用特征库
+        """
         print("🎵 开始专业级音频分析...")
         
-        # 基础特征 (librosa)
-        tempo, beats = librosa.beat.beat_track(y=y, sr=sr, hop_length=self.hop_length)
-        spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
-        spectral_rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr)[0]
-        spectral_bandwidth = librosa.feature.spectral_bandwidth(y=y, sr=sr)[0]
-        mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-        rms = librosa.feature.rms(y=y)[0]
-        zero_crossing_rate = librosa.feature.zero_crossing_rate(y)[0]
-        chroma = librosa.feature.chroma_stft(y=y, sr=sr)
-        tonnetz = librosa.feature.tonnetz(y=y, sr=sr)
+        if bank is None:
+            bank = self.build_feature_bank(y, sr)
+        if audio is None and y is not None:
+            audio = DecodedAudio(y, sr)
+        # 高级库需要完整信号，流式模式下跳过；模块在第一次使用时才导入
+        full_signal = audio is not None
+        madmom = capabilities.load('madmom') if full_signal else None
+        es = capabilities.load('essentia') if full_signal else None
+        musicnn = capabilities.load('musicnn') if full_signal else None
+        
+        # 基础特征 (librosa)，频谱特征均来自同一次STFT，节拍跟踪复用缓存的起音包络
+        onset = bank.onset
+        tempo, beats = onset.track_beats()
+        spectral_centroids = bank.spectral_centroid
+        spectral_rolloff = bank.spectral_rolloff
+        spectral_bandwidth = bank.spectral_bandwidth
+        mfccs = bank.mfcc
+        rms = bank.rms
+        zero_crossing_rate = bank.zero_crossing_rate
+        chroma = bank.chroma
+        tonnetz = bank.tonnetz
         
         # 高级节拍检测 (madmom)
-        if MADMOM_AVAILABLE:
+        if madmom is not None:
             print("🎯 使用madmom进行精确节拍检测...")
             try:
                 # 使用madmom的DBNDownBeatTrackingProcessor
                 proc = madmom.features.downbeats.DBNDownBeatTrackingProcessor(
                     beats_per_bar=[3, 4], fps=100)
-                act = madmom.features.downbeats.RNNDownBeatProcessor()(file_path)
+                signal = madmom.audio.signal.Signal(audio.at(MADMOM_SAMPLE_RATE),
+                                                    sample_rate=MADMOM_SAMPLE_RATE)
+                act = madmom.features.downbeats.RNNDownBeatProcessor()(signal)
                 downbeats = proc(act)
                 
                 # 提取节拍信息
@@ -81,7 +108,7 @@ class EnhancedAudioAnalyzerPro:
                 beat_labels = downbeats[:, 1]
                 
                 # 计算节拍置信度
-                tempo_confidence = self._calculate_madmom_confidence(beat_times, sr)
+                tempo_confidence = self._calculate_madmom_confidence(beat_times, sr, onset)
                 
                 print(f"✅ madmom检测到 {len(beat_times)} 个节拍点")
                 
@@ -89,31 +116,30 @@ class EnhancedAudioAnalyzerPro:
                 print(f"⚠️ madmom处理失败: {e}")
                 beat_times = librosa.frames_to_time(beats, sr=sr, hop_length=self.hop_length)
                 beat_labels = np.ones(len(beat_times))
-                tempo_confidence = 0.7
+                tempo_confidence = self._calculate_madmom_confidence(beat_times, sr, onset)
         else:
             beat_times = librosa.frames_to_time(beats, sr=sr, hop_length=self.hop_length)
             beat_labels = np.ones(len(beat_times))
-            tempo_confidence = 0.7
+            tempo_confidence = self._calculate_madmom_confidence(beat_times, sr, onset)
         
         # 高级音频特征 (essentia)
-        if ESSENTIA_AVAILABLE:
+        if es is not None:
             print("🎨 使用essentia提取高级特征...")
             try:
-                # 加载音频到essentia
-                loader = es.MonoLoader(filename=file_path, sampleRate=sr)
-                audio = loader()
+                # 复用与librosa相同采样率的缓冲区，不再用MonoLoader重新解码
+                signal = audio.at(sr)
                 
                 # 提取高级特征
                 rhythm_extractor = es.RhythmExtractor2013(method="multifeature")
-                bpm, beats, beats_confidence, _, beats_intervals = rhythm_extractor(audio)
+                bpm, es_beats, beats_confidence, _, beats_intervals = rhythm_extractor(signal)
                 
                 # 情绪和风格特征
                 mood_extractor = es.PredominantPitchMelodia()
-                pitch, pitch_confidence = mood_extractor(audio)
+                pitch, pitch_confidence = mood_extractor(signal)
                 
                 # 频谱特征
                 spectral_peaks = es.SpectralPeaks()
-                frequencies, magnitudes = spectral_peaks(audio)
+                frequencies, magnitudes = spectral_peaks(signal)
                 
                 # 和声特征
                 hpcp = es.HPCP()
@@ -138,11 +164,13 @@ class EnhancedAudioAnalyzerPro:
             essentia_features = {}
         
         # 音乐风格识别 (musicnn)
-        if MUSICNN_AVAILABLE:
+        if musicnn is not None:
             print("🎭 使用musicnn进行风格识别...")
             try:
                 # 使用musicnn进行风格识别
-                taggram, tags, features = musicnn.extract(file_path, model='MSD_musicnn', extract_features=True)
+                # musicnn只接受文件路径，传入16kHz的WAV，避免再次解码原文件和重采样
+                taggram, tags, features = musicnn.extract(audio.wav_path(MUSICNN_SAMPLE_RATE),
+                                                          model='MSD_musicnn', extract_features=True)
                 
                 # 获取最可能的风格标签
                 top_tags = tags[np.argsort(taggram.mean(axis=0))[-5:]]
@@ -170,8 +198,8 @@ class EnhancedAudioAnalyzerPro:
         spectral_centroid_std = np.std(spectral_centroids)
         
         # 情绪和风格特征
-        mood_features = self._extract_mood_features_enhanced(y, sr, essentia_features)
-        style_features = self._extract_style_features_enhanced(y, sr, musicnn_features)
+        mood_features = self._extract_mood_features_enhanced(bank, essentia_features)
+        style_features = self._extract_style_features_enhanced(bank, musicnn_features)
         
         # 构建结果
         result = {
@@ -190,20 +218,22 @@ class EnhancedAudioAnalyzerPro:
             'zero_crossing_rate_mean': float(np.mean(zero_crossing_rate)),
             'chroma_mean': [float(x) for x in np.mean(chroma, axis=1)],
             'tonnetz_mean': [float(x) for x in np.mean(tonnetz, axis=1)],
-            'duration': len(y) / sr,
+            'duration': bank.duration,
             'mood_features': mood_features,
             'style_features': style_features,
             'essentia_features': essentia_features,
             'musicnn_features': musicnn_features,
-            'madmom_available': MADMOM_AVAILABLE,
-            'essentia_available': ESSENTIA_AVAILABLE,
-            'musicnn_available': MUSICNN_AVAILABLE
+            'madmom_available': capabilities.is_available('madmom'),
+            'essentia_available': capabilities.is_available('essentia'),
+            'musicnn_available': capabilities.is_available('musicnn'),
+            'backend_report': capabilities.report()
         }
         
         print(f"✅ 专业级分析完成！BPM: {tempo:.1f}, 置信度: {tempo_confidence:.2f}")
         return result
     
-    def _calculate_madmom_confidence(self, beat_times: np.ndarray, sr: int) -> float:
+    def _calculate_madmom_confidence(self, beat_times: np.ndarray, sr: int,
+                                     onset: Optional[OnsetLayer] = None) -> float:
         """计算madmom节拍检测置信度"""
         if len(beat_times) < 2:
             return 0.0
@@ -215,12 +245,21 @@ class EnhancedAudioAnalyzerPro:
         # 使用变异系数作为置信度指标
         cv = np.std(intervals) / np.mean(intervals) if np.mean(intervals) > 0 else 1.0
         confidence = max(0.0, 1.0 - cv)
+        
+        # 有起音层时，结合节拍处起音显著度和速度图在该速度上的强度
+        if onset is not None:
+            tempo = 60.0 / np.mean(intervals) if np.mean(intervals) > 0 else 0.0
+            confidence = float(np.mean([
+                confidence,
+                onset.beat_salience(beat_times),
+                onset.tempo_strength(tempo)
+            ]))
         return confidence
     
-    def _extract_mood_features_enhanced(self, y: np.ndarray, sr: int, essentia_features: Dict) -> Dict:
+    def _extract_mood_features_enhanced(self, bank: AudioFeatureBank, essentia_features: Dict) -> Dict:
         """提取增强情绪特征"""
-        spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
-        rms = librosa.feature.rms(y=y)[0]
+        spectral_centroids = bank.spectral_centroid
+        rms = bank.rms
         
         # 基础情绪指标
         brightness = np.mean(spectral_centroids)
@@ -265,11 +304,11 @@ class EnhancedAudioAnalyzerPro:
             'energy_variation': float(energy_variation)
         }
     
-    def _extract_style_features_enhanced(self, y: np.ndarray, sr: int, musicnn_features: Dict) -> Dict:
+    def _extract_style_features_enhanced(self, bank: AudioFeatureBank, musicnn_features: Dict) -> Dict:
         """提取增强风格特征"""
-        mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-        spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
-        rms = librosa.feature.rms(y=y)[0]
+        mfccs = bank.mfcc
+        spectral_centroids = bank.spectral_centroid
+        rms = bank.rms
         
         # 如果有musicnn特征，使用更精确的风格识别
         if musicnn_features:
@@ -341,53 +380,50 @@ class EnhancedAudioAnalyzerPro:
         
         return segments
     
-    def analyze_audio_segment(self, y: np.ndarray, sr: int, start_time: float, end_time: float) -> Dict:
-        """分析音频片段特征"""
-        start_sample = int(start_time * sr)
-        end_sample = int(end_time * sr)
-        segment = y[start_sample:end_sample]
-        
-        if len(segment) == 0:
-            return {}
-        
-        # 提取片段特征
-        tempo, _ = librosa.beat.beat_track(y=segment, sr=sr)
-        spectral_centroid = librosa.feature.spectral_centroid(y=segment, sr=sr)[0]
-        rms = librosa.feature.rms(y=segment)[0]
-        mfccs = librosa.feature.mfcc(y=segment, sr=sr, n_mfcc=13)
-        
-        # 计算复杂度
-        complexity = np.std(spectral_centroid) / np.mean(spectral_centroid) if np.mean(spectral_centroid) > 0 else 0
-        
-        return {
-            'tempo': float(tempo),
-            'energy': float(np.mean(rms)),
-            'brightness': float(np.mean(spectral_centroid)),
-            'complexity': float(complexity),
-            'mfcc_mean': [float(x) for x in np.mean(mfccs, axis=1)]
-        }
-    
-    def comprehensive_analysis(self, file_path: str) -> Dict:
-        """综合分析音频文件"""
+    def comprehensive_analysis(self, file_path: str, audio: Optional[DecodedAudio] = None,
+                               streaming: bool = False) -> Dict:
+        """综合分析音频文件，已解码的音频可通过audio传入以避免重复解码；
+        streaming=True 时分块解码，适合长时间的混音"""
         print("🎵 开始专业级综合分析...")
         
-        # 加载音频
-        y, sr = self.load_audio(file_path)
+        owns_audio = False
+        if streaming:
+            print("🌊 流式分块分析...")
+            audio = y = None
+            bank = self.stream_feature_bank(file_path)
+            sr = bank.sr
+        else:
+            # 解码一次，librosa和各高级库共享
+            if audio is None:
+                audio = self.decode(file_path)
+                owns_audio = True
+            sr = self.sample_rate
+            y = audio.at(sr)
+            bank = self.build_feature_bank(y, sr)
         
-        # 提取增强特征
-        print("📊 提取专业级特征...")
-        features = self.extract_enhanced_features(y, sr)
+        try:
+            # 提取增强特征（整条音轨共享一次STFT）
+            print("📊 提取专业级特征...")
+            features = self.extract_enhanced_features(y, sr, bank, audio)
+        finally:
+            if owns_audio:
+                audio.close()
         
         # 分割音频
         segments = self.segment_audio_by_beats(features['beat_times'])
         
-        # 分析每个片段
+        # 一次归约得到所有片段的帧级特征，局部速度直接来自整轨节拍网格
+        segment_stats = aggregate_segment_features(bank, segments)
+        local_tempo = estimate_local_tempo(features['beat_times'], segments,
+                                           onset_envelope=bank.onset.envelope,
+                                           sr=sr, hop_length=self.hop_length)
+        accent_strength = bank.onset.segment_accent_strength(features['beat_times'], segments)
+        features['tempo_drift'] = local_tempo['tempo_drift']
         segment_features = []
-        for segment in segments:
-            seg_features = self.analyze_audio_segment(
-                y, sr, segment['start_time'], segment['end_time']
-            )
-            segment_features.append({**segment, **seg_features})
+        for segment, stats, tempo_info, accent in zip(segments, segment_stats,
+                                                      local_tempo['segments'], accent_strength):
+            segment_features.append({**segment, **tempo_info, **stats,
+                                     'accent_strength': float(accent)})
         
         # 构建结果
         result = {
@@ -406,6 +442,7 @@ class EnhancedAudioAnalyzerPro:
         
         print(f"✅ 专业级分析完成！检测到 {len(segments)} 个8拍片段，BPM: {features['tempo']:.1f}")
         print(f"🎭 推荐舞蹈风格: {result['dance_style']}")
-        print(f"🔧 使用的高级库: madmom={MADMOM_AVAILABLE}, essentia={ESSENTIA_AVAILABLE}, musicnn={MUSICNN_AVAILABLE}")
+        backends = capabilities.available_backends()
+        print(f"🔧 使用的高级库: madmom={backends['madmom']}, essentia={backends['essentia']}, musicnn={backends['musicnn']}")
         
         return result
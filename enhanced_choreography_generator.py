@@ -5,10 +5,11 @@
 
 import os
 import tempfile
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Callable, Optional
 from enhanced_audio_analyzer import EnhancedAudioAnalyzer
 from enhanced_llm_choreographer import EnhancedLLMChoreographer
 from action_database import get_action_candidates, get_action_dimensions
+from move_attributes import score_segments
 import json
 
 class EnhancedChoreographyGenerator:
@@ -20,9 +21,15 @@ class EnhancedChoreographyGenerator:
         self.recent_actions = []  # 记录最近使用的动作，用于避免重复
         self.max_recent_actions = 20  # 最多记录20个最近动作
     
-    def generate_choreography_from_file(self, file_path: str) -> Dict:
-        """从音频文件生成编舞"""
+    def generate_choreography_from_file(self, file_path: str,
+                                        on_segment: Optional[Callable[[int, Dict], None]] = None,
+                                        deadline: Optional[float] = None,
+                                        cache_mode: Optional[str] = None) -> Dict:
+        """从音频文件生成编舞，on_segment 在每个片段编舞生成后立即以 (片段编号, 片段) 回调；
+        deadline（秒）限制LLM阶段的耗时，截止前未生成的片段使用本地备用方案；
+        cache_mode 转交给LLM编舞器（'replay' 回放相同请求，None 使用 config.LLM_CACHE_MODE）"""
         print("🎵 开始增强编舞生成流程...")
+        telemetry = self.llm_choreographer.start_telemetry()
         
         try:
             # 1. 增强音频分析
@@ -44,7 +51,10 @@ class EnhancedChoreographyGenerator:
                 audio_features=features,
                 segments=segments,
                 dance_style=dance_style,
-                avoid_actions=self.recent_actions
+                avoid_actions=self.recent_actions,
+                on_segment=on_segment,
+                deadline=deadline,
+                cache_mode=cache_mode
             )
             
             # 4. 后处理和增强
@@ -64,7 +74,8 @@ class EnhancedChoreographyGenerator:
                 'segments': segments,
                 'dance_style': dance_style,
                 'style_confidence': analysis_result.get('style_confidence', 0.5),
-                'generation_method': 'enhanced_structured'
+                'generation_method': 'enhanced_structured',
+                'llm_telemetry': telemetry.summary()
             }
             
             print("🎉 增强编舞生成完成！")
@@ -105,12 +116,13 @@ class EnhancedChoreographyGenerator:
                 segment['teaching_tips'] = self._generate_teaching_tips(
                     segment, dance_style
                 )
-                
-                # 添加难度评估
-                segment['difficulty'] = self._assess_difficulty(segment)
-                
-                # 添加能量等级
-                segment['energy_level'] = self._assess_energy_level(segment)
+        
+        # 所有片段的难度评估和能量等级一次完成（按动作属性表向量化评分）
+        scored = enhanced.get('segments', [])[:len(segments)]
+        difficulties, energy_levels = score_segments(scored, 'basic')
+        for segment, difficulty, energy_level in zip(scored, difficulties, energy_levels):
+            segment['difficulty'] = difficulty
+            segment['energy_level'] = energy_level
         
         # 添加全局建议
         enhanced['global_advice'] = self._generate_global_advice(
@@ -148,74 +160,6 @@ class EnhancedChoreographyGenerator:
         
         return tips
     
-    def _assess_difficulty(self, segment: Dict) -> str:
-        """评估动作难度"""
-        moves = segment.get('moves', [])
-        level = segment.get('level', 'mid')
-        transition = segment.get('transition', 'quarter-turn')
-        
-        difficulty_score = 0
-        
-        # 根据动作复杂度评分
-        complex_moves = ['windmill', 'headspin', 'flare', 'turtle', 'cricket']
-        for move in moves:
-            if any(complex_move in move.lower() for complex_move in complex_moves):
-                difficulty_score += 3
-            elif any(keyword in move.lower() for keyword in ['spin', 'turn', 'jump', 'leap']):
-                difficulty_score += 2
-            else:
-                difficulty_score += 1
-        
-        # 根据层次评分
-        if level == 'floor':
-            difficulty_score += 2
-        elif level == 'high':
-            difficulty_score += 1
-        
-        # 根据过渡复杂度评分
-        complex_transitions = ['full_turn', 'spin', 'level_drop', 'travel_diagonal']
-        if any(complex_transition in transition for complex_transition in complex_transitions):
-            difficulty_score += 2
-        
-        # 转换为难度等级
-        if difficulty_score <= 3:
-            return "初级"
-        elif difficulty_score <= 6:
-            return "中级"
-        else:
-            return "高级"
-    
-    def _assess_energy_level(self, segment: Dict) -> str:
-        """评估能量等级"""
-        accent = segment.get('accent', 'medium')
-        moves = segment.get('moves', [])
-        
-        energy_score = 0
-        
-        # 根据重音评分
-        if accent == 'strong':
-            energy_score += 3
-        elif accent == 'medium':
-            energy_score += 2
-        else:
-            energy_score += 1
-        
-        # 根据动作类型评分
-        high_energy_moves = ['jump', 'leap', 'bounce', 'pop', 'hit', 'punch']
-        for move in moves:
-            if any(energy_move in move.lower() for energy_move in high_energy_moves):
-                energy_score += 2
-            elif any(keyword in move.lower() for keyword in ['run', 'fast', 'quick']):
-                energy_score += 1
-        
-        # 转换为能量等级
-        if energy_score <= 2:
-            return "低能量"
-        elif energy_score <= 4:
-            return "中等能量"
-        else:
-            return "高能量"
-    
     def _generate_global_advice(self, choreography: Dict, dance_style: str) -> Dict:
         """生成全局建议"""
         global_cues = choreography.get('global_cues', {})
@@ -5,10 +5,14 @@
 
 import os
 import tempfile
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Callable, Optional
 from enhanced_audio_analyzer_pro import EnhancedAudioAnalyzerPro
 from enhanced_llm_choreographer import EnhancedLLMChoreographer
 from action_database import get_action_candidates, get_action_dimensions
+from move_attributes import score_segments
+from analysis_cache import AnalysisCache
+from streaming_audio import should_stream
+import config
 import json
 
 class EnhancedChoreographyGeneratorPro:
@@ -19,15 +23,25 @@ class EnhancedChoreographyGeneratorPro:
         self.llm_choreographer = EnhancedLLMChoreographer()
         self.recent_actions = []  # 记录最近使用的动作，用于避免重复
         self.max_recent_actions = 20  # 最多记录20个最近动作
+        self.analysis_cache = (
+            AnalysisCache(config.ANALYSIS_CACHE_DIR, config.ANALYSIS_CACHE_MAX_BYTES)
+            if config.ANALYSIS_CACHE_ENABLED else None
+        )
     
-    def generate_choreography_from_file(self, file_path: str) -> Dict:
-        """从音频文件生成专业级编舞"""
+    def generate_choreography_from_file(self, file_path: str,
+                                        on_segment: Optional[Callable[[int, Dict], None]] = None,
+                                        deadline: Optional[float] = None,
+                                        cache_mode: Optional[str] = None) -> Dict:
+        """从音频文件生成专业级编舞，on_segment 在每个片段编舞生成后立即以 (片段编号, 片段) 回调；
+        deadline（秒）限制LLM阶段的耗时，截止前未生成的片段使用本地备用方案；
+        cache_mode 转交给LLM编舞器（'replay' 回放相同请求，None 使用 config.LLM_CACHE_MODE）"""
         print("🎵 开始专业级编舞生成流程...")
+        telemetry = self.llm_choreographer.start_telemetry()
         
         try:
-            # 1. 专业级音频分析
+            # 1. 专业级音频分析（先查询结果缓存）
             print("📊 步骤1: 专业级音频分析...")
-            analysis_result = self.audio_analyzer.comprehensive_analysis(file_path)
+            analysis_result = self._analyze_with_cache(file_path)
             
             # 2. 提取关键信息
             audio_info = analysis_result['audio_info']
@@ -46,7 +60,10 @@ class EnhancedChoreographyGeneratorPro:
                 audio_features=features,
                 segments=segments,
                 dance_style=dance_style,
-                avoid_actions=self.recent_actions
+                avoid_actions=self.recent_actions,
+                on_segment=on_segment,
+                deadline=deadline,
+                cache_mode=cache_mode
             )
             
             # 4. 后处理和增强
@@ -72,7 +89,8 @@ class EnhancedChoreographyGeneratorPro:
                     'madmom': features.get('madmom_available', False),
                     'essentia': features.get('essentia_available', False),
                     'musicnn': features.get('musicnn_available', False)
-                }
+                },
+                'llm_telemetry': telemetry.summary()
             }
             
             print("🎉 专业级编舞生成完成！")
@@ -82,6 +100,40 @@ class EnhancedChoreographyGeneratorPro:
             print(f"❌ 生成编舞时出错: {e}")
             raise e
     
+    def _analyze_with_cache(self, file_path: str) -> Dict:
+        """解码音频后查询分析缓存，未命中时完整分析并写入缓存；
+        长音频走流式分块分析，缓存键改用文件字节，避免整轨解码"""
+        audio = None
+        if should_stream(file_path):
+            analyze = lambda: self.audio_analyzer.comprehensive_analysis(file_path, streaming=True)
+            make_key = lambda: AnalysisCache.make_file_key(
+                file_path, self.audio_analyzer.cache_fingerprint(streaming=True))
+        else:
+            audio = self.audio_analyzer.decode(file_path)
+            sr = self.audio_analyzer.sample_rate
+            analyze = lambda: self.audio_analyzer.comprehensive_analysis(file_path, audio=audio)
+            make_key = lambda: AnalysisCache.make_key(audio.at(sr), sr, self.audio_analyzer.cache_fingerprint())
+        
+        try:
+            if self.analysis_cache is None:
+                return analyze()
+            
+            key = make_key()
+            analysis_result = self.analysis_cache.get(key)
+            if analysis_result is not None:
+                print("⚡ 命中分析缓存，跳过音频分析")
+                return analysis_result
+            
+            analysis_result = analyze()
+            try:
+                self.analysis_cache.put(key, analysis_result)
+            except Exception as e:
+                print(f"⚠️ 写入分析缓存失败: {e}")
+            return analysis_result
+        finally:
+            if audio is not None:
+                audio.close()
+    
     def _enhance_choreography_output_pro(self, choreography: Dict, 
                                        segments: List[Dict], 
                                        dance_style: str,
@@ -97,6 +149,7 @@ class EnhancedChoreographyGeneratorPro:
                 # 添加音频特征信息
                 segment['audio_features'] = {
                     'tempo': segment_info.get('tempo', 120),
+                    'tempo_drift': segment_info.get('tempo_drift', 0.0),
                     'energy': segment_info.get('energy', 0.5),
                     'brightness': segment_info.get('brightness', 0.5),
                     'complexity': segment_info.get('complexity', 0.5)
@@ -115,17 +168,18 @@ class EnhancedChoreographyGeneratorPro:
                     segment, dance_style, features
                 )
                 
-                # 添加难度评估
-                segment['difficulty'] = self._assess_difficulty_pro(segment)
-                
-                # 添加能量等级
-                segment['energy_level'] = self._assess_energy_level_pro(segment)
-                
                 # 添加技术要点
                 segment['technical_points'] = self._generate_technical_points(
                     segment, dance_style
                 )
         
+        # 所有片段的难度评估和能量等级一次完成（按动作属性表向量化评分）
+        scored = enhanced.get('segments', [])[:len(segments)]
+        difficulties, energy_levels = score_segments(scored, 'pro')
+        for segment, difficulty, energy_level in zip(scored, difficulties, energy_levels):
+            segment['difficulty'] = difficulty
+            segment['energy_level'] = energy_level
+        
         # 添加全局建议
         enhanced['global_advice'] = self._generate_global_advice_pro(
             enhanced, dance_style, features
@@ -183,82 +237,6 @@ class EnhancedChoreographyGeneratorPro:
         
         return tips
     
-    def _assess_difficulty_pro(self, segment: Dict) -> str:
-        """专业级难度评估"""
-        moves = segment.get('moves', [])
-        level = segment.get('level', 'mid')
-        transition = segment.get('transition', 'quarter-turn')
-        
-        difficulty_score = 0
-        
-        # 根据动作复杂度评分
-        complex_moves = ['windmill', 'headspin', 'flare', 'turtle', 'cricket', 'airflare']
-        intermediate_moves = ['spin', 'turn', 'jump', 'leap', 'slide', 'freeze']
-        
-        for move in moves:
-            if any(complex_move in move.lower() for complex_move in complex_moves):
-                difficulty_score += 4
-            elif any(intermediate_move in move.lower() for intermediate_move in intermediate_moves):
-                difficulty_score += 2
-            else:
-                difficulty_score += 1
-        
-        # 根据层次评分
-        if level == 'floor':
-            difficulty_score += 3
-        elif level == 'high':
-            difficulty_score += 2
-        
-        # 根据过渡复杂度评分
-        complex_transitions = ['full_turn', 'spin', 'level_drop', 'travel_diagonal', 'air_step']
-        if any(complex_transition in transition for complex_transition in complex_transitions):
-            difficulty_score += 3
-        
-        # 转换为难度等级
-        if difficulty_score <= 4:
-            return "初级"
-        elif difficulty_score <= 8:
-            return "中级"
-        elif difficulty_score <= 12:
-            return "高级"
-        else:
-            return "专业级"
-    
-    def _assess_energy_level_pro(self, segment: Dict) -> str:
-        """专业级能量评估"""
-        accent = segment.get('accent', 'medium')
-        moves = segment.get('moves', [])
-        
-        energy_score = 0
-        
-        # 根据重音评分
-        if accent == 'strong':
-            energy_score += 4
-        elif accent == 'medium':
-            energy_score += 2
-        else:
-            energy_score += 1
-        
-        # 根据动作类型评分
-        high_energy_moves = ['jump', 'leap', 'bounce', 'pop', 'hit', 'punch', 'explosive']
-        medium_energy_moves = ['run', 'fast', 'quick', 'dynamic']
-        
-        for move in moves:
-            if any(energy_move in move.lower() for energy_move in high_energy_moves):
-                energy_score += 3
-            elif any(energy_move in move.lower() for energy_move in medium_energy_moves):
-                energy_score += 1
-        
-        # 转换为能量等级
-        if energy_score <= 3:
-            return "低能量"
-        elif energy_score <= 6:
-            return "中等能量"
-        elif energy_score <= 9:
-            return "高能量"
-        else:
-            return "超高能量"
-    
     def _generate_technical_points(self, segment: Dict, dance_style: str) -> List[str]:
         """生成技术要点"""
         technical_points = []
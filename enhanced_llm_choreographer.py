@@ -3,13 +3,23 @@
 实现结构化输出、多样性控制、Few-shot示例和动作词库集成
 """
 
-import openai
 import json
 import jsonschema
 import os
-from typing import List, Dict, Any, Optional
+import queue
+import threading
+import time
+from typing import List, Dict, Any, Callable, Optional
 import config
-from action_database import get_action_candidates, get_synonym_replacement, create_rhythm_placeholder
+from incremental_json import SegmentStreamParser
+from llm_cache import cached_completion, get_default_cache
+from llm_clients import get_client
+from llm_resilience import call_with_retry, get_breaker
+from llm_telemetry import LLMTelemetry, start_generation
+from prompt_packing import estimate_tokens, pack_segments
+from prompt_templates import FEW_SHOT_EXAMPLES, PromptTemplate, get_template
+from compact_format import decode_choreography, decode_segment, format_candidates
+from action_database import get_action_candidates, replace_synonyms, create_rhythm_placeholder
 import random
 
 class EnhancedLLMChoreographer:
@@ -21,7 +31,17 @@ class EnhancedLLMChoreographer:
         if not api_key:
             raise ValueError("请设置OPENAI_API_KEY环境变量")
         
-        self.client = openai.OpenAI(api_key=api_key)
+        # 进程级共享的客户端（复用HTTP长连接），重试由容错层统一处理
+        self.client = get_client(api_key, config.OPENAI_BASE_URL)
+        self.breaker = get_breaker(api_key, config.OPENAI_BASE_URL)
+        self.model = "gpt-3.5-turbo"
+        # 响应缓存，cache_mode可在每次调用时覆盖
+        self.response_cache = get_default_cache()
+        self.cache_mode = config.LLM_CACHE_MODE
+        # 调用遥测，每次生成开始时由 start_telemetry 重置
+        self.telemetry = start_generation()
+        # 紧凑输出：模型只输出编码，本地解码为完整schema
+        self.compact_output = config.LLM_COMPACT_OUTPUT
         
         # JSON Schema定义
         self.choreography_schema = {
@@ -58,84 +78,94 @@ class EnhancedLLMChoreographer:
             "required": ["style", "global_cues", "segments"]
         }
         
-        # Few-shot示例
-        self.few_shot_examples = [
-            {
-                "style": "Hip-Hop",
-                "global_cues": {
-                    "energy_level": "high",
-                    "mood": "aggressive and confident",
-                    "key_characteristics": ["bounce", "isolation", "rhythmic precision"]
-                },
-                "segments": [
-                    {
-                        "idx": 0,
-                        "time": "0:00-0:16",
-                        "accent": "strong",
-                        "level": "mid",
-                        "plane": "frontal",
-                        "motifs": ["bounce", "rock"],
-                        "moves": ["two-step", "chest-pop", "shoulder-roll", "freeze"],
-                        "transition": "quarter-turn"
-                    },
-                    {
-                        "idx": 1,
-                        "time": "0:16-0:32",
-                        "accent": "medium",
-                        "level": "low",
-                        "plane": "sagittal",
-                        "motifs": ["groove", "sway"],
-                        "moves": ["running-man", "body-wave", "hip-roll", "level-drop"],
-                        "transition": "travel-diagonal"
-                    }
-                ]
-            },
-            {
-                "style": "House",
-                "global_cues": {
-                    "energy_level": "medium",
-                    "mood": "smooth and flowing",
-                    "key_characteristics": ["groove", "flow", "smooth transitions"]
-                },
-                "segments": [
-                    {
-                        "idx": 0,
-                        "time": "0:00-0:16",
-                        "accent": "medium",
-                        "level": "mid",
-                        "plane": "transverse",
-                        "motifs": ["groove", "sway"],
-                        "moves": ["jack", "skate", "lofting", "shuffle"],
-                        "transition": "smooth-transition"
-                    },
-                    {
-                        "idx": 1,
-                        "time": "0:16-0:32",
-                        "accent": "weak",
-                        "level": "high",
-                        "plane": "frontal",
-                        "motifs": ["flow", "liquid"],
-                        "moves": ["vogue", "waacking", "liquid", "tutting"],
-                        "transition": "flow-transition"
-                    }
-                ]
-            }
-        ]
+        # Few-shot示例（与预编译提示模板共用）
+        self.few_shot_examples = FEW_SHOT_EXAMPLES
+        
+        # 输出token预算：按Few-shot示例估计每个片段和公共字段的输出长度，留出余量
+        template = self.few_shot_examples[0]
+        segment_tokens = max(estimate_tokens(json.dumps(segment, ensure_ascii=False, indent=2))
+                             for example in self.few_shot_examples for segment in example['segments'])
+        self.output_tokens_per_segment = int(segment_tokens * 1.3)
+        self.output_overhead_tokens = int(estimate_tokens(json.dumps(
+            {**template, 'segments': []}, ensure_ascii=False, indent=2)) * 1.3)
+        # 紧凑格式每个片段是一个短整数数组（按6个动作估计）
+        self.compact_tokens_per_segment = int(estimate_tokens('[15,0,1,0,[2,3],[12,3,40,7,25,61],6],') * 1.3)
+        self.compact_overhead_tokens = int(estimate_tokens(
+            '{"g":[2,"aggressive and confident","bounce","isolation","rhythmic precision"],"segments":[]}') * 1.3)
+    
+    def start_telemetry(self) -> LLMTelemetry:
+        """开始一次生成的调用遥测，之后的调用都记录到返回的对象"""
+        self.telemetry = start_generation()
+        return self.telemetry
     
     def _call_openai_enhanced(self, messages: List[Dict], max_tokens: int = 1000, 
                             temperature: float = 0.9, presence_penalty: float = 0.6, 
-                            frequency_penalty: float = 0.4) -> str:
-        """增强的OpenAI API调用"""
-        try:
+                            frequency_penalty: float = 0.4, cache_mode: Optional[str] = None,
+                            stream_parser: Optional[SegmentStreamParser] = None,
+                            stage: str = 'structured') -> str:
+        """增强的OpenAI API调用，cache_mode为 'replay' / 'fresh' / 'off'，默认使用 self.cache_mode
+
+        限流、超时和5xx错误按指数退避重试，熔断器打开时立即抛出CircuitOpenError。
+        传入stream_parser时以流式请求，每收到一段文本就送入解析器；
+        每次重试前重置解析器，命中缓存时把缓存的完整文本一次性送入。
+        stage 为遥测中记录的流水线阶段。
+        """
+        call = self.telemetry.track(stage, self.model, messages)
+        
+        def request(timeout):
+            call.attempt()
+            if stream_parser is None:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    presence_penalty=presence_penalty,
+                    frequency_penalty=frequency_penalty,
+                    timeout=timeout
+                )
+                call.first_byte()
+                call.set_usage(response.usage)
+                return response.choices[0].message.content.strip()
+            
+            stream_parser.reset()
             response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
+                model=self.model,
                 messages=messages,
                 max_tokens=max_tokens,
                 temperature=temperature,
                 presence_penalty=presence_penalty,
-                frequency_penalty=frequency_penalty
+                frequency_penalty=frequency_penalty,
+                stream=True,
+                stream_options={'include_usage': True},
+                timeout=timeout
             )
-            return response.choices[0].message.content.strip()
+            for chunk in response:
+                if getattr(chunk, 'usage', None) is not None:
+                    call.set_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    call.first_byte()
+                    stream_parser.feed(chunk.choices[0].delta.content)
+            return stream_parser.text.strip()
+        
+        try:
+            params = {
+                'max_tokens': max_tokens,
+                'temperature': temperature,
+                'presence_penalty': presence_penalty,
+                'frequency_penalty': frequency_penalty
+            }
+            if config.OPENAI_BASE_URL:
+                # 不同端点（如本地模拟服务）的响应互不回放
+                params['base_url'] = config.OPENAI_BASE_URL
+            with call:
+                content = cached_completion(self.response_cache, cache_mode or self.cache_mode,
+                                            self.model, messages, params,
+                                            lambda: call_with_retry(request, self.breaker))
+                call.complete(content)
+            if stream_parser is not None and call.attempts == 0:
+                stream_parser.feed(content)
+            return content
         except Exception as e:
             print(f"❌ API调用失败: {e}")
             raise e
@@ -167,8 +197,8 @@ class EnhancedLLMChoreographer:
             return False
     
     def _apply_synonym_replacement(self, moves: List[str]) -> List[str]:
-        """应用同义词替换"""
-        return [get_synonym_replacement(move) for move in moves]
+        """应用同义词替换（整组动作一次匹配）"""
+        return replace_synonyms(moves)
     
     def _add_rhythm_placeholders(self, moves: List[str]) -> str:
         """添加节奏占位符"""
@@ -177,62 +207,290 @@ class EnhancedLLMChoreographer:
     def generate_enhanced_choreography(self, audio_features: Dict, 
                                      segments: List[Dict], 
                                      dance_style: str,
-                                     avoid_actions: List[str] = None) -> Dict:
-        """生成增强编舞"""
+                                     avoid_actions: List[str] = None,
+                                     cache_mode: Optional[str] = None,
+                                     on_segment: Optional[Callable[[int, Dict], None]] = None,
+                                     stream: Optional[bool] = None,
+                                     deadline: Optional[float] = None) -> Dict:
+        """生成增强编舞，cache_mode 为 'replay'（回放相同请求）/ 'fresh'（重新采样）/ 'off'
+
+        连续片段按输出token预算打包成批次，每批一个请求；
+        上一批的结尾动作作为上下文传给下一批，最后合并为完整的编舞结构。
+        stream为True（默认取 config.LLM_STREAMING）时流式接收响应，segments中的每个元素
+        一闭合就单独做Schema验证和后处理，并以 (全局编号, 片段) 调用on_segment；
+        响应不完整时保留已验证的片段，只对其余片段使用备用方案。每个片段恰好回调一次。
+        deadline（秒）不为None时进入截止时间模式，见 _generate_with_deadline。
+        """
         if avoid_actions is None:
             avoid_actions = []
+        if stream is None:
+            stream = config.LLM_STREAMING
         
         print(f"🎭 开始生成{dance_style}风格编舞...")
         
         # 获取候选动作
         action_candidates = get_action_candidates(dance_style, num_candidates=15, avoid_actions=avoid_actions)
+        prompt = self._build_prompt(dance_style, action_candidates, avoid_actions)
         
-        # 构建Few-shot示例字符串
-        examples_str = "\n\n".join([json.dumps(example, ensure_ascii=False, indent=2) 
-                                   for example in self.few_shot_examples])
+        if deadline is not None:
+            return self._generate_with_deadline(prompt, audio_features, segments, dance_style,
+                                                action_candidates, cache_mode, on_segment, stream, deadline)
         
-        # 构建系统提示
-        system_prompt = f"""你是一个专业的编舞师，擅长{dance_style}风格。请根据音频特征生成结构化的编舞建议。
-
-要求：
-1. 输出必须是有效的JSON格式，严格遵循提供的schema
-2. 使用丰富的动作词汇，避免重复
-3. 考虑动作的层次、方向和动态变化
-4. 每个片段包含4-6个具体动作
-5. 动作要符合{dance_style}风格特点
-
-候选动作池：{', '.join(action_candidates)}
-需避免动作：{', '.join(avoid_actions) if avoid_actions else '无'}
-
-Few-shot示例：
-{examples_str}
-
-请严格按照以下JSON Schema输出："""
-
-        # 构建用户提示
-        user_prompt = f"""音频特征分析：
-- BPM: {float(audio_features.get('bpm', 120)):.1f}
-- 能量等级: {audio_features.get('energy_level', 'medium')}
-- 舞蹈风格: {dance_style}
-- 片段数量: {len(segments)}
-
-请为每个片段生成详细的编舞建议，包含：
-- 动作层次变化 (high/mid/low/floor)
-- 空间平面 (frontal/sagittal/transverse)  
-- 动态变化 (strong/medium/weak accent)
-- 具体动作组合
-- 过渡方式
-
-确保动作多样性和{dance_style}风格特色。"""
+        emit = (lambda index, segment, source: on_segment(index, segment)) if on_segment is not None else None
+        merged = self._run_batches(prompt, audio_features, segments, dance_style, action_candidates,
+                                   cache_mode, stream, emit)
+        if merged is None:
+            return self._generate_fallback_choreography(segments, dance_style, action_candidates)
+        
+        print("✅ 增强编舞生成成功！")
+        return merged
+    
+    def _run_batches(self, prompt: PromptTemplate, audio_features: Dict, segments: List[Dict], dance_style: str,
+                     action_candidates: List[str], cache_mode: Optional[str], stream: bool,
+                     emit: Optional[Callable[[int, Dict, str], None]] = None,
+                     cancelled: Optional[threading.Event] = None) -> Optional[Dict]:
+        """
+        按批次生成并合并
+        
+        Args:
+            emit: 每个片段确定后的回调 (全局编号, 片段, 来源)，来源为 'llm' 或 'fallback'
+            cancelled: 设置后不再发出新的批次请求
+        
+        Returns:
+            合并后的编舞；没有任何批次时返回None
+        """
+        if self.compact_output:
+            per_segment, overhead = self.compact_tokens_per_segment, self.compact_overhead_tokens
+        else:
+            per_segment, overhead = self.output_tokens_per_segment, self.output_overhead_tokens
+        batches = pack_segments([per_segment] * len(segments), config.LLM_BATCH_MAX_TOKENS, overhead)
+        if len(batches) > 1:
+            print(f"📦 {len(segments)} 个片段按token预算打包为 {len(batches)} 个请求")
+        
+        merged = None
+        context = ""
+        for batch in batches:
+            if cancelled is not None and cancelled.is_set():
+                break
+            batch_segments = [segments[i] for i in batch]
+            streamed: Dict[int, Dict] = {}
+            
+            def on_item(offset: int, segment: Dict, start: int = batch[0], size: int = len(batch),
+                        streamed: Dict[int, Dict] = streamed) -> None:
+                # 重试后重新收到的同一位置不再重复推送
+                if offset >= size or offset in streamed:
+                    return
+                self._postprocess_segment(segment, start + offset)
+                streamed[offset] = segment
+                if emit is not None:
+                    emit(start + offset, segment, 'llm')
+            
+            batch_result = self._generate_batch(prompt, audio_features, batch_segments, batch[0],
+                                                len(segments), dance_style, context, cache_mode,
+                                                on_item if stream else None)
+            source = 'llm'
+            if batch_result is None:
+                batch_result = self._generate_fallback_choreography(batch_segments, dance_style, action_candidates)
+                source = 'fallback'
+                if streamed:
+                    print(f"♻️ 保留流式收到的 {len(streamed)}/{len(batch)} 个有效片段")
+            
+            # 已推送的片段保持不变（界面上已经显示），片段编号统一为全局编号
+            for offset, segment in streamed.items():
+                batch_result['segments'][offset] = segment
+            for offset, segment in enumerate(batch_result['segments'][:len(batch)]):
+                segment['idx'] = batch[0] + offset
+                if offset not in streamed:
+                    self._postprocess_segment(segment, batch[0] + offset)
+                    if emit is not None:
+                        emit(batch[0] + offset, segment, source)
+            
+            if merged is None:
+                merged = batch_result
+                merged['segments'] = batch_result['segments'][:len(batch)]
+            else:
+                merged['segments'].extend(batch_result['segments'][:len(batch)])
+            context = self._summarize_batch_context(merged['segments'])
+        
+        return merged
+    
+    def _generate_with_deadline(self, prompt: PromptTemplate, audio_features: Dict, segments: List[Dict],
+                                dance_style: str, action_candidates: List[str], cache_mode: Optional[str],
+                                on_segment: Optional[Callable[[int, Dict], None]], stream: bool,
+                                deadline: float) -> Dict:
+        """
+        截止时间模式：先在本地算好备用编舞，LLM在后台线程中生成；
+        截止前到达的LLM片段替换对应的备用片段，其余片段使用备用方案。
+        on_segment 在调用线程中回调。截止后不再发出新的批次请求，
+        已在进行中的请求在后台结束（受 LLM_REQUEST_DEADLINE 限制）后丢弃。
+        
+        Returns:
+            编舞结果，deadline_metadata 中记录被LLM结果替换的片段
+        """
+        started = time.monotonic()
+        speculative = self._generate_fallback_choreography(segments, dance_style, action_candidates)
+        for i, segment in enumerate(speculative['segments']):
+            segment['idx'] = i
+        
+        arrived: queue.Queue = queue.Queue()
+        cancelled = threading.Event()
+        outcome: Dict[str, Any] = {}
+        
+        def worker():
+            try:
+                outcome['merged'] = self._run_batches(
+                    prompt, audio_features, segments, dance_style, action_candidates, cache_mode, stream,
+                    lambda index, segment, source: arrived.put((index, segment, source)), cancelled)
+            except Exception as e:
+                print(f"❌ 后台LLM生成出错: {e}")
+            finally:
+                arrived.put(None)
+        
+        threading.Thread(target=worker, daemon=True).start()
+        
+        final_segments = list(speculative['segments'])
+        delivered = set()
+        upgraded = []
+        finished = False
+        while len(delivered) < len(segments):
+            remaining = started + deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = arrived.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                finished = True
+                break
+            index, segment, source = item
+            if index in delivered:
+                continue
+            delivered.add(index)
+            if source == 'llm':
+                final_segments[index] = segment
+                upgraded.append(index)
+            if on_segment is not None:
+                on_segment(index, final_segments[index])
+        # 片段全部到达时后台线程正在收尾，在剩余时间内等待它给出整体风格描述
+        while not finished and len(delivered) == len(segments):
+            try:
+                finished = arrived.get(timeout=max(0.0, started + deadline - time.monotonic())) is None
+            except queue.Empty:
+                break
+        cancelled.set()
+        
+        for index in range(len(segments)):
+            if index not in delivered and on_segment is not None:
+                on_segment(index, final_segments[index])
+        
+        # 后台生成已完成时沿用LLM给出的整体风格描述
+        result = speculative
+        merged = outcome.get('merged')
+        if merged is not None:
+            result['style'] = merged.get('style', result['style'])
+            result['global_cues'] = merged.get('global_cues', result['global_cues'])
+        result['segments'] = final_segments
+        result['deadline_metadata'] = {
+            'deadline_seconds': deadline,
+            'elapsed_seconds': time.monotonic() - started,
+            'llm_completed': finished,
+            'upgraded_segments': sorted(upgraded),
+            'fallback_segments': [i for i in range(len(segments)) if i not in upgraded]
+        }
+        print(f"⏱️ 截止时间 {deadline:.1f}s 内 {len(upgraded)}/{len(segments)} 个片段使用LLM结果")
+        return result
+    
+    def _postprocess_segment(self, segment: Dict, idx: int) -> None:
+        """后处理单个片段：全局编号、同义词替换和节奏占位（已处理过的片段跳过）"""
+        segment['idx'] = idx
+        if 'moves' in segment and 'rhythm_breakdown' not in segment:
+            # 应用同义词替换
+            segment['moves'] = self._apply_synonym_replacement(segment['moves'])
+            # 添加节奏占位
+            segment['rhythm_breakdown'] = self._add_rhythm_placeholders(segment['moves'])
+    
+    def _build_prompt(self, dance_style: str, action_candidates: List[str],
+                      avoid_actions: List[str]) -> PromptTemplate:
+        """构建本次生成的提示模板（各批次共用）
 
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
+        系统消息为按风格预编译的静态前缀；候选动作池和需避免动作随每次生成变化，放在用户消息开头。
+        紧凑输出时候选动作以 "ID=动作" 列出。
+        """
+        if self.compact_output:
+            return get_template('structured_compact', dance_style).partial(
+                candidates=format_candidates(dance_style, action_candidates),
+                avoid=', '.join(avoid_actions) if avoid_actions else '无'
+            )
+        return get_template('structured', dance_style).partial(
+            candidates=', '.join(action_candidates),
+            avoid=', '.join(avoid_actions) if avoid_actions else '无'
+        )
+    
+    def _generate_batch(self, prompt: PromptTemplate, audio_features: Dict, batch_segments: List[Dict],
+                        start_index: int, total_segments: int, dance_style: str,
+                        context: str, cache_mode: Optional[str],
+                        on_item: Optional[Callable[[int, Dict], None]] = None) -> Optional[Dict]:
+        """
+        为一批连续片段生成编舞
+        
+        Args:
+            on_item: 流式模式下每个通过Schema验证的片段的回调 (批内序号, 片段)，None时不流式请求
+        
+        Returns:
+            通过Schema验证的编舞数据，失败时返回None（由调用方对本批使用备用方案）
+        """
+        # 每个片段的局部速度（来自整轨节拍网格）
+        segment_tempo_lines = "\n".join(
+            f"- 片段{start_index + i}: {float(segment['start_time']):.1f}s-{float(segment['end_time']):.1f}s, "
+            f"局部速度 {float(segment.get('tempo', audio_features.get('bpm', 120))):.1f} BPM, "
+            f"速度漂移 {float(segment.get('tempo_drift', 0.0)):+.1f} BPM"
+            for i, segment in enumerate(batch_segments)
+        )
+        
+        if len(batch_segments) < total_segments:
+            batch_note = (f"\n本次只生成片段{start_index}到片段{start_index + len(batch_segments) - 1}"
+                          f"（全曲共{total_segments}个片段），idx使用上面的全局编号。")
+        else:
+            batch_note = ""
+        context_note = f"\n前面片段的衔接信息：\n{context}\n" if context else ""
+        
+        messages = prompt.render(
+            bpm=f"{float(audio_features.get('bpm', 120)):.1f}",
+            energy_level=audio_features.get('energy_level', 'medium'),
+            segment_count=len(batch_segments),
+            segment_tempo_lines=segment_tempo_lines,
+            batch_note=batch_note,
+            context_note=context_note
+        )
+        
+        compact = prompt.name == 'structured_compact'
+        times = [f"{float(segment['start_time']):.1f}s-{float(segment['end_time']):.1f}s" for segment in batch_segments]
+        
+        stream_parser = None
+        if on_item is not None:
+            segment_schema = self.choreography_schema['properties']['segments']['items']
+            
+            def on_stream_item(offset: int, segment) -> None:
+                try:
+                    if compact:
+                        segment = decode_segment(segment, dance_style, times[offset] if offset < len(times) else "")
+                    jsonschema.validate(segment, segment_schema)
+                except ValueError as e:
+                    print(f"⚠️ 片段{start_index + offset} 编码无效: {e}")
+                    return
+                except jsonschema.ValidationError as e:
+                    print(f"⚠️ 片段{start_index + offset} Schema验证失败: {e.message}")
+                    return
+                on_item(offset, segment)
+            
+            stream_parser = SegmentStreamParser(on_stream_item)
         
         # 调用API
         try:
-            response = self._call_openai_enhanced(messages, max_tokens=1200, temperature=0.9)
+            response = self._call_openai_enhanced(messages, max_tokens=config.LLM_BATCH_MAX_TOKENS,
+                                                  temperature=0.9, cache_mode=cache_mode,
+                                                  stream_parser=stream_parser, stage='structured_batch')
             cleaned_response = self._clean_json_response(response)
             
             # 解析JSON
@@ -241,27 +499,43 @@ Few-shot示例：
             except json.JSONDecodeError as e:
                 print(f"❌ JSON解析失败: {e}")
                 print(f"原始内容: {cleaned_response}")
-                return self._generate_fallback_choreography(segments, dance_style, action_candidates)
+                return None
+            
+            # 紧凑格式展开为完整schema
+            if compact:
+                try:
+                    choreography_data = decode_choreography(choreography_data, dance_style, times)
+                except ValueError as e:
+                    print(f"❌ 紧凑格式解码失败: {e}")
+                    return None
             
             # 验证Schema
             if not self._validate_json_schema(choreography_data):
                 print("⚠️ Schema验证失败，使用备用方案")
-                return self._generate_fallback_choreography(segments, dance_style, action_candidates)
+                return None
             
-            # 后处理：同义词替换和节奏占位
-            for segment in choreography_data.get('segments', []):
-                if 'moves' in segment:
-                    # 应用同义词替换
-                    segment['moves'] = self._apply_synonym_replacement(segment['moves'])
-                    # 添加节奏占位
-                    segment['rhythm_breakdown'] = self._add_rhythm_placeholders(segment['moves'])
+            if len(choreography_data['segments']) < len(batch_segments):
+                print(f"⚠️ 返回片段数不足（{len(choreography_data['segments'])}/{len(batch_segments)}），使用备用方案")
+                return None
             
-            print("✅ 增强编舞生成成功！")
             return choreography_data
             
         except Exception as e:
             print(f"❌ 生成编舞时出错: {e}")
-            return self._generate_fallback_choreography(segments, dance_style, action_candidates)
+            return None
+    
+    def _summarize_batch_context(self, generated_segments: List[Dict], max_moves: int = 12) -> str:
+        """把已生成片段压缩成一段简短的上下文，供下一批衔接和去重"""
+        last = generated_segments[-1]
+        used_moves = []
+        for segment in reversed(generated_segments):
+            for move in segment.get('moves', []):
+                if move not in used_moves:
+                    used_moves.append(move)
+        return (f"- 上一片段(片段{last.get('idx')}): level={last.get('level')}, plane={last.get('plane')}, "
+                f"accent={last.get('accent')}, 结尾动作={', '.join(last.get('moves', [])[-2:])}, "
+                f"过渡={last.get('transition')}\n"
+                f"- 近期已用动作（尽量避免重复）: {', '.join(used_moves[:max_moves])}")
     
     def _generate_fallback_choreography(self, segments: List[Dict], 
                                       dance_style: str, 
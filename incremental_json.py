@@ -0,0 +1,91 @@
+"""
+增量JSON片段解析器
+流式接收LLM输出的文本，顶层对象中 "segments" 数组的每个元素（对象或紧凑格式的数组）
+一闭合就立即解析并回调，不必等待完整响应
+"""
+
+import json
+from typing import Callable, Dict, List
+
+
+class SegmentStreamParser:
+    """从流式文本中逐个提取 segments 数组元素
+
+    逐字符跟踪字符串/转义状态和括号深度：
+    顶层对象内键为 "segments" 的数组里，每个深度回到数组层的 '}' 或 ']' 都结束一个元素。
+    代码块标记等JSON之外的字符在遇到第一个 '{' 之前会被忽略。
+    """
+
+    def __init__(self, on_item: Callable[[int, Dict], None], array_key: str = 'segments'):
+        self.on_item = on_item
+        self.array_key = array_key
+        self.reset()
+
+    def reset(self) -> None:
+        """丢弃已接收的文本，重新开始解析（请求重试时使用）"""
+        self.buffer: List[str] = []
+        self.items: List[Dict] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None
+        self._current_key = None
+        self._array_depth = None
+        self._item_start = None
+        self._pos = 0
+
+    def feed(self, text: str) -> None:
+        """输入一段新文本"""
+        for char in text:
+            self.buffer.append(char)
+            self._consume(char)
+            self._pos += 1
+
+    def _consume(self, char: str) -> None:
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == '\\':
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                if self._depth == 1:
+                    self._last_string = ''.join(self.buffer[self._string_start + 1:self._pos])
+            return
+
+        if char == '"':
+            self._in_string = True
+            self._string_start = self._pos
+        elif char == ':' and self._depth == 1:
+            self._current_key = self._last_string
+        elif char in '{[':
+            if char == '[' and self._depth == 1 and self._current_key == self.array_key:
+                self._array_depth = self._depth + 1
+            elif self._array_depth is not None and self._depth == self._array_depth:
+                self._item_start = self._pos
+            self._depth += 1
+        elif char in '}]':
+            self._depth -= 1
+            if self._array_depth is not None:
+                if self._depth == self._array_depth and self._item_start is not None:
+                    self._emit(''.join(self.buffer[self._item_start:self._pos + 1]))
+                    self._item_start = None
+                elif char == ']' and self._depth == self._array_depth - 1:
+                    self._array_depth = None
+        elif char == ',' and self._depth == 1:
+            self._current_key = None
+
+    def _emit(self, text: str) -> None:
+        try:
+            item = json.loads(text)
+        except json.JSONDecodeError:
+            return
+        index = len(self.items)
+        self.items.append(item)
+        self.on_item(index, item)
+
+    @property
+    def text(self) -> str:
+        """目前收到的全部文本"""
+        return ''.join(self.buffer)
@@ -0,0 +1,97 @@
+"""
+编译的多关键词匹配器
+把若干关键词表编译成一个按前缀树组织的正则表达式，对一整份编舞的所有动作名称做一次扫描，
+得到每个动作命中的关键词和类别；增加关键词只会扩展前缀树，不会增加扫描次数。
+"""
+
+import bisect
+import re
+from typing import Dict, FrozenSet, Iterable, List, Sequence
+
+
+def normalize(text: str) -> str:
+    """小写并把下划线统一为连字符（LLM输出的 full_turn 与词库中的 full-turn 视为同一写法）"""
+    return text.lower().replace('_', '-')
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """按公共前缀合并的正则：每个位置沿前缀树匹配，优先最长的关键词"""
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: Dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            return '(?:' + body + ')?'
+        return body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """多关键词子串匹配
+
+    语义与 any(normalize(keyword) in normalize(text) for keyword in 表) 相同
+    （不区分大小写、下划线与连字符等同的子串匹配），
+    但所有表、所有文本只需一次正则扫描：前瞻断言在每个位置找出最长的关键词，
+    较短的关键词若是它的子串则一并计入，因此重叠的关键词不会漏掉。
+    """
+
+    def __init__(self, tables: Dict[str, Iterable[str]]):
+        """
+        Args:
+            tables: 类别 -> 关键词列表，同一关键词可以属于多个类别
+        """
+        keyword_labels: Dict[str, set] = {}
+        for label, keywords in tables.items():
+            for keyword in keywords:
+                keyword_labels.setdefault(normalize(keyword), set()).add(label)
+        self.labels = list(tables)
+        # 命中某关键词时，同时命中所有是它子串的关键词
+        self._contained = {
+            keyword: frozenset(other for other in keyword_labels if other in keyword)
+            for keyword in keyword_labels
+        }
+        self._keyword_labels = {keyword: frozenset(labels) for keyword, labels in keyword_labels.items()}
+        self._pattern = re.compile('(?=(' + _trie_pattern(keyword_labels) + '))') if keyword_labels else None
+
+    def matches(self, texts: Sequence[str]) -> List[FrozenSet[str]]:
+        """
+        一次扫描找出每段文本包含的关键词
+
+        Returns:
+            与texts一一对应的关键词集合（规范化后的写法）
+        """
+        found: List[set] = [set() for _ in texts]
+        if self._pattern is None or not texts:
+            return [frozenset() for _ in texts]
+        # 关键词不含换行，用换行拼接后各文本之间不会产生跨界匹配
+        lowered = [normalize(text) for text in texts]
+        starts = []
+        position = 0
+        for text in lowered:
+            starts.append(position)
+            position += len(text) + 1
+        joined = '\n'.join(lowered)
+        for match in self._pattern.finditer(joined):
+            keyword = match.group(1)
+            if keyword:
+                found[bisect.bisect_right(starts, match.start()) - 1].update(self._contained[keyword])
+        return [frozenset(keywords) for keywords in found]
+
+    def classify(self, texts: Sequence[str]) -> List[FrozenSet[str]]:
+        """
+        一次扫描找出每段文本命中的类别
+
+        Returns:
+            与texts一一对应的类别集合
+        """
+        return [frozenset(label for keyword in keywords for label in self._keyword_labels[keyword])
+                for keywords in self.matches(texts)]
@@ -0,0 +1,183 @@
+"""
+LLM响应缓存
+以模型、规范化后的消息、temperature、max_tokens和惩罚参数为键，
+把响应保存在本地SQLite中，支持TTL过期和按总大小的LRU淘汰
+
+每次调用可选择缓存模式：
+- 'replay': 命中时直接回放缓存的响应，未命中时调用API并写入缓存
+- 'fresh':  总是调用API重新采样，结果写入缓存供以后回放
+- 'off':    不读也不写缓存
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import config
+
+CACHE_MODES = ('replay', 'fresh', 'off')
+
+
+def normalize_messages(messages: List[Dict]) -> List[Dict]:
+    """规范化消息：统一换行符、去掉行尾空白和首尾空行，合并连续空行"""
+    normalized = []
+    for message in messages:
+        content = str(message.get('content', '')).replace('\r\n', '\n').replace('\r', '\n')
+        content = '\n'.join(line.rstrip() for line in content.split('\n'))
+        content = re.sub(r'\n{3,}', '\n\n', content).strip()
+        normalized.append({'role': str(message.get('role', 'user')).lower(), 'content': content})
+    return normalized
+
+
+class LLMResponseCache:
+    """基于SQLite的LLM响应缓存
+
+    每次操作单独打开连接，多个线程和Streamlit工作进程可以共享同一个数据库文件。
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: float = 7 * 24 * 3600,
+                 max_bytes: int = 64 * 1024 * 1024):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT, response TEXT, "
+                "created REAL, accessed REAL, size INTEGER)")
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict], **params) -> str:
+        """
+        生成缓存键
+
+        Args:
+            model: 模型名称
+            messages: 聊天消息
+            **params: temperature、max_tokens、presence_penalty、frequency_penalty等采样参数
+
+        Returns:
+            十六进制SHA-256键
+        """
+        payload = {
+            'model': model,
+            'messages': normalize_messages(messages),
+            'params': {name: round(value, 6) if isinstance(value, float) else value
+                       for name, value in params.items() if value is not None}
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """读取未过期的响应，未命中时返回None"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def put(self, key: str, model: str, response: str) -> None:
+        """写入响应并按需淘汰"""
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                         (key, model, response, now, now, size))
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """删除过期条目，再按最近访问时间淘汰直到总大小不超过上限"""
+        conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        doomed = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+
+def cached_completion(cache: Optional[LLMResponseCache], cache_mode: str, model: str,
+                      messages: List[Dict], params: Dict, call: Callable[[], str]) -> str:
+    """
+    在缓存之上执行一次补全请求
+
+    Args:
+        cache: 响应缓存，None时直接调用
+        cache_mode: 'replay' / 'fresh' / 'off'
+        model: 模型名称
+        messages: 聊天消息
+        params: 参与缓存键的采样参数
+        call: 实际请求API的函数，返回响应文本
+
+    Returns:
+        响应文本
+    """
+    if cache_mode not in CACHE_MODES:
+        raise ValueError(f"未知的缓存模式: {cache_mode}")
+    if cache is None or cache_mode == 'off':
+        return call()
+
+    key = LLMResponseCache.make_key(model, messages, **params)
+    if cache_mode == 'replay':
+        try:
+            cached = cache.get(key)
+        except sqlite3.Error as e:
+            print(f"⚠️ 读取LLM响应缓存失败: {e}")
+            cached = None
+        if cached is not None:
+            print("⚡ 命中LLM响应缓存")
+            return cached
+
+    result = call()
+    try:
+        cache.put(key, model, result)
+    except sqlite3.Error as e:
+        print(f"⚠️ 写入LLM响应缓存失败: {e}")
+    return result
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> Optional[LLMResponseCache]:
+    """按配置创建的进程级共享缓存，关闭或无法创建时返回None"""
+    global _default_cache
+    if not config.LLM_CACHE_ENABLED:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            try:
+                _default_cache = LLMResponseCache(config.LLM_CACHE_PATH,
+                                                  ttl_seconds=config.LLM_CACHE_TTL_SECONDS,
+                                                  max_bytes=config.LLM_CACHE_MAX_BYTES)
+            except (OSError, sqlite3.Error) as e:
+                print(f"⚠️ LLM响应缓存不可用: {e}")
+                return None
+        return _default_cache
@@ -1,9 +1,16 @@
-import openai
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Optional, Tuple
 import json
 import config
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from llm_cache import cached_completion, get_default_cache
+from llm_clients import get_client
+from llm_resilience import call_with_retry, get_breaker
+from llm_telemetry import LLMTelemetry, start_generation
+from prompt_templates import get_template
+from segment_index import get_default_index, segment_vector
 from dance_references import get_random_reference, format_reference_for_prompt
 
 class LLMChoreographer:
@@ -16,21 +23,59 @@ class LLMChoreographer:
             raise ValueError("请设置OPENAI_API_KEY环境变量")
         
         # 使用新版本OpenAI API (1.0.0+)
-        self.client = openai.OpenAI(api_key=api_key)
+        # 进程级共享的客户端（复用HTTP长连接），重试由容错层统一处理
+        self.client = get_client(api_key, config.OPENAI_BASE_URL)
+        self.breaker = get_breaker(api_key, config.OPENAI_BASE_URL)
+        self.model = "gpt-3.5-turbo"
+        # 响应缓存，cache_mode可在每次调用时覆盖
+        self.response_cache = get_default_cache()
+        self.cache_mode = config.LLM_CACHE_MODE
+        # 调用遥测，每次生成开始时由 start_telemetry 重置
+        self.telemetry = start_generation()
+        # 片段编舞近邻索引，相似片段直接复用已验证的编舞
+        self.segment_index = get_default_index()
         print(f"🔧 LLMChoreographer初始化完成，使用增强版舞蹈参考系统")
     
-    def _call_openai(self, messages, max_tokens=100, temperature=0.7):
-        """统一的OpenAI API调用方法"""
+    def start_telemetry(self) -> LLMTelemetry:
+        """开始一次生成的调用遥测，之后的调用都记录到返回的对象"""
+        self.telemetry = start_generation()
+        return self.telemetry
+    
+    def _call_openai(self, messages, max_tokens=100, temperature=0.7, cache_mode: Optional[str] = None,
+                     stage: str = 'llm'):
+        """统一的OpenAI API调用方法
+
+        限流、超时和5xx错误按指数退避重试，熔断器打开时立即抛出CircuitOpenError；
+        cache_mode: 'replay' 回放缓存的相同请求，'fresh' 重新采样，'off' 不使用缓存；
+        默认使用 self.cache_mode；stage 为遥测中记录的流水线阶段
+        """
         print(f"📞 调用OpenAI API，消息数量: {len(messages)}")
+        call = self.telemetry.track(stage, self.model, messages)
         
-        try:
+        def request(timeout):
+            call.attempt()
             response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
+                model=self.model,
                 messages=messages,
                 max_tokens=max_tokens,
-                temperature=temperature
+                temperature=temperature,
+                timeout=timeout
             )
-            result = response.choices[0].message.content.strip()
+            call.first_byte()
+            call.set_usage(response.usage)
+            return response.choices[0].message.content.strip()
+        
+        params = {'max_tokens': max_tokens, 'temperature': temperature}
+        if config.OPENAI_BASE_URL:
+            # 不同端点（如本地模拟服务）的响应互不回放
+            params['base_url'] = config.OPENAI_BASE_URL
+        
+        try:
+            with call:
+                result = cached_completion(self.response_cache, cache_mode or self.cache_mode, self.model, messages,
+                                           params,
+                                           lambda: call_with_retry(request, self.breaker))
+                call.complete(result)
             print(f"✅ API调用成功，响应长度: {len(result)}")
             return result
         except Exception as e:
@@ -52,7 +97,8 @@ class LLMChoreographer:
         
         return content.strip()
     
-    def generate_choreography_style(self, bpm: float, audio_features: Dict[str, Any]) -> str:
+    def generate_choreography_style(self, bpm: float, audio_features: Dict[str, Any],
+                                    cache_mode: Optional[str] = None) -> str:
         """根据BPM和音频特征推荐舞蹈风格"""
         print(f"🎨 生成舞蹈风格推荐，BPM: {bpm}")
         
@@ -69,7 +115,8 @@ BPM: {bpm}
 请只返回一个最推荐的舞蹈风格名称，不要其他解释。"""
         
         try:
-            result = self._call_openai([{"role": "user", "content": prompt}], max_tokens=50)
+            result = self._call_openai([{"role": "user", "content": prompt}], max_tokens=50, cache_mode=cache_mode,
+                                       stage='style')
             print(f"🎭 推荐舞蹈风格: {result}")
             return result
         except Exception as e:
@@ -77,8 +124,20 @@ BPM: {bpm}
             return "Hip-Hop"
     
     def generate_segment_choreography(self, segment: Dict[str, Any], bpm: float, 
-                                    dance_style: str, segment_index: int, audio_features: Dict[str, Any] = None) -> Dict[str, Any]:
-        """为单个8拍片段生成舞蹈动作"""
+                                    dance_style: str, segment_index: int, audio_features: Dict[str, Any] = None,
+                                    cache_mode: Optional[str] = None) -> Dict[str, Any]:
+        """为单个8拍片段生成舞蹈动作（请求失败时返回默认结构）"""
+        return self._generate_segment(segment, bpm, dance_style, segment_index, audio_features, cache_mode)[0]
+    
+    def _generate_segment(self, segment: Dict[str, Any], bpm: float, dance_style: str, segment_index: int,
+                          audio_features: Dict[str, Any] = None,
+                          cache_mode: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+        """
+        为单个8拍片段生成舞蹈动作
+        
+        Returns:
+            (片段编舞, 是否为LLM结果)；请求失败（包括熔断）或响应无法解析时为默认结构和False
+        """
         print(f"💃 生成第{segment_index + 1}段编舞，风格: {dance_style}")
         
         # 根据BPM和片段索引选择难度级别
@@ -100,33 +159,23 @@ BPM: {bpm}
             audio_features = {}
         energy_level = "高" if audio_features.get('energy_mean', 0) > 0.3 else "中" if audio_features.get('energy_mean', 0) > 0.15 else "低"
         tempo_feel = "很快" if bpm > 140 else "快" if bpm > 120 else "中等" if bpm > 100 else "慢"
+        local_tempo = float(segment.get('tempo', bpm))
+        tempo_drift = float(segment.get('tempo_drift', 0.0))
         
-        prompt = f"""作为专业编舞师，请为以下音乐片段设计简洁实用的舞蹈动作：
-
-音乐特征:
-- BPM: {bpm} ({tempo_feel}节奏)
-- 能量: {energy_level}
-- 舞蹈风格: {dance_style}
-- 节拍数: {segment_beats}
-
-{reference_text}
-
-请分析音乐特点并给出简洁的舞蹈建议，要求：
-
-1. **节奏要点**: 分析这段音乐的特点（如：节奏很快、气氛燥、需要力度大、有低音bass三连音等）
-2. **舞蹈元素**: 推荐3-5个适配的舞蹈动作元素
-3. **关键提示**: 1-2个最重要的技术要点
-
-请直接返回JSON格式，不要使用markdown代码块标记，包含以下字段：
-- "rhythm_analysis": 节奏分析，如"节奏很快，气氛燥，需要力度大，低音bass有三连音"
-- "dance_elements": 推荐的舞蹈元素列表，如["Harlem Shake", "Running Man", "Freeze"]
-- "key_tips": 关键提示，如"动作要卡在bass上，力度要大"
-- "difficulty": 难度等级(1-5)
-- "energy_level": 能量等级(1-5)
-- "reference_moves": 参考的经典动作名称列表"""
+        # 静态的输出要求按风格预编译为系统消息，用户消息只包含本片段的特征
+        messages = get_template('segment', dance_style).render(
+            bpm=bpm,
+            tempo_feel=tempo_feel,
+            local_tempo=f"{local_tempo:.1f}",
+            tempo_drift=f"{tempo_drift:+.1f}",
+            energy_level=energy_level,
+            segment_beats=segment_beats,
+            reference_text=reference_text
+        )
         
         try:
-            content = self._call_openai([{"role": "user", "content": prompt}], max_tokens=800, temperature=0.8)
+            content = self._call_openai(messages, max_tokens=800, temperature=0.8,
+                                        cache_mode=cache_mode, stage='segment')
             print(f"📝 API返回内容: {content[:100]}...")
             
             # 清理JSON响应
@@ -143,7 +192,13 @@ BPM: {bpm}
                     if "reference_moves" not in choreography:
                         choreography["reference_moves"] = [reference["name"]]
                 
-                return choreography
+                # 解析成功的结果加入片段索引
+                if self.segment_index is not None:
+                    vector = segment_vector(segment, bpm)
+                    if vector is not None:
+                        self.segment_index.insert(dance_style, vector, choreography)
+                
+                return choreography, True
             except json.JSONDecodeError as je:
                 print(f"⚠️ JSON解析失败: {je}")
                 print(f"清理后内容: {cleaned_content}")
@@ -157,7 +212,7 @@ BPM: {bpm}
                     "reference_moves": [reference["name"]] if reference else ["基础动作"]
                 }
                 print(f"🔄 使用默认结构")
-                return choreography
+                return choreography, False
             
         except Exception as e:
             print(f"❌ 生成片段编舞时出错: {e}")
@@ -170,21 +225,144 @@ BPM: {bpm}
                 "reference_moves": [reference["name"]] if reference else ["基础动作"]
             }
             print(f"🔄 返回默认结果")
-            return default_result
+            return default_result, False
     
     def generate_full_choreography(self, segments: List[Dict[str, Any]], 
-                                 bpm: float, dance_style: str, audio_features: Dict[str, Any] = None) -> Dict[str, Any]:
-        """生成完整的编舞草稿"""
+                                 bpm: float, dance_style: str, audio_features: Dict[str, Any] = None,
+                                 cache_mode: Optional[str] = None,
+                                 on_segment: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+                                 deadline: Optional[float] = None, use_index: bool = True) -> Dict[str, Any]:
+        """生成完整的编舞草稿，cache_mode 对本次生成的所有请求生效；
+        默认重新采样，只有显式传入 cache_mode='replay' 时才回放完全相同的请求
+
+        片段索引与缓存模式无关：use_index 为True（默认）且索引已启用时，相似度达到
+        SEGMENT_INDEX_MIN_SIMILARITY 的片段直接复用索引中的编舞，不再请求LLM
+
+        on_segment 在每个片段完成时（按完成先后，在调用线程中）以 (片段序号, 片段编舞) 回调；
+        deadline（秒）不为None时，截止前未返回的片段和总结使用默认结构，
+        未完成的请求在后台结束后丢弃，deadline_metadata 中记录使用LLM结果的片段
+        """
+        started = time.monotonic()
         print(f"🎭 开始生成{dance_style}风格的编舞，共{len(segments)}个片段...")
         
-        segment_choreographies = []
+        # 相似片段先从近邻索引复用
+        segment_choreographies = [None] * len(segments)
+        index_hits = self._lookup_indexed_segments(segments, bpm, dance_style) if use_index else {}
+        for i, choreography in index_hits.items():
+            segment_choreographies[i] = choreography
+            if on_segment is not None:
+                on_segment(i, choreography)
+        if index_hits:
+            print(f"⚡ {len(index_hits)}/{len(segments)} 个片段从片段索引复用")
         
-        for i, segment in enumerate(segments):
-            print(f"🔄 正在生成第{i+1}/{len(segments)}个片段的编舞...")
-            choreography = self.generate_segment_choreography(segment, bpm, dance_style, i, audio_features)
-            segment_choreographies.append(choreography)
+        # 各片段的请求互不依赖，总结也只依赖片段元数据，全部并发提交
+        max_workers = min(config.LLM_MAX_CONCURRENCY, len(segments) + 1)
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        upgraded = []
+        try:
+            summary_future = executor.submit(self._generate_summary, segments, bpm, dance_style, cache_mode)
+            future_index = {}
+            for i, segment in enumerate(segments):
+                if i in index_hits:
+                    continue
+                print(f"🔄 提交第{i+1}/{len(segments)}个片段的编舞请求...")
+                future_index[executor.submit(
+                    self._generate_segment, segment, bpm, dance_style, i, audio_features, cache_mode)] = i
+            
+            # 按完成先后收集结果，按片段顺序存放
+            remaining = None if deadline is None else max(0.0, started + deadline - time.monotonic())
+            try:
+                for future in as_completed(future_index, timeout=remaining):
+                    i = future_index[future]
+                    try:
+                        segment_choreographies[i], from_llm = future.result()
+                        # 请求失败时片段方法自己返回默认结构，只统计真正的LLM结果
+                        if from_llm:
+                            upgraded.append(i)
+                    except Exception as e:
+                        print(f"❌ 第{i+1}段编舞生成异常: {e}")
+                        segment_choreographies[i] = self._fallback_segment_choreography(bpm)
+                    if on_segment is not None:
+                        on_segment(i, segment_choreographies[i])
+            except FuturesTimeoutError:
+                print(f"⏱️ 超过 {deadline:.1f}s 截止时间，其余片段使用默认结构")
+                for i in sorted(future_index.values()):
+                    if segment_choreographies[i] is None:
+                        segment_choreographies[i] = self._fallback_segment_choreography(bpm)
+                        if on_segment is not None:
+                            on_segment(i, segment_choreographies[i])
+            
+            remaining = None if deadline is None else max(0.0, started + deadline - time.monotonic())
+            try:
+                summary = summary_future.result(timeout=remaining)
+            except FuturesTimeoutError:
+                summary = f"这是一个{dance_style}风格的编舞，适合中等水平的舞者练习。"
+        finally:
+            # 截止时间模式下不等待未完成的请求
+            executor.shutdown(wait=deadline is None, cancel_futures=deadline is not None)
+        
+        full_choreography = {
+            "dance_style": dance_style,
+            "bpm": bpm,
+            "total_segments": len(segments),
+            "total_duration": segments[-1]['end_time'],
+            "summary": summary,
+            "segments": segment_choreographies,
+            "index_hits": sorted(index_hits)
+        }
+        if deadline is not None:
+            full_choreography["deadline_metadata"] = {
+                "deadline_seconds": deadline,
+                "elapsed_seconds": time.monotonic() - started,
+                "upgraded_segments": sorted(upgraded),
+                "fallback_segments": [i for i in range(len(segments)) if i not in upgraded and i not in index_hits]
+            }
         
-        # 生成整体编舞总结
+        print(f"🎉 编舞生成完成！")
+        return full_choreography
+    
+    def _lookup_indexed_segments(self, segments: List[Dict[str, Any]], bpm: float,
+                                 dance_style: str) -> Dict[int, Dict[str, Any]]:
+        """
+        在片段索引中查找可复用的编舞
+
+        同一条编舞在一次生成中只用一次，且不与上一个复用片段的舞蹈元素重叠
+
+        Returns:
+            {片段序号: 编舞}
+        """
+        if self.segment_index is None:
+            return {}
+        
+        hits = {}
+        used_ids = set()
+        for i, segment in enumerate(segments):
+            vector = segment_vector(segment, bpm)
+            if vector is None:
+                continue
+            previous = hits.get(i - 1)
+            match = self.segment_index.lookup(dance_style, vector, exclude=used_ids,
+                                              avoid_elements=previous['dance_elements'] if previous else None)
+            if match is not None:
+                choreography, _, entry_id = match
+                hits[i] = choreography
+                used_ids.add(entry_id)
+        return hits
+    
+    def _fallback_segment_choreography(self, bpm: float) -> Dict[str, Any]:
+        """片段生成意外失败时的默认结构"""
+        return {
+            "rhythm_analysis": f"BPM {bpm}",
+            "dance_elements": ["基础动作"],
+            "key_tips": "跟随节拍，保持身体协调",
+            "difficulty": 3,
+            "energy_level": 3,
+            "reference_moves": ["基础动作"]
+        }
+    
+    def _generate_summary(self, segments: List[Dict[str, Any]], bpm: float, dance_style: str,
+                          cache_mode: Optional[str] = None) -> str:
+        """生成整体编舞总结"""
         summary_prompt = f"""请为以下编舞生成一个简洁的总结：
 
 舞蹈风格: {dance_style}
@@ -202,20 +380,10 @@ BPM: {bpm}
 请以简洁的格式返回。"""
         
         try:
-            summary = self._call_openai([{"role": "user", "content": summary_prompt}], max_tokens=250)
+            summary = self._call_openai([{"role": "user", "content": summary_prompt}], max_tokens=250,
+                                        cache_mode=cache_mode, stage='summary')
             print(f"📋 编舞总结生成成功")
         except Exception as e:
             print(f"❌ 生成编舞总结时出错: {e}")
             summary = f"这是一个{dance_style}风格的编舞，适合中等水平的舞者练习。"
-        
-        full_choreography = {
-            "dance_style": dance_style,
-            "bpm": bpm,
-            "total_segments": len(segments),
-            "total_duration": segments[-1]['end_time'],
-            "summary": summary,
-            "segments": segment_choreographies
-        }
-        
-        print(f"🎉 编舞生成完成！")
-        return full_choreography
+        return summary
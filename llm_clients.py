@@ -0,0 +1,107 @@
+"""
+进程级OpenAI客户端池
+按 (API密钥, base_url) 复用同一个 openai.OpenAI 客户端及其HTTP连接池，
+生成器实例和Streamlit会话之间共享长连接，避免每次生成都重新握手；
+长时间未使用的客户端（如其他会话的API密钥）会被淘汰。
+"""
+
+import hashlib
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import openai
+
+try:
+    import httpx
+except ImportError:  # 新版openai SDK的HTTP层发布为httpx2
+    import httpx2 as httpx
+
+import config
+
+
+class ClientPool:
+    """OpenAI客户端池
+
+    同一 (API密钥, base_url) 始终返回同一个客户端；get() 时淘汰空闲超过 idle_seconds 的客户端。
+    被淘汰的客户端不主动关闭（可能仍被生成器实例持有），其空闲连接由 keepalive_expiry 回收。
+    """
+
+    def __init__(self, max_connections: int = 100, max_keepalive_connections: int = 20,
+                 keepalive_expiry: float = 30.0, idle_seconds: float = 600.0):
+        """
+        Args:
+            max_connections: 每个客户端的最大并发连接数
+            max_keepalive_connections: 每个客户端保持的空闲长连接数
+            keepalive_expiry: 空闲长连接的保留时间（秒）
+            idle_seconds: 客户端空闲多久后从池中淘汰（秒）
+        """
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive_connections,
+                                   keepalive_expiry=keepalive_expiry)
+        self.idle_seconds = idle_seconds
+        self._clients: Dict[str, Tuple[openai.OpenAI, float]] = {}
+        self._lock = threading.Lock()
+        self.stats = {'created': 0, 'reused': 0, 'evicted': 0}
+
+    @staticmethod
+    def make_key(api_key: str, base_url: Optional[str] = None) -> str:
+        return hashlib.sha256(f"{api_key}|{base_url or ''}".encode()).hexdigest()
+
+    def _create(self, api_key: str, base_url: Optional[str]) -> openai.OpenAI:
+        client_class = getattr(openai, 'DefaultHttpxClient', httpx.Client)
+        # 重试由容错层统一处理，关闭SDK自带的重试
+        return openai.OpenAI(api_key=api_key, base_url=base_url, max_retries=0,
+                             http_client=client_class(limits=self.limits))
+
+    def get(self, api_key: str, base_url: Optional[str] = None) -> openai.OpenAI:
+        """获取（或创建）客户端"""
+        key = self.make_key(api_key, base_url)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._clients.get(key)
+            if entry is not None:
+                client = entry[0]
+                self.stats['reused'] += 1
+            else:
+                client = self._create(api_key, base_url)
+                self.stats['created'] += 1
+            self._clients[key] = (client, now)
+            return client
+
+    def _evict_idle(self, now: float) -> None:
+        expired = [key for key, (_, last_used) in self._clients.items() if now - last_used > self.idle_seconds]
+        for key in expired:
+            del self._clients[key]
+        self.stats['evicted'] += len(expired)
+
+    def close_all(self) -> None:
+        """关闭并清空所有客户端"""
+        with self._lock:
+            clients = [client for client, _ in self._clients.values()]
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+
+_default_pool: Optional[ClientPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool() -> ClientPool:
+    """按config创建的进程级客户端池"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = ClientPool(config.LLM_HTTP_MAX_CONNECTIONS, config.LLM_HTTP_MAX_KEEPALIVE,
+                                       config.LLM_HTTP_KEEPALIVE_EXPIRY, config.LLM_CLIENT_IDLE_SECONDS)
+        return _default_pool
+
+
+def get_client(api_key: str, base_url: Optional[str] = None) -> openai.OpenAI:
+    """获取进程级共享的OpenAI客户端"""
+    return get_default_pool().get(api_key, base_url)
@@ -0,0 +1,189 @@
+"""
+OpenAI调用的容错层
+指数退避加抖动重试、遵守Retry-After、按API密钥的熔断器和单次请求的总截止时间；
+熔断器打开时立即抛出CircuitOpenError，调用方直接走本地备用方案
+"""
+
+import email.utils
+import hashlib
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import openai
+
+import config
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开，本次请求未发出"""
+
+
+class DeadlineExceeded(Exception):
+    """重试等待会超过请求截止时间"""
+
+
+class CircuitBreaker:
+    """熔断器
+
+    连续失败达到阈值后打开，在reset_timeout内拒绝所有请求；
+    之后进入半开状态，只放行一个探测请求，成功则关闭，失败则重新打开。
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self) -> bool:
+        """是否放行一个请求"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def release_probe(self) -> None:
+        """结束半开探测但不改变状态和失败计数（请求本身有问题，不能说明服务是否恢复）"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self._probing:
+                    print(f"🚫 连续失败{self.failures}次，熔断 {self.reset_timeout:.0f} 秒")
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(api_key: str, base_url: Optional[str] = None) -> CircuitBreaker:
+    """按 (API密钥, base_url) 共享的熔断器，同一密钥的所有生成器共用一个"""
+    key = hashlib.sha256(f"{api_key}|{base_url or ''}".encode()).hexdigest()
+    with _breakers_lock:
+        if key not in _breakers:
+            _breakers[key] = CircuitBreaker(config.LLM_BREAKER_FAILURES, config.LLM_BREAKER_RESET_SECONDS)
+        return _breakers[key]
+
+
+def is_retryable(error: Exception) -> bool:
+    """限流、超时、连接错误和5xx可以重试；认证、参数等错误直接抛出"""
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, TimeoutError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500 or error.status_code == 408
+    return False
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """从响应头读取Retry-After（秒数、毫秒数或HTTP日期）"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    value = headers.get('retry-after-ms')
+    if value is not None:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(value)
+        return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+
+def call_with_retry(request: Callable[[float], str], breaker: Optional[CircuitBreaker] = None,
+                    max_retries: Optional[int] = None, deadline: Optional[float] = None,
+                    base_delay: Optional[float] = None, max_delay: Optional[float] = None) -> str:
+    """
+    带重试、熔断和截止时间的请求
+
+    Args:
+        request: 接收本次尝试超时秒数的请求函数
+        breaker: 熔断器，None时不熔断
+        max_retries: 最大重试次数
+        deadline: 整个请求（含重试等待）的总时限（秒）
+        base_delay: 退避基数（秒）
+        max_delay: 单次退避上限（秒）
+
+    Returns:
+        请求结果
+
+    Raises:
+        CircuitOpenError: 熔断器打开
+        DeadlineExceeded: 剩余时间不足以再次重试
+    """
+    max_retries = config.LLM_MAX_RETRIES if max_retries is None else max_retries
+    deadline = config.LLM_REQUEST_DEADLINE if deadline is None else deadline
+    base_delay = config.LLM_RETRY_BASE_DELAY if base_delay is None else base_delay
+    max_delay = config.LLM_RETRY_MAX_DELAY if max_delay is None else max_delay
+    expires_at = time.monotonic() + deadline
+
+    attempt = 0
+    while True:
+        if breaker is not None and not breaker.allow():
+            raise CircuitOpenError("OpenAI请求已熔断，使用本地备用方案")
+        remaining = expires_at - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"请求超过 {deadline:.0f} 秒截止时间")
+
+        try:
+            result = request(remaining)
+        except Exception as e:
+            if not is_retryable(e):
+                # 请求本身有问题，既不计入熔断也不算服务恢复，只释放半开探测名额
+                if breaker is not None:
+                    breaker.release_probe()
+                raise
+            if breaker is not None:
+                breaker.record_failure()
+            if attempt >= max_retries:
+                raise
+
+            # 指数退避加全抖动；服务端给出Retry-After时至少等待完整的该时长（不受max_delay限制），
+            # 等不到就按截止时间放弃
+            delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+            hinted = retry_after_seconds(e)
+            if hinted is not None:
+                delay = max(delay, hinted)
+            if delay >= expires_at - time.monotonic():
+                raise DeadlineExceeded(f"重试等待 {delay:.1f} 秒会超过截止时间: {e}") from e
+            attempt += 1
+            print(f"🔁 第{attempt}次重试（{delay:.1f}秒后）: {e.__class__.__name__}")
+            time.sleep(delay)
+            continue
+
+        if breaker is not None:
+            breaker.record_success()
+        return result
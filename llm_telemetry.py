@@ -0,0 +1,228 @@
+"""
+LLM调用遥测
+记录每次chat-completions调用的token用量、首字节时间、总耗时、重试次数、模型和发起阶段，
+按单次生成和整个进程分别汇总，可选写入JSONL文件以便找出最昂贵的提示
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import config
+from llm_cache import normalize_messages
+from prompt_packing import estimate_tokens
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """按 config.LLM_PRICES_PER_1K_TOKENS 估算费用（美元），未知模型按0计"""
+    prompt_price, completion_price = config.LLM_PRICES_PER_1K_TOKENS.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000.0
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class CallTracker:
+    """单次调用的计时器，由 LLMTelemetry.track 创建
+
+    在请求函数中调用 attempt() / first_byte() / set_usage()，
+    拿到响应文本后调用 complete()；退出时记录到所属的遥测对象。
+    """
+
+    def __init__(self, telemetry: 'LLMTelemetry', stage: str, model: str, messages: List[Dict]):
+        self.telemetry = telemetry
+        self.stage = stage
+        self.model = model
+        self.messages = messages
+        self.started = time.perf_counter()
+        self.attempts = 0
+        self.attempt_started: Optional[float] = None
+        self.ttfb: Optional[float] = None
+        self.usage: Optional[Dict[str, int]] = None
+        self.content: Optional[str] = None
+
+    def attempt(self) -> None:
+        """开始一次请求尝试（重试会多次调用）"""
+        self.attempts += 1
+        self.attempt_started = time.perf_counter()
+        self.ttfb = None
+        self.usage = None
+
+    def first_byte(self) -> None:
+        """收到第一段响应"""
+        if self.ttfb is None and self.attempt_started is not None:
+            self.ttfb = time.perf_counter() - self.attempt_started
+
+    def set_usage(self, usage) -> None:
+        """记录API返回的usage（对象或字典，可为None）"""
+        if usage is None:
+            return
+        get = usage.get if isinstance(usage, dict) else lambda name: getattr(usage, name, None)
+        self.usage = {
+            'prompt_tokens': int(get('prompt_tokens') or 0),
+            'completion_tokens': int(get('completion_tokens') or 0)
+        }
+
+    def complete(self, content: str) -> None:
+        self.content = content
+
+    def __enter__(self) -> 'CallTracker':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        latency = time.perf_counter() - self.started
+        cached = self.attempts == 0 and exc is None
+        if self.usage is not None:
+            prompt_tokens = self.usage['prompt_tokens']
+            completion_tokens = self.usage['completion_tokens']
+            estimated = False
+        else:
+            # 命中缓存、流式响应不含usage或请求失败时按文本估算
+            prompt_tokens = sum(estimate_tokens(m.get('content', '')) for m in self.messages)
+            completion_tokens = estimate_tokens(self.content or '')
+            estimated = True
+        if self.attempts == 0:
+            # 命中缓存或熔断时没有发出请求，不计费
+            billed_prompt, billed_completion = 0, 0
+        else:
+            billed_prompt, billed_completion = prompt_tokens, completion_tokens
+
+        normalized = json.dumps(normalize_messages(self.messages), ensure_ascii=False, sort_keys=True)
+        self.telemetry.record({
+            'timestamp': time.time(),
+            'generation_id': self.telemetry.generation_id,
+            'stage': self.stage,
+            'model': self.model,
+            'status': 'ok' if exc is None else exc.__class__.__name__,
+            'cached': cached,
+            'attempts': self.attempts,
+            'retries': max(0, self.attempts - 1),
+            'prompt_tokens': billed_prompt,
+            'completion_tokens': billed_completion,
+            'tokens_estimated': estimated,
+            'ttfb_seconds': self.ttfb,
+            'latency_seconds': latency,
+            'cost_usd': estimate_cost(self.model, billed_prompt, billed_completion),
+            'prompt_hash': hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:16],
+            'prompt_chars': sum(len(m.get('content', '')) for m in self.messages)
+        })
+
+
+class LLMTelemetry:
+    """调用记录的集合
+
+    每次生成使用一个实例（generation_id相同），所有记录同时汇总到进程级实例并写入JSONL。
+    线程安全，并发的片段请求可以共用一个实例。
+    """
+
+    def __init__(self, parent: Optional['LLMTelemetry'] = None, sink_path: Optional[str] = None):
+        self.generation_id = uuid.uuid4().hex[:12]
+        self.parent = parent
+        self.sink_path = sink_path
+        self.records: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def track(self, stage: str, model: str, messages: List[Dict]) -> CallTracker:
+        """为一次调用创建计时器"""
+        return CallTracker(self, stage, model, messages)
+
+    def record(self, entry: Dict) -> None:
+        with self._lock:
+            self.records.append(entry)
+        if self.parent is not None:
+            self.parent.record(entry)
+        if self.sink_path:
+            self._write(entry)
+
+    def _write(self, entry: Dict) -> None:
+        try:
+            directory = os.path.dirname(self.sink_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            line = json.dumps(entry, ensure_ascii=False) + "\n"
+            with self._lock, open(self.sink_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+        except OSError as e:
+            print(f"⚠️ 写入LLM遥测文件失败: {e}")
+
+    def summary(self, top_n: int = 3) -> Dict:
+        """
+        汇总统计
+
+        Returns:
+            调用次数、token用量、费用、耗时分位数、按阶段的明细和最昂贵的提示
+        """
+        with self._lock:
+            records = list(self.records)
+
+        by_stage: Dict[str, Dict] = {}
+        for entry in records:
+            stage = by_stage.setdefault(entry['stage'], {
+                'calls': 0, 'cached_calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+                'cost_usd': 0.0, 'latency_seconds': 0.0
+            })
+            stage['calls'] += 1
+            stage['cached_calls'] += int(entry['cached'])
+            stage['prompt_tokens'] += entry['prompt_tokens']
+            stage['completion_tokens'] += entry['completion_tokens']
+            stage['cost_usd'] += entry['cost_usd']
+            stage['latency_seconds'] += entry['latency_seconds']
+        for stage in by_stage.values():
+            stage['cost_usd'] = round(stage['cost_usd'], 6)
+
+        requested = [entry for entry in records if not entry['cached']]
+        latencies = [entry['latency_seconds'] for entry in requested]
+        ttfbs = [entry['ttfb_seconds'] for entry in requested if entry['ttfb_seconds'] is not None]
+        prompt_tokens = sum(entry['prompt_tokens'] for entry in records)
+        completion_tokens = sum(entry['completion_tokens'] for entry in records)
+        most_expensive = sorted(requested, key=lambda entry: entry['prompt_tokens'] + entry['completion_tokens'],
+                                reverse=True)[:top_n]
+
+        return {
+            'generation_id': self.generation_id if self.parent is not None else None,
+            'calls': len(records),
+            'cached_calls': len(records) - len(requested),
+            'failed_calls': sum(1 for entry in records if entry['status'] != 'ok'),
+            'retries': sum(entry['retries'] for entry in records),
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+            'cost_usd': round(sum(entry['cost_usd'] for entry in records), 6),
+            'latency_seconds': {
+                'total': sum(latencies),
+                'p50': _percentile(latencies, 0.5),
+                'p95': _percentile(latencies, 0.95),
+                'max': max(latencies) if latencies else None
+            },
+            'ttfb_seconds': {'p50': _percentile(ttfbs, 0.5), 'p95': _percentile(ttfbs, 0.95)},
+            'by_stage': by_stage,
+            'most_expensive': [
+                {key: entry[key] for key in ('stage', 'prompt_hash', 'prompt_tokens', 'completion_tokens',
+                                             'latency_seconds')}
+                for entry in most_expensive
+            ]
+        }
+
+
+_process_telemetry = LLMTelemetry()
+
+
+def get_process_telemetry() -> LLMTelemetry:
+    """进程级汇总（所有生成的全部调用）"""
+    return _process_telemetry
+
+
+def start_generation() -> LLMTelemetry:
+    """为一次生成创建遥测对象，记录同时汇总到进程级并写入 config.LLM_TELEMETRY_PATH"""
+    return LLMTelemetry(parent=_process_telemetry, sink_path=config.LLM_TELEMETRY_PATH)
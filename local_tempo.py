@@ -0,0 +1,141 @@
+"""
+局部速度服务
+直接从整轨节拍网格（以及可选的起音包络）推导逐拍速度、片段速度和速度漂移，
+复杂度为 O(节拍数)，不再对任何片段重新做节拍跟踪。
+整轨和片段的速度漂移使用同一单位：拟合出的首拍到末拍的速度变化（BPM）
+"""
+
+import numpy as np
+from typing import Dict, List, Optional
+
+
+def _onset_weights(beat_times: np.ndarray, onset_envelope: Optional[np.ndarray],
+                   sr: int, hop_length: int) -> np.ndarray:
+    """每个节拍间隔的权重：取两端节拍处起音强度的较小值"""
+    n_intervals = max(len(beat_times) - 1, 0)
+    if onset_envelope is None or len(onset_envelope) == 0 or n_intervals == 0:
+        return np.ones(n_intervals)
+
+    frames = np.round(beat_times * sr / hop_length).astype(int)
+    frames = np.clip(frames, 0, len(onset_envelope) - 1)
+    strength = onset_envelope[frames]
+    weights = np.minimum(strength[:-1], strength[1:])
+    # 全部为零时退化为等权
+    if not np.any(weights > 0):
+        return np.ones(n_intervals)
+    return np.maximum(weights, 1e-6)
+
+
+def _weighted_median(values: np.ndarray, weights: np.ndarray) -> float:
+    """加权中位数"""
+    order = np.argsort(values)
+    cumulative = np.cumsum(weights[order])
+    return float(values[order][np.searchsorted(cumulative, cumulative[-1] / 2.0)])
+
+
+def _drift(times: np.ndarray, tempos: np.ndarray) -> float:
+    """线性拟合速度随时间的斜率，乘以时间跨度得到首尾的速度变化（BPM）"""
+    if len(times) < 2 or np.ptp(times) == 0:
+        return 0.0
+    return float(np.polyfit(times, tempos, 1)[0] * np.ptp(times))
+
+
+def estimate_beat_tempo(beat_times: np.ndarray, smoothing: int = 2) -> np.ndarray:
+    """
+    逐拍速度
+
+    Args:
+        beat_times: 节拍时间（秒）
+        smoothing: 中值平滑的半窗口（以节拍间隔计）
+
+    Returns:
+        与beat_times等长的逐拍速度（BPM），最后一拍沿用前一个间隔
+    """
+    beat_times = np.asarray(beat_times, dtype=float)
+    if len(beat_times) < 2:
+        return np.zeros(len(beat_times))
+
+    intervals = np.diff(beat_times)
+    intervals = np.where(intervals > 0, intervals, np.nan)
+
+    if smoothing > 0 and len(intervals) > 2 * smoothing:
+        padded = np.pad(intervals, smoothing, mode='edge')
+        windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * smoothing + 1)
+        intervals = np.nanmedian(windows, axis=1)
+
+    tempo = 60.0 / intervals
+    tempo = np.nan_to_num(tempo, nan=0.0)
+    return np.append(tempo, tempo[-1])
+
+
+def _segment_beat_range(segment: Dict, beat_times: np.ndarray):
+    """片段覆盖的节拍索引区间 [start, end]"""
+    if 'start_beat' in segment and 'end_beat' in segment:
+        start, end = int(segment['start_beat']), int(segment['end_beat'])
+    else:
+        start = int(np.searchsorted(beat_times, segment['start_time'], side='left'))
+        end = int(np.searchsorted(beat_times, segment['end_time'], side='right')) - 1
+    end = min(end, len(beat_times) - 1)
+    return max(start, 0), end
+
+
+def estimate_local_tempo(beat_times: np.ndarray, segments: List[Dict],
+                         onset_envelope: Optional[np.ndarray] = None,
+                         sr: int = 22050, hop_length: int = 512) -> Dict:
+    """
+    计算逐拍、片段和整轨的速度信息
+
+    Args:
+        beat_times: 整轨节拍时间（秒）
+        segments: 片段列表，优先使用 start_beat/end_beat，否则按时间定位节拍
+        onset_envelope: 可选的起音强度包络，用于给节拍间隔加权
+        sr: 采样率
+        hop_length: 包络的帧移
+
+    Returns:
+        {
+            'beat_tempo': 逐拍速度数组,
+            'global_tempo': 加权中位速度,
+            'tempo_drift': 整轨速度漂移（首尾速度变化，BPM）,
+            'segments': [{'tempo', 'tempo_drift'（片段首尾速度变化，BPM）, 'beat_tempos'}, ...]
+        }
+    """
+    beat_times = np.asarray(beat_times, dtype=float)
+    beat_tempo = estimate_beat_tempo(beat_times)
+    weights = _onset_weights(beat_times, onset_envelope, sr, hop_length)
+    intervals = np.diff(beat_times)
+    valid = intervals > 0
+
+    if np.any(valid):
+        global_tempo = 60.0 / _weighted_median(intervals[valid], weights[valid])
+    else:
+        global_tempo = 0.0
+    global_drift = _drift(beat_times, beat_tempo)
+
+    segment_tempos = []
+    for segment in segments:
+        start, end = _segment_beat_range(segment, beat_times)
+        seg_intervals = intervals[start:end]
+        seg_weights = weights[start:end]
+        seg_valid = seg_intervals > 0
+
+        if np.any(seg_valid):
+            tempo = 60.0 / _weighted_median(seg_intervals[seg_valid], seg_weights[seg_valid])
+        else:
+            tempo = global_tempo
+
+        seg_beat_tempo = beat_tempo[start:end + 1]
+        drift = _drift(beat_times[start:end + 1], seg_beat_tempo)
+
+        segment_tempos.append({
+            'tempo': float(tempo),
+            'tempo_drift': float(drift),
+            'beat_tempos': [float(x) for x in seg_beat_tempo]
+        })
+
+    return {
+        'beat_tempo': beat_tempo,
+        'global_tempo': float(global_tempo),
+        'tempo_drift': float(global_drift),
+        'segments': segment_tempos
+    }
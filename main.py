@@ -9,6 +9,11 @@ import os
 import argparse
 from choreography_generator import ChoreographyGenerator
 
+def print_segment(index, segment):
+    """片段生成后立即打印"""
+    moves = segment.get('moves') or segment.get('dance_elements') or []
+    print(f"🕺 片段{index + 1}: {', '.join(str(move) for move in moves)}", flush=True)
+
 def main():
     parser = argparse.ArgumentParser(description='AI编舞生成器')
     parser.add_argument('audio_file', help='音频文件路径 (MP3/WAV)')
@@ -37,7 +42,7 @@ def main():
         
         # 创建生成器并处理
         generator = ChoreographyGenerator()
-        result = generator.generate_choreography_from_file(args.audio_file)
+        result = generator.generate_choreography_from_file(args.audio_file, on_segment=print_segment)
         
         # 打印结果摘要
         generator.print_choreography_summary(result)
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+本地OpenAI兼容模拟服务
+实现 /v1/chat/completions（含 stream=True 的SSE流），支持可配置的延迟分布、错误和429注入，
+根据提示内容用 action_database 生成确定性且符合Schema的编舞响应，
+用于不消耗API配额的离线压测和延迟测试。
+
+使用方法:
+    python mock_openai_server.py --port 8765 --latency lognormal:0.8,0.5 --rate-limit-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=mock python main.py song.mp3
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+import config
+from action_database import DANCE_ACTION_DATABASE
+from prompt_packing import estimate_tokens
+
+
+class LatencyModel:
+    """首字节延迟分布
+
+    支持的格式：
+    - none
+    - fixed:秒
+    - uniform:最小,最大
+    - lognormal:中位数,sigma（长尾，接近真实API）
+    """
+
+    def __init__(self, kind: str = 'none', params: Tuple[float, ...] = ()):
+        if kind not in ('none', 'fixed', 'uniform', 'lognormal'):
+            raise ValueError(f"未知的延迟分布: {kind}")
+        self.kind = kind
+        self.params = params
+
+    @classmethod
+    def parse(cls, spec: Optional[str]) -> 'LatencyModel':
+        if not spec or spec == 'none':
+            return cls()
+        kind, _, values = spec.partition(':')
+        return cls(kind, tuple(float(value) for value in values.split(',') if value))
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == 'fixed':
+            return self.params[0]
+        if self.kind == 'uniform':
+            return rng.uniform(self.params[0], self.params[1])
+        if self.kind == 'lognormal':
+            median, sigma = self.params
+            return median * rng.lognormvariate(0.0, sigma)
+        return 0.0
+
+
+def _style_moves(style: str) -> List[str]:
+    """某风格在动作词库中的全部动作（顺序固定）"""
+    categories = DANCE_ACTION_DATABASE.get(style, DANCE_ACTION_DATABASE['Hip-Hop'])
+    return [move for moves in categories.values() for move in moves]
+
+
+def _first_match(pattern: str, text: str, default: Optional[str] = None) -> Optional[str]:
+    match = re.search(pattern, text)
+    return match.group(1) if match else default
+
+
+class MockChatBackend:
+    """根据请求生成响应，注入延迟和错误"""
+
+    def __init__(self, latency: Optional[LatencyModel] = None, token_delay: float = 0.0,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 retry_after: float = 1.0, seed: int = 0):
+        """
+        Args:
+            latency: 首字节延迟分布
+            token_delay: 每个输出token的额外耗时（秒）
+            error_rate: 返回500的概率
+            rate_limit_rate: 返回429的概率
+            retry_after: 429响应的Retry-After（秒）
+            seed: 随机种子；相同种子和相同消息得到相同的响应内容
+        """
+        self.latency = latency or LatencyModel()
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.seed = seed
+        self._fault_rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {'connections': 0, 'requests': 0, 'ok': 0, 'errors': 0, 'rate_limited': 0}
+
+    def _content_rng(self, messages: List[Dict]) -> random.Random:
+        digest = hashlib.sha256(f"{self.seed}|{json.dumps(messages, sort_keys=True)}".encode('utf-8')).hexdigest()
+        return random.Random(int(digest[:16], 16))
+
+    def count_connection(self) -> None:
+        with self._lock:
+            self.stats['connections'] += 1
+
+    def draw_fault(self) -> Tuple[Optional[int], float]:
+        """抽取本次请求的故障（None表示正常）和首字节延迟"""
+        with self._lock:
+            self.stats['requests'] += 1
+            roll = self._fault_rng.random()
+            delay = self.latency.sample(self._fault_rng)
+            if roll < self.rate_limit_rate:
+                self.stats['rate_limited'] += 1
+                return 429, delay
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.stats['errors'] += 1
+                return 500, delay
+            self.stats['ok'] += 1
+            return None, delay
+
+    def build_reply(self, messages: List[Dict]) -> str:
+        """按提示类型生成确定性的响应文本"""
+        rng = self._content_rng(messages)
+        system = "\n".join(m.get('content', '') for m in messages if m.get('role') == 'system')
+        prompt = "\n".join(m.get('content', '') for m in messages if m.get('role') != 'system')
+
+        if '片段数量' in prompt and '动作ID' in system:
+            return self._compact_choreography(prompt, rng)
+        if '片段数量' in prompt and 'JSON' in system:
+            return self._structured_choreography(system, prompt, rng)
+        if 'rhythm_analysis' in system + prompt:
+            return self._segment_choreography(prompt, rng)
+        if '可选舞蹈风格' in prompt:
+            styles = _first_match(r'可选舞蹈风格:\s*(.+)', prompt, 'Hip-Hop')
+            return rng.choice([style.strip() for style in styles.split(',') if style.strip()])
+        style = _first_match(r'舞蹈风格:\s*(\S+)', prompt, 'Hip-Hop')
+        return (f"整体风格：{style}，节奏清晰、律动稳定。\n难度：中等。\n适合水平：有一定基础的舞者。\n"
+                f"练习建议：先慢速分解每个8拍，再跟原速音乐连贯练习。\n参考视频：搜索 \"{style} choreography\"")
+
+    def _structured_choreography(self, system: str, prompt: str, rng: random.Random) -> str:
+        style = _first_match(r'擅长(.+?)风格', system, 'Hip-Hop')
+        # 与真实模型一样优先使用提示中的候选动作池
+        pool = _first_match(r'候选动作池：(.+)', system + "\n" + prompt)
+        candidates = [move.strip() for move in pool.split(',') if move.strip()] if pool else _style_moves(style)
+        lines = re.findall(r'- 片段(\d+): ([\d.]+)s-([\d.]+)s', prompt)
+        if not lines:
+            count = int(_first_match(r'片段数量:\s*(\d+)', prompt, '1'))
+            lines = [(str(i), f"{i * 4.0:.1f}", f"{(i + 1) * 4.0:.1f}") for i in range(count)]
+
+        segments = []
+        for idx, start, end in lines:
+            segments.append({
+                "idx": int(idx),
+                "time": f"{start}s-{end}s",
+                "accent": rng.choice(["strong", "medium", "weak"]),
+                "level": rng.choice(["high", "mid", "low", "floor"]),
+                "plane": rng.choice(["frontal", "sagittal", "transverse"]),
+                "motifs": rng.sample(["groove", "bounce", "flow", "hit", "sway"], 2),
+                "moves": rng.sample(candidates, min(4, len(candidates))),
+                "transition": rng.choice(["quarter-turn", "level-drop", "travel-diagonal"])
+            })
+        data = {
+            "style": style,
+            "global_cues": {
+                "energy_level": rng.choice(["low", "medium", "high", "very_high"]),
+                "mood": f"mock {style.lower()} groove",
+                "key_characteristics": rng.sample(["rhythmic", "expressive", "structured", "groove"], 2)
+            },
+            "segments": segments
+        }
+        return json.dumps(data, ensure_ascii=False, indent=2)
+
+    def _compact_choreography(self, prompt: str, rng: random.Random) -> str:
+        """紧凑编码格式（见 compact_format）"""
+        ids = [int(move_id) for move_id in re.findall(r'(\d+)=', _first_match(r'候选动作池：(.+)', prompt, ''))]
+        if not ids:
+            ids = list(range(8))
+        indices = [int(idx) for idx in re.findall(r'- 片段(\d+): ', prompt)]
+        if not indices:
+            indices = list(range(int(_first_match(r'片段数量:\s*(\d+)', prompt, '1'))))
+        style = _first_match(r'舞蹈风格:\s*(\S+)', prompt, 'Hip-Hop')
+        segments = [[idx, rng.randrange(3), rng.randrange(4), rng.randrange(3), rng.sample(range(9), 2),
+                     rng.sample(ids, min(4, len(ids))), rng.randrange(10)] for idx in indices]
+        data = {"g": [rng.randrange(4), f"mock {style.lower()} groove", "rhythmic", "expressive"],
+                "segments": segments}
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+    def _segment_choreography(self, prompt: str, rng: random.Random) -> str:
+        style = _first_match(r'舞蹈风格:\s*(\S+)', prompt, 'Hip-Hop')
+        candidates = _style_moves(style)
+        moves = rng.sample(candidates, min(4, len(candidates)))
+        data = {
+            "rhythm_analysis": rng.choice(["节奏稳定，重拍清晰", "节奏很快，需要力度大", "律动松弛，适合流动感动作"]),
+            "dance_elements": moves,
+            "key_tips": "动作卡在重拍上，保持身体律动",
+            "difficulty": rng.randint(1, 5),
+            "energy_level": rng.randint(1, 5),
+            "reference_moves": moves[:2]
+        }
+        return json.dumps(data, ensure_ascii=False)
+
+
+def _error_body(status: int) -> Dict:
+    if status == 429:
+        return {"error": {"message": "Rate limit reached (mock)", "type": "requests",
+                          "code": "rate_limit_exceeded", "param": None}}
+    return {"error": {"message": "The server had an error (mock)", "type": "server_error",
+                      "code": None, "param": None}}
+
+
+class _ChatCompletionsHandler(BaseHTTPRequestHandler):
+    """把请求转交给server上的MockChatBackend"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # 每个处理器实例对应一条TCP连接，可据此观察客户端的连接复用
+        self.server.backend.count_connection()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: Dict, headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "Invalid JSON body", "type": "invalid_request_error"}})
+            return
+
+        backend: MockChatBackend = self.server.backend
+        status, delay = backend.draw_fault()
+        time.sleep(delay)
+        if status is not None:
+            headers = {'Retry-After': f"{backend.retry_after:g}"} if status == 429 else {}
+            self._send_json(status, _error_body(status), headers)
+            return
+
+        messages = body.get('messages', [])
+        content = backend.build_reply(messages)
+        # 模拟max_tokens截断
+        max_tokens = body.get('max_tokens')
+        finish_reason = 'stop'
+        if max_tokens and estimate_tokens(content) > max_tokens:
+            content = content[:max(1, len(content) * max_tokens // estimate_tokens(content))]
+            finish_reason = 'length'
+
+        completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+        model = body.get('model', 'mock')
+        usage = {
+            'prompt_tokens': sum(estimate_tokens(m.get('content', '')) for m in messages),
+            'completion_tokens': estimate_tokens(content)
+        }
+        usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+
+        if body.get('stream'):
+            include_usage = (body.get('stream_options') or {}).get('include_usage')
+            self._stream(completion_id, model, content, finish_reason, backend.token_delay,
+                         usage if include_usage else None)
+            return
+
+        time.sleep(backend.token_delay * usage['completion_tokens'])
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                         "finish_reason": finish_reason}],
+            "usage": usage
+        })
+
+    def _stream(self, completion_id: str, model: str, content: str, finish_reason: str,
+                token_delay: float, usage: Optional[Dict] = None, chunk_chars: int = 16) -> None:
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta: Optional[Dict], finish: Optional[str] = None, usage: Optional[Dict] = None) -> None:
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "usage": usage,
+                     "choices": [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        event({"role": "assistant", "content": ""})
+        for start in range(0, len(content), chunk_chars):
+            piece = content[start:start + chunk_chars]
+            time.sleep(token_delay * estimate_tokens(piece))
+            event({"content": piece})
+        event({}, finish_reason)
+        if usage is not None:
+            # stream_options.include_usage: 最后一个块只携带usage
+            event(None, usage=usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class MockOpenAIServer:
+    """在后台线程运行的模拟服务"""
+
+    def __init__(self, backend: Optional[MockChatBackend] = None, host: str = '127.0.0.1', port: int = 0):
+        self.backend = backend or MockChatBackend()
+        self.httpd = ThreadingHTTPServer((host, port), _ChatCompletionsHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.backend = self.backend
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> 'MockOpenAIServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> 'MockOpenAIServer':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地OpenAI兼容模拟服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=config.MOCK_OPENAI_PORT)
+    parser.add_argument('--latency', default='lognormal:0.8,0.5',
+                        help='首字节延迟分布: none | fixed:秒 | uniform:最小,最大 | lognormal:中位数,sigma')
+    parser.add_argument('--token-delay', type=float, default=0.0, help='每个输出token的耗时（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回500的概率')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='返回429的概率')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='429响应的Retry-After（秒）')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    backend = MockChatBackend(LatencyModel.parse(args.latency), args.token_delay, args.error_rate,
+                              args.rate_limit_rate, args.retry_after, args.seed)
+    server = MockOpenAIServer(backend, args.host, args.port)
+    print(f"🧪 模拟OpenAI服务已启动: {server.base_url}")
+    print(f"💡 设置 OPENAI_BASE_URL={server.base_url} 即可让编舞生成器离线运行")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n📊 请求统计: {backend.stats}")
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+动作属性表和向量化评分
+启动时把词库中的每个动作ID映射为一行属性：关键词类别、各评分方案的难度分和能量分、
+参考视频库中的难度/能量评级，以及层次和平面权重；评估一份编舞时先把所有动作名称换成ID，
+再用NumPy按片段汇总，一次得到全部片段的难度和能量等级。
+LLM自创的、不在词库中的动作名称走带缓存的回退路径，同一名称只分类一次。
+"""
+
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Sequence, Tuple
+
+import numpy as np
+
+from action_database import ACTION_DIMENSIONS, ACTION_INDEX, ActionIndex, MOVE_MATCHER
+from dance_references import DANCE_REFERENCES
+from keyword_matcher import KeywordMatcher
+
+LEVELS = ACTION_DIMENSIONS['level']
+PLANES = ACTION_DIMENSIONS['plane']
+
+# 动作名称包含关键词即带有该层次/平面；都不包含时为 mid / frontal，包含多个时平分权重
+LEVEL_KEYWORDS = {
+    'high': ['jump', 'leap', 'lift', 'kick', 'level-rise', 'suspension'],
+    'low': ['dip', 'deep', 'level-drop', 'fall', 'knee', 'russian-step'],
+    'floor': ['windmill', 'headspin', 'backspin', 'flare', 'swipe', 'turtle', 'cricket', 'jackhammer',
+              'freeze', 'floor', 'six-step', 'three-step']
+}
+PLANE_KEYWORDS = {
+    'transverse': ['spin', 'turn', 'pirouette', 'spiral', 'windmill', 'flare', 'pivot', 'twist'],
+    'sagittal': ['forward', 'backward', 'back-step', 'running', 'kick', 'lunge', 'contraction', 'release']
+}
+LEVEL_MATCHER = KeywordMatcher(LEVEL_KEYWORDS)
+PLANE_MATCHER = KeywordMatcher(PLANE_KEYWORDS)
+
+# 参考视频库的评级（1-5）并入关键词类别：5级难度视为复杂动作，4级视为控制类动作，5级能量视为高能量
+REFERENCE_DIFFICULTY_LABELS = {5: 'complex', 4: 'control'}
+REFERENCE_ENERGY_LABELS = {5: 'high_energy'}
+
+# 评分方案：规则按顺序取第一条命中的类别，空类别表示兜底
+SCORING_PROFILES = {
+    'basic': {
+        'move_difficulty': ((('complex',), 3), (('rotation',), 2), ((), 1)),
+        'move_energy': ((('high_energy',), 2), (('medium_energy',), 1)),
+        'transition_difficulty': ((('complex_transition',), 2),),
+        'level': {'floor': 2, 'high': 1},
+        'accent': {'strong': 3, 'medium': 2},
+        'accent_default': 1,
+        'tempo': (),
+        'tempo_drift': None,
+        'difficulty_bounds': (3, 6),
+        'difficulty_labels': ("初级", "中级", "高级"),
+        'energy_bounds': (2, 4),
+        'energy_labels': ("低能量", "中等能量", "高能量")
+    },
+    'pro': {
+        'move_difficulty': ((('complex',), 4), (('rotation', 'control'), 2), ((), 1)),
+        'move_energy': ((('high_energy', 'explosive'), 3), (('medium_energy', 'dynamic'), 1)),
+        'transition_difficulty': ((('complex_transition', 'air_transition'), 3),),
+        'level': {'floor': 3, 'high': 2},
+        'accent': {'strong': 4, 'medium': 2},
+        'accent_default': 1,
+        # 局部速度超过阈值加分（取第一个超过的阈值），片段速度漂移（首尾速度变化，BPM）超过阈值加分
+        'tempo': ((140, 2), (120, 1)),
+        'tempo_drift': (5, 1),
+        'difficulty_bounds': (4, 8, 12),
+        'difficulty_labels': ("初级", "中级", "高级", "专业级"),
+        'energy_bounds': (3, 6, 9),
+        'energy_labels': ("低能量", "中等能量", "高能量", "超高能量")
+    }
+}
+
+
+def _normalize(name: str) -> str:
+    """参考库中的 "Running Man" 与词库中的 running-man 对齐"""
+    return '-'.join(name.lower().split())
+
+
+def _references():
+    for categories in DANCE_REFERENCES.values():
+        for references in categories.values():
+            yield from references
+
+
+def _reference_labels() -> Dict[str, FrozenSet[str]]:
+    labels: Dict[str, set] = {}
+    for reference in _references():
+        found = labels.setdefault(_normalize(reference['name']), set())
+        for table, rating in ((REFERENCE_DIFFICULTY_LABELS, reference.get('difficulty')),
+                              (REFERENCE_ENERGY_LABELS, reference.get('energy_level'))):
+            if rating in table:
+                found.add(table[rating])
+    return {name: frozenset(found) for name, found in labels.items()}
+
+
+def _reference_ratings() -> Dict[str, Tuple[float, float]]:
+    return {_normalize(reference['name']): (float(reference.get('difficulty', np.nan)),
+                                            float(reference.get('energy_level', np.nan)))
+            for reference in _references()}
+
+
+REFERENCE_LABELS = _reference_labels()
+
+
+def _rule_points(rules, labels: FrozenSet[str]) -> int:
+    for required, points in rules:
+        if not required or labels.intersection(required):
+            return points
+    return 0
+
+
+def _weights(matched: FrozenSet[str], values: Sequence[str], default: str) -> np.ndarray:
+    weights = np.zeros(len(values))
+    chosen = [values.index(value) for value in matched] or [values.index(default)]
+    weights[chosen] = 1.0 / len(chosen)
+    return weights
+
+
+@lru_cache(maxsize=4096)
+def move_labels(name: str) -> FrozenSet[str]:
+    """
+    单个动作名称的类别（关键词分类并入参考评级），用于词库之外的动作名称
+
+    Args:
+        name: 动作名称，可以是LLM自创的
+
+    Returns:
+        类别集合；同一名称只计算一次
+    """
+    return MOVE_MATCHER.classify([name])[0] | REFERENCE_LABELS.get(_normalize(name), frozenset())
+
+
+@lru_cache(maxsize=256)
+def _unknown_move_points(name: str, profile: str) -> Tuple[int, int]:
+    rules = SCORING_PROFILES[profile]
+    labels = move_labels(name)
+    return _rule_points(rules['move_difficulty'], labels), _rule_points(rules['move_energy'], labels)
+
+
+@lru_cache(maxsize=256)
+def _transition_points(transition: str, profile: str) -> int:
+    labels = MOVE_MATCHER.classify([transition])[0]
+    return _rule_points(SCORING_PROFILES[profile]['transition_difficulty'], labels)
+
+
+class MoveAttributeTable:
+    """动作属性表：按 ActionIndex 的动作ID排列的属性数组"""
+
+    def __init__(self, index: ActionIndex):
+        self.names = index.names
+        self.ids = index.ids
+        # 整个词库一次关键词扫描
+        keyword_labels = MOVE_MATCHER.classify(self.names)
+        self.labels = [labels | REFERENCE_LABELS.get(name, frozenset())
+                       for name, labels in zip(self.names, keyword_labels)]
+        self.difficulty = {}
+        self.energy = {}
+        for profile, rules in SCORING_PROFILES.items():
+            self.difficulty[profile] = np.array([_rule_points(rules['move_difficulty'], labels)
+                                                 for labels in self.labels])
+            self.energy[profile] = np.array([_rule_points(rules['move_energy'], labels)
+                                             for labels in self.labels])
+        # 参考库中的评级（没有参考视频的动作为NaN）
+        ratings = _reference_ratings()
+        rated = np.array([ratings.get(name, (np.nan, np.nan)) for name in self.names]).reshape(-1, 2)
+        self.reference_difficulty = rated[:, 0]
+        self.reference_energy = rated[:, 1]
+        # 层次和平面权重，每行之和为1，列顺序与 LEVELS / PLANES 一致
+        self.level_weights = np.array([_weights(labels, LEVELS, 'mid')
+                                       for labels in LEVEL_MATCHER.classify(self.names)])
+        self.plane_weights = np.array([_weights(labels, PLANES, 'frontal')
+                                       for labels in PLANE_MATCHER.classify(self.names)])
+
+    def move_points(self, names: Sequence[str], profile: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        一组动作的难度分和能量分
+
+        Args:
+            names: 动作名称列表
+            profile: SCORING_PROFILES 中的评分方案
+
+        Returns:
+            (难度分数组, 能量分数组)，与names一一对应
+        """
+        ids = np.fromiter((self.ids.get(name, -1) for name in names), dtype=np.intp, count=len(names))
+        known = ids >= 0
+        difficulty = np.zeros(len(names))
+        energy = np.zeros(len(names))
+        difficulty[known] = self.difficulty[profile][ids[known]]
+        energy[known] = self.energy[profile][ids[known]]
+        for position in np.flatnonzero(~known):
+            difficulty[position], energy[position] = _unknown_move_points(names[position], profile)
+        return difficulty, energy
+
+
+MOVE_ATTRIBUTES = MoveAttributeTable(ACTION_INDEX)
+
+
+def score_segments(segments: Sequence[Dict], profile: str = 'basic') -> Tuple[List[str], List[str]]:
+    """
+    一次评估整份编舞所有片段的难度和能量等级
+
+    Args:
+        segments: 编舞片段（使用 moves、transition、level、accent 字段；'pro' 方案还使用
+            audio_features 中的 tempo 和 tempo_drift）
+        profile: 'basic' 或 'pro'
+
+    Returns:
+        (难度等级列表, 能量等级列表)，与segments一一对应
+    """
+    rules = SCORING_PROFILES[profile]
+    count = len(segments)
+    owners = []
+    names = []
+    for position, segment in enumerate(segments):
+        moves = segment.get('moves', [])
+        owners.extend([position] * len(moves))
+        names.extend(moves)
+    move_difficulty, move_energy = MOVE_ATTRIBUTES.move_points(names, profile)
+    owners = np.array(owners, dtype=np.intp)
+
+    # 动作分按片段汇总，再加上片段级的层次、过渡、重音和速度分
+    difficulty = np.bincount(owners, weights=move_difficulty, minlength=count).astype(float)
+    energy = np.bincount(owners, weights=move_energy, minlength=count).astype(float)
+    difficulty += np.array([rules['level'].get(segment.get('level', 'mid'), 0) for segment in segments])
+    difficulty += np.array([_transition_points(segment.get('transition', ''), profile) for segment in segments])
+    energy += np.array([rules['accent'].get(segment.get('accent', 'medium'), rules['accent_default'])
+                        for segment in segments])
+
+    if rules['tempo'] or rules['tempo_drift']:
+        audio = [segment.get('audio_features', {}) for segment in segments]
+        tempo = np.array([features.get('tempo', 120) for features in audio], dtype=float)
+        drift = np.array([features.get('tempo_drift', 0.0) for features in audio], dtype=float)
+        if rules['tempo']:
+            difficulty += np.select([tempo > threshold for threshold, _ in rules['tempo']],
+                                    [points for _, points in rules['tempo']], 0)
+        if rules['tempo_drift']:
+            threshold, points = rules['tempo_drift']
+            difficulty += np.where(np.abs(drift) > threshold, points, 0)
+
+    # 分数不超过第k个上界即为第k级
+    difficulty_levels = np.searchsorted(rules['difficulty_bounds'], difficulty, side='left')
+    energy_levels = np.searchsorted(rules['energy_bounds'], energy, side='left')
+    return ([rules['difficulty_labels'][level] for level in difficulty_levels],
+            [rules['energy_labels'][level] for level in energy_levels])
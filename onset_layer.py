@@ -0,0 +1,119 @@
+"""
+起音层
+每条音轨只计算一次起音强度包络，并缓存速度图和节拍同步的起音峰值，
+供节拍跟踪、速度置信度、片段重音强度和局部速度共同使用
+"""
+
+import librosa
+import numpy as np
+from functools import cached_property
+from typing import Optional, Tuple
+
+
+class OnsetLayer:
+    """按音轨缓存的起音层
+
+    起音包络由特征库中已有的Mel谱派生，不再单独做STFT。
+    """
+
+    def __init__(self, bank, envelope: Optional[np.ndarray] = None):
+        self.bank = bank
+        self.sr = bank.sr
+        self.hop_length = bank.hop_length
+        self._beats = None
+        # 流式模式下起音包络已增量计算好，直接填充缓存
+        if envelope is not None:
+            self.__dict__['envelope'] = envelope
+
+    @cached_property
+    def envelope(self) -> np.ndarray:
+        """起音强度包络"""
+        return librosa.onset.onset_strength(
+            S=librosa.power_to_db(self.bank.mel), sr=self.sr, hop_length=self.hop_length)
+
+    @cached_property
+    def tempogram(self) -> np.ndarray:
+        """自相关速度图"""
+        return librosa.feature.tempogram(
+            onset_envelope=self.envelope, sr=self.sr, hop_length=self.hop_length)
+
+    def track_beats(self) -> Tuple[float, np.ndarray]:
+        """
+        基于缓存的起音包络做节拍跟踪
+
+        Returns:
+            tempo: 全局速度（BPM）
+            beats: 节拍帧索引
+        """
+        if self._beats is None:
+            tempo, beats = librosa.beat.beat_track(
+                onset_envelope=self.envelope, sr=self.sr, hop_length=self.hop_length)
+            # librosa 0.11 起 tempo 以数组形式返回
+            self._beats = (float(np.atleast_1d(tempo)[0]), beats)
+        return self._beats
+
+    def time_to_frames(self, times: np.ndarray) -> np.ndarray:
+        """把时间映射为包络帧索引"""
+        frames = librosa.time_to_frames(np.asarray(times, dtype=float),
+                                        sr=self.sr, hop_length=self.hop_length)
+        return np.clip(frames, 0, len(self.envelope) - 1)
+
+    def beat_peaks(self, beat_times: np.ndarray) -> np.ndarray:
+        """
+        节拍同步的起音峰值
+
+        Args:
+            beat_times: 节拍时间（秒）
+
+        Returns:
+            每个节拍到下一个节拍之间起音强度的最大值，与beat_times等长
+        """
+        if len(beat_times) == 0:
+            return np.zeros(0)
+        frames = self.time_to_frames(beat_times)
+        # 保证索引单调，最后一拍延伸到音轨结尾
+        frames = np.maximum.accumulate(frames)
+        return np.maximum.reduceat(self.envelope, frames)
+
+    def beat_salience(self, beat_times: np.ndarray) -> float:
+        """节拍处起音相对整轨平均水平的显著度，范围 [0, 1]"""
+        mean_strength = float(np.mean(self.envelope)) if len(self.envelope) else 0.0
+        if len(beat_times) == 0 or mean_strength <= 0:
+            return 0.0
+        ratio = float(np.mean(self.envelope[self.time_to_frames(beat_times)])) / mean_strength
+        return float(np.clip(1.0 - 1.0 / ratio, 0.0, 1.0)) if ratio > 0 else 0.0
+
+    def tempo_strength(self, tempo: float) -> float:
+        """速度图在给定速度处的相对强度，范围 [0, 1]"""
+        if tempo <= 0 or self.tempogram.shape[1] == 0:
+            return 0.0
+        autocorr = np.mean(self.tempogram, axis=1)
+        frequencies = librosa.tempo_frequencies(len(autocorr), sr=self.sr, hop_length=self.hop_length)
+        # 第0个延迟对应无穷大速度，跳过
+        peak = float(np.max(autocorr[1:])) if len(autocorr) > 1 else 0.0
+        if peak <= 0:
+            return 0.0
+        lag = 1 + int(np.argmin(np.abs(frequencies[1:] - tempo)))
+        return float(np.clip(autocorr[lag] / peak, 0.0, 1.0))
+
+    def segment_accent_strength(self, beat_times: np.ndarray, segments) -> np.ndarray:
+        """
+        每个片段的重音强度：片段内节拍峰值的均值相对整轨节拍峰值中位数
+
+        Args:
+            beat_times: 节拍时间（秒）
+            segments: 包含start_beat/end_beat的片段列表
+
+        Returns:
+            与segments等长的重音强度数组
+        """
+        peaks = self.beat_peaks(beat_times)
+        if len(peaks) == 0:
+            return np.zeros(len(segments))
+        reference = float(np.median(peaks)) or 1.0
+        strengths = np.empty(len(segments))
+        for i, segment in enumerate(segments):
+            start = int(segment['start_beat'])
+            end = min(int(segment['end_beat']), len(peaks) - 1)
+            strengths[i] = np.mean(peaks[start:end + 1]) / reference if end >= start else 0.0
+        return strengths
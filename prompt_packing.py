@@ -0,0 +1,72 @@
+"""
+按token预算打包片段
+把连续的8拍片段分成若干批次，每批的预计输出不超过max_tokens，
+使任意长度的歌曲都能用最少的请求完成而不会被截断
+"""
+
+import math
+import re
+from functools import lru_cache
+from typing import List, Optional, Sequence
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+_CJK = re.compile(r'[　-〿一-鿿＀-￯]')
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: Optional[str]):
+    """获取tiktoken编码，不可用（未安装或无法加载词表）时返回None"""
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding('cl100k_base')
+    except KeyError:
+        return _get_encoding(None) if model else None
+    except Exception as e:
+        print(f"⚠️ 无法加载tiktoken编码，改用粗略估计: {e}")
+        return None
+
+
+def estimate_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    估计文本的token数
+
+    安装了tiktoken时按模型的编码精确计数（model为None时使用cl100k_base）；
+    否则粗略估计：中文字符约每字1个token，其余字符约每4个字符1个token。
+    """
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    cjk = len(_CJK.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def pack_segments(costs: Sequence[int], budget: int, overhead: int = 0) -> List[List[int]]:
+    """
+    按顺序贪心打包
+
+    Args:
+        costs: 每个片段的预计token数
+        budget: 每批的token上限
+        overhead: 每批固定开销（如style、global_cues等公共字段）
+
+    Returns:
+        每批包含的片段索引列表；单个片段超出预算时独占一批
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    used = overhead
+    for index, cost in enumerate(costs):
+        if current and used + cost > budget:
+            batches.append(current)
+            current, used = [], overhead
+        current.append(index)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
@@ -0,0 +1,255 @@
+"""
+预编译提示模板
+每个 (模板类型, 舞蹈风格, 语言) 只渲染一次静态前缀（角色说明、输出要求、Few-shot示例），
+之后的请求只填充动态部分。消息按"静态在前、动态在后"排列：系统消息完全静态，
+同一风格的所有请求共享相同的前缀，可以命中服务端的提示缓存。
+"""
+
+import json
+import threading
+from typing import Dict, List, Tuple
+
+from compact_format import codebook_text
+from prompt_packing import estimate_tokens
+
+# Few-shot示例（结构化编舞）
+FEW_SHOT_EXAMPLES = [
+    {
+        "style": "Hip-Hop",
+        "global_cues": {
+            "energy_level": "high",
+            "mood": "aggressive and confident",
+            "key_characteristics": ["bounce", "isolation", "rhythmic precision"]
+        },
+        "segments": [
+            {
+                "idx": 0,
+                "time": "0:00-0:16",
+                "accent": "strong",
+                "level": "mid",
+                "plane": "frontal",
+                "motifs": ["bounce", "rock"],
+                "moves": ["two-step", "chest-pop", "shoulder-roll", "freeze"],
+                "transition": "quarter-turn"
+            },
+            {
+                "idx": 1,
+                "time": "0:16-0:32",
+                "accent": "medium",
+                "level": "low",
+                "plane": "sagittal",
+                "motifs": ["groove", "sway"],
+                "moves": ["running-man", "body-wave", "hip-roll", "level-drop"],
+                "transition": "travel-diagonal"
+            }
+        ]
+    },
+    {
+        "style": "House",
+        "global_cues": {
+            "energy_level": "medium",
+            "mood": "smooth and flowing",
+            "key_characteristics": ["groove", "flow", "smooth transitions"]
+        },
+        "segments": [
+            {
+                "idx": 0,
+                "time": "0:00-0:16",
+                "accent": "medium",
+                "level": "mid",
+                "plane": "transverse",
+                "motifs": ["groove", "sway"],
+                "moves": ["jack", "skate", "lofting", "shuffle"],
+                "transition": "smooth-transition"
+            },
+            {
+                "idx": 1,
+                "time": "0:16-0:32",
+                "accent": "weak",
+                "level": "high",
+                "plane": "frontal",
+                "motifs": ["flow", "liquid"],
+                "moves": ["vogue", "waacking", "liquid", "tutting"],
+                "transition": "flow-transition"
+            }
+        ]
+    }
+]
+
+# 结构化编舞的用户消息（完整格式和紧凑格式共用）
+_STRUCTURED_USER = """候选动作池：{candidates}
+需避免动作：{avoid}
+
+音频特征分析：
+- BPM: {bpm}
+- 能量等级: {energy_level}
+- 舞蹈风格: {dance_style}
+- 片段数量: {segment_count}
+
+片段速度：
+{segment_tempo_lines}
+{batch_note}{context_note}
+请为每个片段生成详细的编舞建议，包含：
+- 动作层次变化 (high/mid/low/floor)
+- 空间平面 (frontal/sagittal/transverse)
+- 动态变化 (strong/medium/weak accent)
+- 具体动作组合
+- 过渡方式
+
+确保动作多样性和{dance_style}风格特色。"""
+
+# 模板原文：{dance_style} 等静态字段在编译时替换，其余字段在每次请求时填充
+_SOURCES = {
+    'zh': {
+        'structured': {
+            'system': """你是一个专业的编舞师，擅长{dance_style}风格。请根据音频特征生成结构化的编舞建议。
+
+要求：
+1. 输出必须是有效的JSON格式，严格遵循示例的结构
+2. 使用丰富的动作词汇，避免重复
+3. 考虑动作的层次、方向和动态变化
+4. 每个片段包含4-6个具体动作
+5. 动作要符合{dance_style}风格特点
+
+Few-shot示例：
+{examples}
+
+请严格按照示例的JSON结构输出。""",
+            'user': _STRUCTURED_USER
+        },
+        'structured_compact': {
+            'system': """你是一个专业的编舞师，擅长{dance_style}风格。请根据音频特征生成结构化的编舞建议。
+
+要求：
+1. 只输出紧凑编码的JSON，不要输出解释或多余的空白
+2. 使用丰富的动作，避免重复
+3. 考虑动作的层次、方向和动态变化
+4. 每个片段包含4-6个动作
+5. 动作要符合{dance_style}风格特点
+
+{codebook}""",
+            'user': _STRUCTURED_USER
+        },
+        'segment': {
+            'system': """作为专业编舞师，请为音乐片段设计简洁实用的{dance_style}舞蹈动作。
+
+请分析音乐特点并给出简洁的舞蹈建议，要求：
+
+1. **节奏要点**: 分析这段音乐的特点（如：节奏很快、气氛燥、需要力度大、有低音bass三连音等）
+2. **舞蹈元素**: 推荐3-5个适配的舞蹈动作元素
+3. **关键提示**: 1-2个最重要的技术要点
+
+请直接返回JSON格式，不要使用markdown代码块标记，包含以下字段：
+- "rhythm_analysis": 节奏分析，如"节奏很快，气氛燥，需要力度大，低音bass有三连音"
+- "dance_elements": 推荐的舞蹈元素列表，如["Harlem Shake", "Running Man", "Freeze"]
+- "key_tips": 关键提示，如"动作要卡在bass上，力度要大"
+- "difficulty": 难度等级(1-5)
+- "energy_level": 能量等级(1-5)
+- "reference_moves": 参考的经典动作名称列表""",
+            'user': """音乐特征:
+- BPM: {bpm} ({tempo_feel}节奏)
+- 本段局部速度: {local_tempo} BPM (速度漂移 {tempo_drift} BPM)
+- 能量: {energy_level}
+- 舞蹈风格: {dance_style}
+- 节拍数: {segment_beats}
+
+{reference_text}"""
+        }
+    }
+}
+
+
+class _KeepMissing(dict):
+    """format_map时保留未提供的字段，供之后再次填充"""
+
+    def __missing__(self, key: str) -> str:
+        return '{' + key + '}'
+
+
+def _escape(values: Dict) -> Dict[str, str]:
+    """部分填充的值之后还要经过一次format，需转义其中的花括号"""
+    return {key: str(value).replace('{', '{{').replace('}', '}}') for key, value in values.items()}
+
+
+class PromptTemplate:
+    """编译后的提示模板
+
+    system 为完全静态的系统消息；user_format 为用户消息的格式串，
+    partial() 可以先填充一部分字段（如一次生成内不变的候选动作池）。
+    """
+
+    def __init__(self, name: str, style: str, language: str, system: str, user_format: str):
+        self.name = name
+        self.style = style
+        self.language = language
+        self.system = system
+        self.user_format = user_format
+        self.system_tokens = estimate_tokens(system)
+
+    def partial(self, **values) -> 'PromptTemplate':
+        """填充部分字段，返回共享同一静态前缀的新模板"""
+        template = PromptTemplate.__new__(PromptTemplate)
+        template.__dict__.update(self.__dict__)
+        template.user_format = self.user_format.format_map(_KeepMissing(_escape(values)))
+        return template
+
+    def render(self, **values) -> List[Dict]:
+        """
+        填充剩余字段
+
+        Returns:
+            chat消息列表，静态的系统消息在前
+        """
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.user_format.format(**values)}
+        ]
+
+
+_templates: Dict[Tuple[str, str, str], PromptTemplate] = {}
+_templates_lock = threading.Lock()
+
+
+def _compile(name: str, style: str, language: str) -> PromptTemplate:
+    if language not in _SOURCES:
+        raise ValueError(f"不支持的提示语言: {language}")
+    if name not in _SOURCES[language]:
+        raise ValueError(f"未知的提示模板: {name}")
+    source = _SOURCES[language][name]
+    # 示例使用紧凑的JSON，减少每次请求的输入token
+    examples = "\n\n".join(json.dumps(example, ensure_ascii=False, separators=(',', ':'))
+                           for example in FEW_SHOT_EXAMPLES)
+    system = source['system'].format(dance_style=style, examples=examples, codebook=codebook_text())
+    user_format = source['user'].format_map(_KeepMissing(_escape({'dance_style': style})))
+    return PromptTemplate(name, style, language, system, user_format)
+
+
+def get_template(name: str, style: str, language: str = 'zh') -> PromptTemplate:
+    """
+    获取（首次时编译）提示模板
+
+    Args:
+        name: 模板类型，'structured'（结构化批量编舞）、'structured_compact'（紧凑编码输出）
+                或 'segment'（单片段编舞）
+        style: 舞蹈风格
+        language: 提示语言
+
+    Returns:
+        编译后的模板，同一参数始终返回同一个对象
+    """
+    key = (name, style, language)
+    template = _templates.get(key)
+    if template is None:
+        with _templates_lock:
+            template = _templates.get(key)
+            if template is None:
+                template = _compile(name, style, language)
+                _templates[key] = template
+                print(f"🧩 编译提示模板 {name}/{style}/{language}，静态前缀约{template.system_tokens} tokens")
+    return template
+
+
+def template_token_report() -> List[Dict]:
+    """已编译模板的静态前缀token数"""
+    return [{'name': t.name, 'style': t.style, 'language': t.language, 'system_tokens': t.system_tokens}
+            for t in sorted(_templates.values(), key=lambda t: (t.name, t.style, t.language))]
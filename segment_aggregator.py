@@ -0,0 +1,96 @@
+"""
+片段特征聚合引擎
+把8拍片段的时间边界映射到整轨帧级特征的帧索引，
+用一次 np.add.reduceat 归约得到所有片段的能量、亮度、复杂度和MFCC均值
+"""
+
+import numpy as np
+from typing import Dict, List
+from audio_feature_bank import AudioFeatureBank
+
+
+def segment_frame_bounds(bank: AudioFeatureBank, segments: List[Dict]) -> np.ndarray:
+    """
+    计算每个片段的帧区间
+
+    Args:
+        bank: 整轨特征库
+        segments: 包含start_time/end_time的片段列表
+
+    Returns:
+        形状为 (n_segments, 2) 的 [start, end) 帧索引
+    """
+    bounds = np.empty((len(segments), 2), dtype=np.intp)
+    for i, segment in enumerate(segments):
+        frames = bank.frame_slice(segment['start_time'], segment['end_time'])
+        bounds[i] = frames.start, frames.stop
+    return bounds
+
+
+def reduce_segment_frames(bank: AudioFeatureBank, segments: List[Dict]) -> Dict[str, np.ndarray]:
+    """
+    一次归约计算所有片段的帧级统计量
+
+    Args:
+        bank: 整轨特征库
+        segments: 片段列表
+
+    Returns:
+        包含 energy / brightness / brightness_std / mfcc_mean 数组的字典，
+        mfcc_mean 形状为 (n_segments, n_mfcc)
+    """
+    if not segments:
+        return {
+            'energy': np.zeros(0),
+            'brightness': np.zeros(0),
+            'brightness_std': np.zeros(0),
+            'mfcc_mean': np.zeros((0, bank.n_mfcc))
+        }
+
+    centroid = bank.spectral_centroid
+    stacked = np.vstack([bank.rms, centroid, centroid ** 2, bank.mfcc])
+    # 末尾补一帧零，使得 end == n_frames 也是合法的 reduceat 索引
+    stacked = np.hstack([stacked, np.zeros((stacked.shape[0], 1))])
+
+    bounds = segment_frame_bounds(bank, segments)
+    # 交错排列 [s0, e0, s1, e1, ...]，偶数位置的结果即 [s_i, e_i) 的和
+    sums = np.add.reduceat(stacked, bounds.ravel(), axis=1)[:, ::2]
+    counts = (bounds[:, 1] - bounds[:, 0]).astype(float)
+    means = sums / counts
+
+    brightness = means[1]
+    brightness_var = np.maximum(means[2] - brightness ** 2, 0.0)
+
+    return {
+        'energy': means[0],
+        'brightness': brightness,
+        'brightness_std': np.sqrt(brightness_var),
+        'mfcc_mean': means[3:].T
+    }
+
+
+def aggregate_segment_features(bank: AudioFeatureBank, segments: List[Dict]) -> List[Dict]:
+    """
+    生成每个片段的特征字典
+
+    复杂度定义为片段内频谱重心的变异系数 (std / mean)。
+
+    Args:
+        bank: 整轨特征库
+        segments: 片段列表
+
+    Returns:
+        与segments一一对应的特征字典列表
+    """
+    stats = reduce_segment_frames(bank, segments)
+    results = []
+    for i in range(len(segments)):
+        brightness = stats['brightness'][i]
+        complexity = stats['brightness_std'][i] / brightness if brightness > 0 else 0
+        results.append({
+            'energy': float(stats['energy'][i]),
+            'brightness': float(brightness),
+            'complexity': float(complexity),
+            'mfcc_mean': [float(x) for x in stats['mfcc_mean'][i]]
+        })
+    return results
@@ -0,0 +1,213 @@
+"""
+片段编舞近邻索引
+以片段特征向量（局部速度、能量、亮度、复杂度、MFCC均值，按风格分区）为键，
+保存已通过验证的LLM片段编舞；足够相似的新片段直接在本地复用，无需再次调用LLM。
+索引以JSONL持久化，每次插入追加一行。
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+import config
+
+# 各特征的比例尺：差一个比例尺的距离计为1
+FEATURE_SCALES = {
+    'tempo': 10.0,        # BPM
+    'energy': 0.05,       # RMS
+    'brightness': 500.0,  # 频谱重心 Hz
+    'complexity': 0.1,    # 频谱重心变异系数
+    'mfcc': 20.0          # 每维MFCC均值
+}
+
+REQUIRED_FIELDS = ('rhythm_analysis', 'dance_elements', 'key_tips', 'difficulty', 'energy_level')
+
+
+def segment_vector(segment: Dict, bpm: float) -> Optional[np.ndarray]:
+    """
+    计算片段的特征向量
+
+    Args:
+        segment: 带有 energy / brightness / complexity / mfcc_mean 的片段（见 segment_aggregator）
+        bpm: 整曲BPM，片段没有局部速度时使用
+
+    Returns:
+        特征向量；片段缺少特征时返回None
+    """
+    if 'energy' not in segment or 'mfcc_mean' not in segment:
+        return None
+    mfcc = np.asarray(segment['mfcc_mean'], dtype=float)
+    return np.concatenate([
+        [float(segment.get('tempo', bpm)) / FEATURE_SCALES['tempo'],
+         float(segment['energy']) / FEATURE_SCALES['energy'],
+         float(segment.get('brightness', 0.0)) / FEATURE_SCALES['brightness'],
+         float(segment.get('complexity', 0.0)) / FEATURE_SCALES['complexity']],
+        # MFCC各维合起来与单个标量特征权重相当
+        mfcc / FEATURE_SCALES['mfcc'] / np.sqrt(max(len(mfcc), 1))
+    ])
+
+
+def is_valid_choreography(choreography: Dict) -> bool:
+    """只有字段完整的LLM结果才能入库"""
+    return (all(field in choreography for field in REQUIRED_FIELDS)
+            and isinstance(choreography['dance_elements'], list) and len(choreography['dance_elements']) > 0)
+
+
+class SegmentIndex:
+    """按风格分区的片段编舞近邻索引
+
+    相似度为 1 / (1 + 缩放后的欧氏距离)。多样性规则：
+    - 同一次生成中每条编舞最多使用一次（由调用方传入 exclude）
+    - 与上一片段的舞蹈元素有重叠的候选不使用（由调用方传入 avoid_elements）
+    - 在超过阈值的前 top_k 个候选中随机选择
+    """
+
+    def __init__(self, path: Optional[str], min_similarity: float = 0.5, top_k: int = 5,
+                 duplicate_similarity: float = 0.98):
+        """
+        Args:
+            path: JSONL文件路径，None时只在内存中保存
+            min_similarity: 本地复用所需的最低相似度
+            top_k: 参与随机选择的候选数
+            duplicate_similarity: 与已有条目的相似度超过此值时不再插入
+        """
+        self.path = path
+        self.min_similarity = min_similarity
+        self.top_k = top_k
+        self.duplicate_similarity = duplicate_similarity
+        self._vectors: Dict[str, List[np.ndarray]] = {}
+        self._entries: Dict[str, List[Dict]] = {}
+        self._matrices: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self._load()
+
+    def _load(self) -> None:
+        skipped = 0
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    self._add(entry['style'], np.asarray(entry['vector'], dtype=float), entry)
+                except (json.JSONDecodeError, KeyError, ValueError):
+                    skipped += 1
+        if skipped:
+            print(f"⚠️ 片段索引中有{skipped}行无法解析，已跳过")
+
+    def _add(self, style: str, vector: np.ndarray, entry: Dict) -> None:
+        vectors = self._vectors.setdefault(style, [])
+        if vectors and len(vectors[0]) != len(vector):
+            raise ValueError("特征维度不一致")
+        entry['id'] = f"{style}:{len(vectors)}"
+        vectors.append(vector)
+        self._entries.setdefault(style, []).append(entry)
+        self._matrices.pop(style, None)
+
+    def _matrix(self, style: str) -> Optional[np.ndarray]:
+        if style not in self._matrices and self._vectors.get(style):
+            self._matrices[style] = np.vstack(self._vectors[style])
+        return self._matrices.get(style)
+
+    def _similarities(self, style: str, vector: np.ndarray) -> Optional[np.ndarray]:
+        matrix = self._matrix(style)
+        if matrix is None or matrix.shape[1] != len(vector):
+            return None
+        return 1.0 / (1.0 + np.linalg.norm(matrix - vector, axis=1))
+
+    def lookup(self, style: str, vector: np.ndarray, exclude: Optional[Set[str]] = None,
+               avoid_elements: Optional[List[str]] = None) -> Optional[Tuple[Dict, float, str]]:
+        """
+        查找可复用的片段编舞
+
+        Args:
+            style: 舞蹈风格
+            vector: 片段特征向量
+            exclude: 本次生成中已使用的条目ID
+            avoid_elements: 上一片段的舞蹈元素，候选与其有重叠时跳过
+
+        Returns:
+            (编舞副本, 相似度, 条目ID)，没有满足条件的候选时返回None
+        """
+        with self._lock:
+            similarities = self._similarities(style, vector)
+            if similarities is None:
+                return None
+            entries = self._entries[style]
+            order = np.argsort(-similarities)
+            avoid = set(avoid_elements or [])
+            candidates = []
+            for i in order:
+                if similarities[i] < self.min_similarity or len(candidates) >= self.top_k:
+                    break
+                entry = entries[i]
+                if exclude and entry['id'] in exclude:
+                    continue
+                if avoid & set(entry['choreography'].get('dance_elements', [])):
+                    continue
+                candidates.append((entry, float(similarities[i])))
+        if not candidates:
+            return None
+        entry, similarity = random.choice(candidates)
+        return json.loads(json.dumps(entry['choreography'])), similarity, entry['id']
+
+    def insert(self, style: str, vector: np.ndarray, choreography: Dict) -> bool:
+        """
+        插入一条已验证的片段编舞（增量追加到JSONL）
+
+        Returns:
+            是否插入；字段不完整或与已有条目几乎相同时不插入
+        """
+        if not is_valid_choreography(choreography):
+            return False
+        entry = {
+            'style': style,
+            'vector': [float(x) for x in vector],
+            'choreography': json.loads(json.dumps(choreography)),
+            'created_at': time.time()
+        }
+        with self._lock:
+            similarities = self._similarities(style, vector)
+            if similarities is not None and len(similarities) and similarities.max() >= self.duplicate_similarity:
+                return False
+            try:
+                self._add(style, vector, entry)
+            except ValueError:
+                return False
+            if self.path:
+                self._append(entry)
+        return True
+
+    def _append(self, entry: Dict) -> None:
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({key: value for key, value in entry.items() if key != 'id'},
+                                   ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"⚠️ 写入片段索引失败: {e}")
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._entries.values())
+
+
+_default_index: Optional[SegmentIndex] = None
+_default_index_lock = threading.Lock()
+
+
+def get_default_index() -> Optional[SegmentIndex]:
+    """按config创建的进程级片段索引，禁用时返回None"""
+    global _default_index
+    if not config.SEGMENT_INDEX_ENABLED:
+        return None
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = SegmentIndex(config.SEGMENT_INDEX_PATH, config.SEGMENT_INDEX_MIN_SIMILARITY,
+                                          config.SEGMENT_INDEX_TOP_K)
+        return _default_index
@@ -0,0 +1,275 @@
+"""
+流式音频加载与增量特征提取
+按固定大小的块解码和重采样，逐块计算帧级特征、起音包络和RMS，
+块之间保留 n_fft - hop_length 个样本的重叠，峰值内存与音轨长度无关
+"""
+
+import subprocess
+from typing import Dict, Iterator, Optional
+
+import librosa
+import numpy as np
+import scipy.signal
+import soundfile as sf
+
+import config
+from audio_feature_bank import AudioFeatureBank
+from onset_layer import OnsetLayer
+
+try:
+    import soxr
+    SOXR_AVAILABLE = True
+except ImportError:
+    SOXR_AVAILABLE = False
+
+FRAME_FEATURES = ('spectral_centroid', 'spectral_rolloff', 'spectral_bandwidth',
+                  'rms', 'zero_crossing_rate', 'mfcc', 'chroma')
+
+
+def should_stream(file_path: str, mode: Optional[str] = None,
+                  min_duration: Optional[float] = None) -> bool:
+    """
+    判断是否使用流式模式
+
+    Args:
+        file_path: 音频文件路径
+        mode: 'on' / 'off' / 'auto'，默认读取 config.STREAMING_AUDIO
+        min_duration: auto 模式下启用流式的最短时长（秒）
+
+    Returns:
+        是否流式处理
+    """
+    mode = (mode or config.STREAMING_AUDIO).lower()
+    if mode == 'on':
+        return True
+    if mode == 'off':
+        return False
+    if min_duration is None:
+        min_duration = config.STREAMING_MIN_DURATION
+    try:
+        return sf.info(file_path).duration >= min_duration
+    except Exception:
+        # 无法读取文件头时（例如旧版libsndfile不支持的MP3）按普通模式处理
+        return False
+
+
+class StreamingAudioLoader:
+    """分块解码、混缩为单声道并重采样的加载器"""
+
+    def __init__(self, sample_rate: int = 22050, block_seconds: float = 30.0):
+        self.sample_rate = sample_rate
+        self.block_seconds = block_seconds
+
+    def blocks(self, file_path: str) -> Iterator[np.ndarray]:
+        """
+        逐块产出目标采样率下的单声道float32音频
+
+        优先使用soundfile分块读取，soundfile无法打开的格式改用ffmpeg管道。
+        """
+        try:
+            info = sf.info(file_path)
+        except Exception:
+            yield from self._ffmpeg_blocks(file_path)
+            return
+
+        yield from self._soundfile_blocks(file_path, info.samplerate)
+
+    def _soundfile_blocks(self, file_path: str, native_rate: int) -> Iterator[np.ndarray]:
+        """soundfile分块读取，使用soxr流式重采样保证块边界连续"""
+        blocksize = max(int(native_rate * self.block_seconds), 1)
+        resampler = None
+        if native_rate != self.sample_rate:
+            if SOXR_AVAILABLE:
+                resampler = soxr.ResampleStream(native_rate, self.sample_rate, 1,
+                                                dtype='float32', quality='HQ')
+            else:
+                print("⚠️ soxr 不可用，逐块独立重采样，块边界可能有轻微失真")
+
+        for block in sf.blocks(file_path, blocksize=blocksize, dtype='float32', always_2d=True):
+            mono = np.ascontiguousarray(block.mean(axis=1), dtype=np.float32)
+            if native_rate == self.sample_rate:
+                yield mono
+            elif resampler is not None:
+                out = resampler.resample_chunk(mono, last=False)
+                if len(out):
+                    yield out
+            else:
+                yield librosa.resample(mono, orig_sr=native_rate, target_sr=self.sample_rate)
+
+        if resampler is not None:
+            tail = resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+            if len(tail):
+                yield tail
+
+    def _ffmpeg_blocks(self, file_path: str) -> Iterator[np.ndarray]:
+        """ffmpeg管道解码，输出已经是目标采样率的单声道float32"""
+        command = ['ffmpeg', '-nostdin', '-v', 'error', '-i', file_path,
+                   '-f', 'f32le', '-ac', '1', '-ar', str(self.sample_rate), '-']
+        try:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except FileNotFoundError:
+            raise Exception(f"无法流式解码音频文件（soundfile不支持且未安装ffmpeg）: {file_path}")
+
+        block_bytes = int(self.sample_rate * self.block_seconds) * 4
+        try:
+            while True:
+                data = process.stdout.read(block_bytes)
+                if not data:
+                    break
+                usable = len(data) - len(data) % 4
+                yield np.frombuffer(data[:usable], dtype=np.float32)
+        finally:
+            process.stdout.close()
+            stderr = process.stderr.read().decode(errors='ignore')
+            process.stderr.close()
+            if process.wait() != 0:
+                raise Exception(f"ffmpeg解码失败: {stderr.strip()}")
+
+
+class StreamingFeatureBank(AudioFeatureBank):
+    """流式模式下的特征库
+
+    只保存帧级特征和起音包络，不保存原始信号和完整频谱；
+    接口与AudioFeatureBank一致，可直接用于情绪、风格、片段和速度分析。
+    """
+
+    def __init__(self, sr: int, n_fft: int, hop_length: int, n_mfcc: int,
+                 n_samples: int, features: Dict[str, np.ndarray], onset_envelope: np.ndarray):
+        super().__init__(None, sr, n_fft=n_fft, hop_length=hop_length, n_mfcc=n_mfcc)
+        self.n_samples = n_samples
+        # 预先填充cached_property的缓存
+        self.__dict__.update(features)
+        self.__dict__['onset'] = OnsetLayer(self, envelope=onset_envelope)
+
+    @property
+    def duration(self) -> float:
+        return self.n_samples / self.sr
+
+    @property
+    def n_frames(self) -> int:
+        return len(self.rms)
+
+    @property
+    def magnitude(self) -> np.ndarray:
+        raise RuntimeError("流式特征库不保存完整频谱")
+
+    @property
+    def power(self) -> np.ndarray:
+        raise RuntimeError("流式特征库不保存完整频谱")
+
+    @property
+    def mel(self) -> np.ndarray:
+        raise RuntimeError("流式特征库不保存完整频谱")
+
+
+class StreamingFeatureExtractor:
+    """增量帧级特征提取器
+
+    与librosa的 center=True、零填充STFT保持相同的分帧方式：
+    开头补 n_fft // 2 个零，每次只处理完整落在缓冲区内的帧，剩余样本留给下一块。
+    """
+
+    def __init__(self, sr: int, n_fft: int = 2048, hop_length: int = 512, n_mfcc: int = 13):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.n_mfcc = n_mfcc
+        self.window = scipy.signal.get_window('hann', n_fft, fftbins=True).astype(np.float32)[:, None]
+        self.mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft)
+        self.buffer = np.zeros(n_fft // 2, dtype=np.float32)
+        self.n_samples = 0
+        self.tuning = None
+        self.prev_mel_db = None
+        self._parts = {name: [] for name in FRAME_FEATURES}
+        self._flux = []
+
+    def process(self, block: np.ndarray) -> None:
+        """处理一个音频块"""
+        self.n_samples += len(block)
+        self.buffer = np.concatenate([self.buffer, block.astype(np.float32, copy=False)])
+        self._consume()
+
+    def _consume(self) -> None:
+        """处理缓冲区中所有完整的帧，保留与下一帧重叠的样本"""
+        if len(self.buffer) < self.n_fft:
+            return
+        n_frames = 1 + (len(self.buffer) - self.n_fft) // self.hop_length
+        used = (n_frames - 1) * self.hop_length + self.n_fft
+        frames = librosa.util.frame(self.buffer[:used], frame_length=self.n_fft,
+                                    hop_length=self.hop_length)
+        self._analyze_frames(frames)
+        self.buffer = self.buffer[n_frames * self.hop_length:].copy()
+
+    def _analyze_frames(self, frames: np.ndarray) -> None:
+        """计算一批帧的特征"""
+        magnitude = np.abs(np.fft.rfft(frames * self.window, axis=0)).astype(np.float32)
+        power = magnitude ** 2
+
+        parts = self._parts
+        parts['spectral_centroid'].append(librosa.feature.spectral_centroid(
+            S=magnitude, sr=self.sr, n_fft=self.n_fft)[0])
+        parts['spectral_rolloff'].append(librosa.feature.spectral_rolloff(
+            S=magnitude, sr=self.sr, n_fft=self.n_fft)[0])
+        parts['spectral_bandwidth'].append(librosa.feature.spectral_bandwidth(
+            S=magnitude, sr=self.sr, n_fft=self.n_fft)[0])
+        parts['rms'].append(librosa.feature.rms(S=magnitude, frame_length=self.n_fft)[0])
+        parts['zero_crossing_rate'].append(np.mean(
+            librosa.zero_crossings(frames, pad=False, axis=0), axis=0))
+
+        # 整轨最大值未知，这里不做top_db截断
+        mel_db = librosa.power_to_db(self.mel_basis @ power, top_db=None)
+        parts['mfcc'].append(librosa.feature.mfcc(S=mel_db, n_mfcc=self.n_mfcc))
+
+        # 调音偏差只在第一块上估计一次
+        if self.tuning is None:
+            self.tuning = float(librosa.estimate_tuning(S=power, sr=self.sr, n_fft=self.n_fft))
+        parts['chroma'].append(librosa.feature.chroma_stft(
+            S=power, sr=self.sr, n_fft=self.n_fft, tuning=self.tuning))
+
+        # 频谱通量（起音强度），跨块时接上一块的最后一帧
+        sequence = mel_db if self.prev_mel_db is None else np.hstack([self.prev_mel_db, mel_db])
+        self._flux.append(np.mean(np.maximum(0.0, np.diff(sequence, axis=1)), axis=0))
+        self.prev_mel_db = mel_db[:, -1:]
+
+    def finalize(self) -> StreamingFeatureBank:
+        """补齐结尾的中心填充并生成特征库"""
+        self.buffer = np.concatenate([self.buffer, np.zeros(self.n_fft // 2, dtype=np.float32)])
+        self._consume()
+
+        features = {}
+        for name, parts in self._parts.items():
+            axis = 1 if name in ('mfcc', 'chroma') else 0
+            features[name] = np.concatenate(parts, axis=axis) if parts else np.zeros(0)
+
+        n_frames = len(features['rms'])
+        # 与librosa.onset.onset_strength(center=True)一致的前置填充
+        pad = 1 + self.n_fft // (2 * self.hop_length)
+        flux = np.concatenate(self._flux) if self._flux else np.zeros(0)
+        onset_envelope = np.concatenate([np.zeros(pad), flux])[:n_frames].astype(np.float32)
+
+        return StreamingFeatureBank(self.sr, self.n_fft, self.hop_length, self.n_mfcc,
+                                    self.n_samples, features, onset_envelope)
+
+
+def stream_feature_bank(file_path: str, sample_rate: int = 22050, n_fft: int = 2048,
+                        hop_length: int = 512, n_mfcc: int = 13,
+                        block_seconds: Optional[float] = None) -> StreamingFeatureBank:
+    """
+    流式解码音频文件并增量计算帧级特征
+
+    Args:
+        file_path: 音频文件路径
+        sample_rate: 目标采样率
+        n_fft: 帧长
+        hop_length: 帧移
+        n_mfcc: MFCC维数
+        block_seconds: 每块时长，默认读取 config.STREAMING_BLOCK_SECONDS
+
+    Returns:
+        StreamingFeatureBank
+    """
+    loader = StreamingAudioLoader(sample_rate, block_seconds or config.STREAMING_BLOCK_SECONDS)
+    extractor = StreamingFeatureExtractor(sample_rate, n_fft=n_fft, hop_length=hop_length, n_mfcc=n_mfcc)
+    for block in loader.blocks(file_path):
+        extractor.process(block)
+    return extractor.finalize()
@@ -8,6 +8,10 @@ import numpy as np
 import soundfile as sf
 from typing import Dict, List, Tuple, Optional
 import warnings
+from audio_feature_bank import AudioFeatureBank
+from onset_layer import OnsetLayer
+from segment_aggregator import aggregate_segment_features
+from local_tempo import estimate_local_tempo
 warnings.filterwarnings('ignore')
 
 class StreamlitCloudAudioAnalyzer:
@@ -26,25 +30,33 @@ class StreamlitCloudAudioAnalyzer:
         except Exception as e:
             raise Exception(f"Error loading audio: {e}")
     
-    def extract_enhanced_features(self, y: np.ndarray, sr: int) -> Dict:
+    def build_feature_bank(self, y: np.ndarray, sr: int) -> AudioFeatureBank:
+        """为整条音轨创建共享的STFT特征库"""
+        return AudioFeatureBank(y, sr, n_fft=self.frame_length, hop_length=self.hop_length)
+    
+    def extract_enhanced_features(self, y: np.ndarray, sr: int,
+                                  bank: Optional[AudioFeatureBank] = None) -> Dict:
         """提取增强音频特征"""
-        # BPM检测
-        tempo, beats = librosa.beat.beat_track(y=y, sr=sr, hop_length=self.hop_length)
+        if bank is None:
+            bank = self.build_feature_bank(y, sr)
+        
+        # BPM检测（复用缓存的起音包络）
+        tempo, beats = bank.onset.track_beats()
         
-        # 频谱特征
-        spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
-        spectral_rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr)[0]
-        spectral_bandwidth = librosa.feature.spectral_bandwidth(y=y, sr=sr)[0]
-        mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-        rms = librosa.feature.rms(y=y)[0]
+        # 频谱特征（同一次STFT派生）
+        spectral_centroids = bank.spectral_centroid
+        spectral_rolloff = bank.spectral_rolloff
+        spectral_bandwidth = bank.spectral_bandwidth
+        mfccs = bank.mfcc
+        rms = bank.rms
         
         # 节拍点
         beat_times = librosa.frames_to_time(beats, sr=sr, hop_length=self.hop_length)
         
         # 高级特征计算
-        zero_crossing_rate = librosa.feature.zero_crossing_rate(y)[0]
-        chroma = librosa.feature.chroma_stft(y=y, sr=sr)
-        tonnetz = librosa.feature.tonnetz(y=y, sr=sr)
+        zero_crossing_rate = bank.zero_crossing_rate
+        chroma = bank.chroma
+        tonnetz = bank.tonnetz
         
         # 能量和动态特征
         energy = np.mean(rms)
@@ -53,11 +65,11 @@ class StreamlitCloudAudioAnalyzer:
         spectral_centroid_std = np.std(spectral_centroids)
         
         # 节奏特征
-        tempo_confidence = self._calculate_tempo_confidence(beats, sr)
+        tempo_confidence = self._calculate_tempo_confidence(beats, sr, bank.onset)
         
         # 情绪和风格特征
-        mood_features = self._extract_mood_features(y, sr)
-        style_features = self._extract_style_features(y, sr)
+        mood_features = self._extract_mood_features(bank)
+        style_features = self._extract_style_features(bank)
         
         return {
             'tempo': float(tempo),
@@ -79,7 +91,8 @@ class StreamlitCloudAudioAnalyzer:
             'style_features': style_features
         }
     
-    def _calculate_tempo_confidence(self, beats: np.ndarray, sr: int) -> float:
+    def _calculate_tempo_confidence(self, beats: np.ndarray, sr: int,
+                                    onset: Optional[OnsetLayer] = None) -> float:
         """计算节拍检测置信度"""
         if len(beats) < 2:
             return 0.0
@@ -92,13 +105,23 @@ class StreamlitCloudAudioAnalyzer:
         # 使用变异系数作为置信度指标
         cv = np.std(intervals) / np.mean(intervals) if np.mean(intervals) > 0 else 1.0
         confidence = max(0.0, 1.0 - cv)
+        
+        # 有起音层时，结合节拍处起音显著度和速度图在该速度上的强度
+        if onset is not None:
+            beat_times = librosa.frames_to_time(beats, sr=sr, hop_length=self.hop_length)
+            tempo = 60.0 * sr / (self.hop_length * np.mean(intervals)) if np.mean(intervals) > 0 else 0.0
+            confidence = float(np.mean([
+                confidence,
+                onset.beat_salience(beat_times),
+                onset.tempo_strength(tempo)
+            ]))
         return confidence
     
-    def _extract_mood_features(self, y: np.ndarray, sr: int) -> Dict:
+    def _extract_mood_features(self, bank: AudioFeatureBank) -> Dict:
         """提取情绪特征"""
         # 使用频谱特征推断情绪
-        spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
-        rms = librosa.feature.rms(y=y)[0]
+        spectral_centroids = bank.spectral_centroid
+        rms = bank.rms
         
         # 计算情绪指标
         brightness = np.mean(spectral_centroids)
@@ -127,12 +150,12 @@ class StreamlitCloudAudioAnalyzer:
             'energy_variation': float(energy_variation)
         }
     
-    def _extract_style_features(self, y: np.ndarray, sr: int) -> Dict:
+    def _extract_style_features(self, bank: AudioFeatureBank) -> Dict:
         """提取风格特征"""
         # 使用MFCC和频谱特征推断风格
-        mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-        spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
-        rms = librosa.feature.rms(y=y)[0]
+        mfccs = bank.mfcc
+        spectral_centroids = bank.spectral_centroid
+        rms = bank.rms
         
         # 计算风格指标
         mfcc_mean = np.mean(mfccs, axis=1)
@@ -186,32 +209,6 @@ class StreamlitCloudAudioAnalyzer:
         
         return segments
     
-    def analyze_audio_segment(self, y: np.ndarray, sr: int, start_time: float, end_time: float) -> Dict:
-        """分析音频片段特征"""
-        start_sample = int(start_time * sr)
-        end_sample = int(end_time * sr)
-        segment = y[start_sample:end_sample]
-        
-        if len(segment) == 0:
-            return {}
-        
-        # 提取片段特征
-        tempo, _ = librosa.beat.beat_track(y=segment, sr=sr)
-        spectral_centroid = librosa.feature.spectral_centroid(y=segment, sr=sr)[0]
-        rms = librosa.feature.rms(y=segment)[0]
-        mfccs = librosa.feature.mfcc(y=segment, sr=sr, n_mfcc=13)
-        
-        # 计算复杂度
-        complexity = np.std(spectral_centroid) / np.mean(spectral_centroid) if np.mean(spectral_centroid) > 0 else 0
-        
-        return {
-            'tempo': float(tempo),
-            'energy': float(np.mean(rms)),
-            'brightness': float(np.mean(spectral_centroid)),
-            'complexity': float(complexity),
-            'mfcc_mean': [float(x) for x in np.mean(mfccs, axis=1)]
-        }
-    
     def comprehensive_analysis(self, file_path: str) -> Dict:
         """综合分析音频文件"""
         print("🎵 开始综合分析音频...")
@@ -221,18 +218,24 @@ class StreamlitCloudAudioAnalyzer:
         
         # 提取增强特征
         print("📊 提取增强特征...")
-        features = self.extract_enhanced_features(y, sr)
+        bank = self.build_feature_bank(y, sr)
+        features = self.extract_enhanced_features(y, sr, bank)
         
         # 分割音频
         segments = self.segment_audio_by_beats(features['beat_times'])
         
-        # 分析每个片段
+        # 一次归约得到所有片段的帧级特征，局部速度直接来自整轨节拍网格
+        segment_stats = aggregate_segment_features(bank, segments)
+        local_tempo = estimate_local_tempo(features['beat_times'], segments,
+                                           onset_envelope=bank.onset.envelope,
+                                           sr=sr, hop_length=self.hop_length)
+        accent_strength = bank.onset.segment_accent_strength(features['beat_times'], segments)
+        features['tempo_drift'] = local_tempo['tempo_drift']
         segment_features = []
-        for segment in segments:
-            seg_features = self.analyze_audio_segment(
-                y, sr, segment['start_time'], segment['end_time']
-            )
-            segment_features.append({**segment, **seg_features})
+        for segment, stats, tempo_info, accent in zip(segments, segment_stats,
+                                                      local_tempo['segments'], accent_strength):
+            segment_features.append({**segment, **tempo_info, **stats,
+                                     'accent_strength': float(accent)})
         
         # 构建结果
         result = {
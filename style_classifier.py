@@ -0,0 +1,279 @@
+"""
+本地舞蹈风格分类器
+用分析器已经计算好的特征（BPM、频谱重心、能量、MFCC均值、色度均值）做最近质心分类，
+模型只有几个小数组，保存为 .npz。只有用标注样本拟合过的模型才能在置信度足够时直接采用、
+不再调用LLM推荐风格；手写先验构造的模型只作参考。
+
+命令行：
+    python style_classifier.py prior [输出.npz]            写出按风格先验构造的初始模型
+    python style_classifier.py fit [标签.jsonl] [输出.npz]  用记录的 (特征, 风格) 样本重新拟合
+"""
+
+import json
+import os
+import sys
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import config
+
+N_MFCC = 13
+N_CHROMA = 12
+FEATURE_NAMES = (['tempo', 'spectral_centroid', 'energy']
+                 + [f'mfcc_{i}' for i in range(N_MFCC)]
+                 + [f'chroma_{i}' for i in range(N_CHROMA)])
+
+# 先验质心：各风格典型的 (BPM, 频谱重心Hz, RMS能量)；MFCC和色度没有先验，取全局均值
+STYLE_PRIORS = {
+    "Hip-Hop": (92.0, 1900.0, 0.20),
+    "Jazz": (118.0, 2200.0, 0.14),
+    "K-pop": (124.0, 2900.0, 0.24),
+    "House": (124.0, 2400.0, 0.27),
+    "Contemporary": (78.0, 1500.0, 0.09),
+    "Breaking": (112.0, 2300.0, 0.26),
+    "Popping": (100.0, 2000.0, 0.18),
+    "Locking": (108.0, 2500.0, 0.21),
+    "Waacking": (120.0, 2700.0, 0.22),
+    "Voguing": (128.0, 2600.0, 0.25),
+}
+# 先验模型各特征的比例尺（标准化用）
+PRIOR_SCALES = {'tempo': 12.0, 'spectral_centroid': 400.0, 'energy': 0.05, 'mfcc': 20.0, 'chroma': 0.15}
+# 拟合模型的离群阈值：训练样本到所属质心距离平方的该分位数，再乘以余量
+OUTLIER_QUANTILE = 0.99
+OUTLIER_MARGIN = 1.5
+
+
+def feature_vector(bpm: float, audio_features: Dict) -> np.ndarray:
+    """
+    把分析结果转换为固定长度的特征向量
+
+    Args:
+        bpm: 整曲BPM
+        audio_features: analyze_audio_features 的结果
+
+    Returns:
+        长度为 len(FEATURE_NAMES) 的向量，缺失的特征为NaN（分类时按模型均值补齐）
+    """
+    def fixed(values, size):
+        values = list(values or [])[:size]
+        return values + [np.nan] * (size - len(values))
+
+    return np.array([float(bpm),
+                     float(audio_features.get('spectral_centroid_mean', np.nan)),
+                     float(audio_features.get('energy_mean', np.nan))]
+                    + fixed(audio_features.get('mfcc_mean'), N_MFCC)
+                    + fixed(audio_features.get('chroma_mean'), N_CHROMA), dtype=float)
+
+
+class StyleClassifier:
+    """最近质心风格分类器
+
+    特征先按 (x - mean) / scale 标准化，取与各风格质心的欧氏距离平方；
+    置信度为 softmax(-距离² / (2 * temperature)) 中最大的概率。
+    各质心取值相同的维度（如先验模型中的MFCC）只给所有距离加上同一个常数，不影响置信度。
+    softmax只看距离的差，远离所有质心的输入也可能得到很高的概率，
+    因此与最近质心的距离平方超过 max_distance 时置信度记为0。
+    """
+
+    def __init__(self, styles: Sequence[str], centroids: np.ndarray, mean: np.ndarray, scale: np.ndarray,
+                 temperature: float = 0.5, max_distance: float = np.inf, fitted: bool = False):
+        """
+        Args:
+            styles: 风格名称，与centroids的行对应
+            centroids: 标准化后的质心 (风格数, 特征数)
+            mean: 各特征的均值，同时用于补齐缺失特征
+            scale: 各特征的比例尺（inf表示该特征不参与距离）
+            temperature: softmax温度，越小置信度越集中
+            max_distance: 与最近质心距离平方的上限，超过时视为离群
+            fitted: 是否由标注样本拟合（先验模型为False）
+        """
+        self.styles = list(styles)
+        self.centroids = np.asarray(centroids, dtype=float)
+        self.mean = np.asarray(mean, dtype=float)
+        self.scale = np.asarray(scale, dtype=float)
+        self.temperature = float(temperature)
+        self.max_distance = float(max_distance)
+        self.fitted = bool(fitted)
+
+    def _standardize(self, vector: np.ndarray) -> np.ndarray:
+        vector = np.where(np.isnan(vector), self.mean, vector)
+        return (vector - self.mean) / self.scale
+
+    def distances(self, vector: np.ndarray) -> np.ndarray:
+        """与各风格质心的距离平方"""
+        return np.sum((self.centroids - self._standardize(vector)) ** 2, axis=1)
+
+    def probabilities(self, vector: np.ndarray) -> np.ndarray:
+        """各风格的概率"""
+        logits = -self.distances(vector) / (2.0 * self.temperature)
+        weights = np.exp(logits - logits.max())
+        return weights / weights.sum()
+
+    def predict(self, bpm: float, audio_features: Dict) -> Tuple[str, float]:
+        """
+        预测舞蹈风格
+
+        Returns:
+            (风格, 置信度)；离所有质心都太远时置信度为0
+        """
+        vector = feature_vector(bpm, audio_features)
+        distances = self.distances(vector)
+        best = int(np.argmin(distances))
+        if distances[best] > self.max_distance:
+            return self.styles[best], 0.0
+        return self.styles[best], float(self.probabilities(vector)[best])
+
+    @classmethod
+    def prior(cls) -> 'StyleClassifier':
+        """按 STYLE_PRIORS 构造的初始模型（尚无标注样本时使用）"""
+        styles = [style for style in config.DANCE_STYLES if style in STYLE_PRIORS]
+        raw = np.array([STYLE_PRIORS[style] for style in styles])
+        mean = np.zeros(len(FEATURE_NAMES))
+        mean[:3] = raw.mean(axis=0)
+        scale = np.array([PRIOR_SCALES['tempo'], PRIOR_SCALES['spectral_centroid'], PRIOR_SCALES['energy']]
+                         + [PRIOR_SCALES['mfcc']] * N_MFCC + [PRIOR_SCALES['chroma']] * N_CHROMA)
+        centroids = np.zeros((len(styles), len(FEATURE_NAMES)))
+        centroids[:, :3] = (raw - mean[:3]) / scale[:3]
+        return cls(styles, centroids, mean, scale)
+
+    @classmethod
+    def fit(cls, vectors: Sequence[np.ndarray], labels: Sequence[str],
+            temperature: Optional[float] = None) -> 'StyleClassifier':
+        """
+        用标注样本拟合质心
+
+        Args:
+            vectors: feature_vector 的结果
+            labels: 对应的风格
+            temperature: softmax温度，None时取标准化后的类内方差（对有变化的维度平均），使置信度近似高斯后验
+
+        Returns:
+            只包含样本中出现过的风格的分类器
+        """
+        matrix = np.vstack(vectors)
+        mean = np.nanmean(matrix, axis=0)
+        mean = np.where(np.isnan(mean), 0.0, mean)
+        filled = np.where(np.isnan(matrix), mean, matrix)
+        labels = np.asarray(labels)
+        styles = [style for style in config.DANCE_STYLES if style in set(labels)]
+        members = np.array([styles.index(label) for label in labels])
+        raw_centroids = np.vstack([filled[members == i].mean(axis=0) for i in range(len(styles))])
+        # 按类内标准差标准化：距离以“偏离本风格典型范围多少”计，而不是以风格之间的差距计
+        within = np.sqrt(np.mean((filled - raw_centroids[members]) ** 2, axis=0))
+        std = filled.std(axis=0)
+        varying = std >= 1e-6
+        # 样本中没有变化的特征不携带信息，不参与距离；每个风格只有一个样本时退回总体标准差
+        scale = np.where(varying, np.where(within >= 1e-6, within, std), np.inf)
+        standardized = (filled - mean) / scale
+        centroids = (raw_centroids - mean) / scale
+        residuals = standardized - centroids[members]
+        if temperature is None:
+            temperature = max(float(np.mean(residuals[:, varying] ** 2)) if varying.any() else 1.0, 1e-3)
+        own_distances = np.sum(residuals ** 2, axis=1)
+        # 至少允许一个典型样本的期望距离（温度 × 有变化的维数），避免样本很少时阈值过紧
+        max_distance = OUTLIER_MARGIN * max(float(np.quantile(own_distances, OUTLIER_QUANTILE)),
+                                            temperature * max(int(varying.sum()), 1))
+        return cls(styles, centroids, mean, scale, temperature, max_distance, fitted=True)
+
+    def save(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.savez(path, styles=np.array(self.styles), centroids=self.centroids, mean=self.mean, scale=self.scale,
+                 temperature=np.array(self.temperature), max_distance=np.array(self.max_distance),
+                 fitted=np.array(self.fitted))
+
+    @classmethod
+    def load(cls, path: str) -> 'StyleClassifier':
+        with np.load(path) as data:
+            # 没有 fitted 字段的旧模型文件按未拟合处理
+            return cls([str(style) for style in data['styles']], data['centroids'], data['mean'], data['scale'],
+                       float(data['temperature']),
+                       float(data['max_distance']) if 'max_distance' in data else np.inf,
+                       bool(data['fitted']) if 'fitted' in data else False)
+
+
+def record_label(bpm: float, audio_features: Dict, style: str, path: Optional[str] = None) -> None:
+    """
+    记录一个 (特征, 风格) 样本（LLM给出的风格），供之后用 fit 重新拟合
+
+    Args:
+        path: JSONL文件路径，默认 config.STYLE_LABELS_PATH；为空时不记录
+    """
+    path = path or config.STYLE_LABELS_PATH
+    if not path or style not in config.DANCE_STYLES:
+        return
+    vector = [None if np.isnan(x) else float(x) for x in feature_vector(bpm, audio_features)]
+    try:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'vector': vector, 'style': style}, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"⚠️ 写入风格样本失败: {e}")
+
+
+def load_labels(path: str) -> Tuple[List[np.ndarray], List[str]]:
+    """读取 record_label 写入的样本"""
+    vectors, labels = [], []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                vector = np.array([np.nan if x is None else x for x in entry['vector']], dtype=float)
+            except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                continue
+            if len(vector) == len(FEATURE_NAMES) and entry.get('style') in config.DANCE_STYLES:
+                vectors.append(vector)
+                labels.append(entry['style'])
+    return vectors, labels
+
+
+_default_classifier: Optional[StyleClassifier] = None
+_default_classifier_lock = threading.Lock()
+
+
+def get_default_classifier() -> Optional[StyleClassifier]:
+    """进程级分类器：优先加载 config.STYLE_CLASSIFIER_PATH，文件不存在时使用先验模型；禁用时返回None"""
+    global _default_classifier
+    if not config.STYLE_CLASSIFIER_ENABLED:
+        return None
+    with _default_classifier_lock:
+        if _default_classifier is None:
+            path = config.STYLE_CLASSIFIER_PATH
+            if path and os.path.exists(path):
+                try:
+                    _default_classifier = StyleClassifier.load(path)
+                except (OSError, KeyError, ValueError) as e:
+                    print(f"⚠️ 加载风格分类器失败，使用先验模型: {e}")
+            if _default_classifier is None:
+                _default_classifier = StyleClassifier.prior()
+        return _default_classifier
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in ('prior', 'fit'):
+        print(__doc__)
+        return 1
+    if argv[0] == 'prior':
+        output = argv[1] if len(argv) > 1 else config.STYLE_CLASSIFIER_PATH
+        StyleClassifier.prior().save(output)
+        print(f"✅ 先验模型已保存到 {output}")
+        return 0
+    labels_path = argv[1] if len(argv) > 1 else config.STYLE_LABELS_PATH
+    output = argv[2] if len(argv) > 2 else config.STYLE_CLASSIFIER_PATH
+    vectors, labels = load_labels(labels_path)
+    if not vectors:
+        print(f"❌ {labels_path} 中没有可用样本")
+        return 1
+    StyleClassifier.fit(vectors, labels).save(output)
+    print(f"✅ 用{len(vectors)}个样本拟合了{len(set(labels))}个风格，模型已保存到 {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+动作词库索引测试脚本
+验证ID驻留、集合排除、跨风格补充和别名表加权抽样
+"""
+
+import sys
+import os
+import random
+from collections import Counter
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from action_database import ACTION_INDEX, ActionIndex, DANCE_ACTION_DATABASE, get_action_candidates
+
+def test_interned_ids():
+    """测试动作名称驻留为共享ID"""
+    print("🔢 测试ID驻留...")
+
+    # 'pump' 同时出现在Hip-Hop的两个类别中，也出现在Breaking中
+    pump = ACTION_INDEX.ids['pump']
+    assert pump in ACTION_INDEX.category_ids[('Hip-Hop', 'advanced_moves')]
+    assert pump in ACTION_INDEX.category_ids[('Hip-Hop', 'grooves')]
+    assert pump in ACTION_INDEX.category_ids[('Breaking', 'advanced_moves')]
+    assert ACTION_INDEX.names[pump] == 'pump'
+
+    hip_hop = ACTION_INDEX.style_moves('Hip-Hop')
+    assert len(hip_hop) == len(set(hip_hop)) and hip_hop[0] == 'two-step'
+    assert ACTION_INDEX.exclusion(['pump', '不存在的动作']) == frozenset([pump])
+
+    print("✅ ID驻留正确")
+
+def test_candidates_respect_exclusion():
+    """测试候选动作不重复、排除生效、不足时从其他风格补充"""
+    print("🚫 测试排除和补充...")
+
+    random.seed(1)
+    avoid = ACTION_INDEX.style_moves('House')[:5]
+    for _ in range(50):
+        candidates = get_action_candidates('House', 15, avoid)
+        assert len(candidates) == 15 == len(set(candidates))
+        assert not set(candidates) & set(avoid)
+        assert set(candidates) <= set(ACTION_INDEX.style_moves('House'))
+
+    # 本风格几乎全部被排除时，剩余动作全部入选并从其他风格补足
+    house = ACTION_INDEX.style_moves('House')
+    remaining = house[-3:]
+    candidates = get_action_candidates('House', 10, frozenset(ACTION_INDEX.exclusion(house[:-3])))
+    assert len(candidates) == 10 == len(set(candidates))
+    assert set(remaining) <= set(candidates)
+
+    assert len(get_action_candidates('未知风格', 5)) == 5
+
+    print("✅ 排除和补充正确")
+
+def test_weighted_sampling():
+    """测试别名表按类别权重抽样"""
+    print("⚖️ 测试加权抽样...")
+
+    database = {'Test': {'heavy': ['a'], 'light': ['b', 'c', 'd']}}
+    index = ActionIndex(database, {'heavy': 9.0})
+    random.seed(0)
+    counts = Counter(index.candidates('Test', 1)[0] for _ in range(6000))
+    # a 的权重是其他动作的9倍：9/12 = 0.75
+    assert 0.70 < counts['a'] / 6000 < 0.80
+
+    # 加权的无放回抽样同样不重复且遵守排除
+    for _ in range(100):
+        picked = index.candidates('Test', 2, ['b'])
+        assert len(picked) == 2 and 'b' not in picked
+
+    assert set(ActionIndex(DANCE_ACTION_DATABASE).style_moves('Jazz')) == set(ACTION_INDEX.style_moves('Jazz'))
+
+    print("✅ 加权抽样正确")
+
+if __name__ == "__main__":
+    test_interned_ids()
+    test_candidates_respect_exclusion()
+    test_weighted_sampling()
+    print("\n🎉 动作词库索引测试完成！")
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+音频分析缓存测试脚本
+验证LRU淘汰顺序、总大小上限、损坏/残缺条目、崩溃残留的临时目录和同一键的并发写入
+"""
+
+import sys
+import os
+import tempfile
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from analysis_cache import AnalysisCache, RESULT_FILE, _dir_size
+
+def create_test_result(size=1000):
+    """创建带数组的分析结果"""
+    return {'tempo': 120.0, 'style': 'hiphop', 'onset_envelope': np.arange(size, dtype=np.float64)}
+
+def _backdate(path, seconds):
+    stamp = time.time() - seconds
+    os.utime(path, (stamp, stamp))
+
+def test_lru_eviction_order():
+    """测试超出上限时先淘汰最久未访问的条目"""
+    print("🗂️ 测试LRU淘汰顺序...")
+
+    cache = AnalysisCache(tempfile.mkdtemp())
+    for age, key in enumerate(['c', 'b', 'a']):
+        cache.put(key, create_test_result())
+        _backdate(cache._entry_path(key), 100 - age * 10)
+    entry_size = _dir_size(cache._entry_path('a'))
+
+    # 读取 c 更新其访问时间，之后 b 成为最久未访问的条目
+    assert cache.get('c')['tempo'] == 120.0
+    cache.max_bytes = entry_size * 3
+    cache.put('d', create_test_result())
+
+    assert cache.get('b') is None
+    for key in ('a', 'c', 'd'):
+        assert cache.get(key) is not None, key
+
+    print("✅ LRU淘汰顺序正确")
+
+def test_size_bound():
+    """测试写入后总大小不超过上限"""
+    print("📏 测试总大小上限...")
+
+    cache = AnalysisCache(tempfile.mkdtemp())
+    cache.put('probe', create_test_result())
+    entry_size = _dir_size(cache._entry_path('probe'))
+    cache.clear()
+
+    cache.max_bytes = int(entry_size * 2.5)
+    for index in range(6):
+        cache.put(f'key-{index}', create_test_result())
+        assert _dir_size(cache.cache_dir) <= cache.max_bytes + os.path.getsize(cache._lock_path)
+    remaining = [name for name in os.listdir(cache.cache_dir) if not name.startswith('.')]
+    assert sorted(remaining) == ['key-4', 'key-5']
+
+    print("✅ 总大小不超过上限")
+
+def test_corrupted_and_partial_entries():
+    """测试损坏或残缺的条目返回None并被删除，之后可以重新写入"""
+    print("🩹 测试损坏和残缺条目...")
+
+    cache = AnalysisCache(tempfile.mkdtemp())
+    cache.put('corrupted', create_test_result())
+    with open(os.path.join(cache._entry_path('corrupted'), RESULT_FILE), 'w') as f:
+        f.write('{"tempo": 12')
+    assert cache.get('corrupted') is None
+    assert not os.path.exists(cache._entry_path('corrupted'))
+
+    os.makedirs(cache._entry_path('partial'))
+    assert cache.get('partial') is None
+    assert not os.path.exists(cache._entry_path('partial'))
+
+    for key in ('corrupted', 'partial'):
+        cache.put(key, create_test_result())
+        assert np.array_equal(cache.get(key)['onset_envelope'], create_test_result()['onset_envelope'])
+    assert cache.get('missing') is None
+
+    print("✅ 损坏和残缺条目被删除")
+
+def test_stale_temp_directories_reaped():
+    """测试崩溃残留的临时目录计入总大小，超过宽限时间后被清理"""
+    print("🧹 测试临时目录清理...")
+
+    cache = AnalysisCache(tempfile.mkdtemp(), stale_seconds=60)
+    fresh_tmp = tempfile.mkdtemp(prefix='.tmp-', dir=cache.cache_dir)
+    stale_tmp = tempfile.mkdtemp(prefix='.tmp-', dir=cache.cache_dir)
+    leftover = os.path.join(cache.cache_dir, '.evict-old-1')
+    for path in (fresh_tmp, stale_tmp, leftover):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'data.npy'), np.zeros(1000))
+    _backdate(stale_tmp, 120)
+
+    cache.put('key', create_test_result())
+    entry_size = _dir_size(cache._entry_path('key'))
+    assert os.path.exists(fresh_tmp)
+    assert not os.path.exists(stale_tmp)
+    assert not os.path.exists(leftover)
+
+    # 仍在宽限时间内的临时目录占用空间，会挤掉条目
+    cache.max_bytes = entry_size + _dir_size(fresh_tmp) // 2
+    cache.put('other', create_test_result())
+    assert cache.get('key') is None
+
+    print("✅ 临时目录清理正确")
+
+def test_concurrent_put_same_key():
+    """测试多个线程同时写入同一个键只留下一个完整条目"""
+    print("🧵 测试同一键的并发写入...")
+
+    cache = AnalysisCache(tempfile.mkdtemp())
+    result = create_test_result(50000)
+    barrier = threading.Barrier(8)
+    errors = []
+
+    def writer():
+        try:
+            barrier.wait()
+            cache.put('shared', result)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors, errors
+    assert np.array_equal(cache.get('shared')['onset_envelope'], result['onset_envelope'])
+    assert sorted(name for name in os.listdir(cache.cache_dir) if name != '.lock') == ['shared']
+
+    print("✅ 并发写入只留下一个条目")
+
+if __name__ == "__main__":
+    test_lru_eviction_order()
+    test_size_bound()
+    test_corrupted_and_partial_entries()
+    test_stale_temp_directories_reaped()
+    test_concurrent_put_same_key()
+    print("\n🎉 分析缓存测试完成！")
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+分析后端调度器测试脚本
+验证并发执行、单个后端超时和失败时的部分结果收集、共享进程池复用和导入记录回传
+"""
+
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+import capabilities
+from backend_scheduler import BackendScheduler
+from decoded_audio import DecodedAudio, MADMOM_SAMPLE_RATE
+
+def fast_backend(value):
+    """模拟正常返回的后端"""
+    time.sleep(0.2)
+    return {'bpm': value}
+
+def slow_backend():
+    """模拟卡住的后端"""
+    time.sleep(30)
+    return {'bpm': 0}
+
+def failing_backend():
+    """模拟抛出异常的后端"""
+    raise RuntimeError("backend crashed")
+
+def worker_pid():
+    """返回工作进程的PID"""
+    time.sleep(0.1)
+    return os.getpid()
+
+def fake_backend_import():
+    """模拟在工作进程中导入后端"""
+    capabilities._import_seconds['madmom'] = 1.5
+    return {}
+
+def test_parallel_partial_results():
+    """测试超时和失败的后端不影响其他后端的结果"""
+    print("⚙️ 测试并发后端调度...")
+
+    scheduler = BackendScheduler(parallel=True, default_timeout=5.0)
+    scheduler.add('a', fast_backend, 120.0, default={})
+    scheduler.add('b', fast_backend, 124.0, default={})
+    scheduler.add('slow', slow_backend, timeout=1.0, default={'fallback': True})
+    scheduler.add('broken', failing_backend, default={})
+
+    started = time.time()
+    results = scheduler.collect()
+    elapsed = time.time() - started
+
+    assert results['a'] == {'bpm': 120.0}
+    assert results['b'] == {'bpm': 124.0}
+    assert results['slow'] == {'fallback': True}
+    assert results['broken'] == {}
+    assert scheduler.status['slow']['state'] == 'timeout'
+    assert scheduler.status['broken']['state'] == 'failed'
+    # 总耗时受最慢后端的超时限制，而不是各后端耗时之和
+    assert elapsed < 5.0
+
+    print(f"✅ 部分结果收集正确，总耗时 {elapsed:.2f} 秒")
+
+def test_sequential_fallback():
+    """测试关闭并行时顺序执行"""
+    print("⚙️ 测试顺序执行...")
+
+    scheduler = BackendScheduler(parallel=False)
+    scheduler.add('a', fast_backend, 100.0, default={})
+    scheduler.add('broken', failing_backend, default={'ok': False})
+    results = scheduler.collect()
+
+    assert results == {'a': {'bpm': 100.0}, 'broken': {'ok': False}}
+    print("✅ 顺序执行结果正确")
+
+def test_shared_pool_and_import_records():
+    """测试进程池在多次分析之间复用，工作进程的导入记录汇总到主进程"""
+    print("♻️ 测试共享进程池...")
+
+    pids = set()
+    for _ in range(2):
+        scheduler = BackendScheduler(parallel=True, default_timeout=5.0)
+        scheduler.add('a', worker_pid, default=None)
+        scheduler.add('b', worker_pid, default=None)
+        pids.update(scheduler.collect().values())
+    assert os.getpid() not in pids
+    # 两次分析共用同一组（两个）工作进程
+    assert len(pids) <= 2
+
+    scheduler = BackendScheduler(parallel=True, default_timeout=5.0)
+    scheduler.add('madmom', fake_backend_import, default=None)
+    scheduler.collect()
+    try:
+        report = capabilities.report()['madmom']
+        assert report['loaded_in_worker'] and report['import_seconds'] == 1.5
+        assert not report['loaded']
+    finally:
+        capabilities._worker_import_seconds.clear()
+
+    print("✅ 共享进程池正确")
+
+def test_backends_receive_only_their_buffer():
+    """测试登记到进程池的是各后端需要的缓冲区，而不是整个DecodedAudio"""
+    print("📦 测试后端参数...")
+
+    from enhanced_audio_analyzer import EnhancedAudioAnalyzer
+
+    original = dict(capabilities._probed)
+    capabilities._probed.update({'madmom': True, 'essentia': True, 'musicnn': False})
+    try:
+        with DecodedAudio(np.zeros(22050, dtype=np.float32), 22050) as audio:
+            scheduler = EnhancedAudioAnalyzer().schedule_backends(audio)
+            madmom_args = scheduler.tasks['madmom']['args']
+            essentia_args = scheduler.tasks['essentia']['args']
+    finally:
+        capabilities._probed.clear()
+        capabilities._probed.update(original)
+
+    assert len(madmom_args) == 1 and isinstance(madmom_args[0], np.ndarray)
+    assert len(madmom_args[0]) == MADMOM_SAMPLE_RATE
+    assert len(essentia_args) == 1 and len(essentia_args[0]) == 22050
+
+    print("✅ 后端参数正确")
+
+if __name__ == "__main__":
+    test_parallel_partial_results()
+    test_sequential_fallback()
+    test_shared_pool_and_import_records()
+    test_backends_receive_only_their_buffer()
+    print("\n🎉 后端调度器测试完成！")
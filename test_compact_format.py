@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+紧凑输出格式测试脚本
+验证编码表、解码为完整schema、无效编码和流式解析数组元素
+"""
+
+import sys
+import os
+import json
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import jsonschema
+
+from compact_format import (codebook_text, decode_choreography, decode_segment, encode_segment,
+                            format_candidates, move_table)
+from incremental_json import SegmentStreamParser
+
+SEGMENT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "idx": {"type": "integer"},
+        "time": {"type": "string"},
+        "accent": {"type": "string", "enum": ["strong", "medium", "weak"]},
+        "level": {"type": "string", "enum": ["high", "mid", "low", "floor"]},
+        "plane": {"type": "string", "enum": ["frontal", "sagittal", "transverse"]},
+        "motifs": {"type": "array", "items": {"type": "string"}},
+        "moves": {"type": "array", "items": {"type": "string"}},
+        "transition": {"type": "string"}
+    },
+    "required": ["idx", "time", "accent", "level", "plane", "motifs", "moves", "transition"]
+}
+
+def test_move_ids_and_round_trip():
+    """测试动作ID表稳定且编码解码互逆"""
+    print("🔢 测试动作ID和往返编码...")
+
+    table = move_table('House')
+    assert table[:3] == ['jack', 'skate', 'lofting'] and len(table) == len(set(table))
+    assert move_table('Unknown') == move_table('Hip-Hop')
+    assert format_candidates('House', ['skate', '不存在的动作']) == '1=skate'
+
+    segment = {'idx': 3, 'time': '12.0s-16.0s', 'accent': 'weak', 'level': 'floor', 'plane': 'sagittal',
+               'motifs': ['groove', 'melt'], 'moves': ['jack', 'vogue', 'two-step'], 'transition': 'level-drop'}
+    row = encode_segment(segment, 'House')
+    assert all(isinstance(code, (int, list)) for code in row)
+    assert decode_segment(row, 'House', '12.0s-16.0s') == segment
+
+    print("✅ 动作ID和往返编码正确")
+
+def test_decode_response():
+    """测试完整响应解码和无效编码"""
+    print("📦 测试响应解码...")
+
+    example = json.loads(codebook_text().rsplit('示例：\n', 1)[1])
+    data = decode_choreography(example, 'Hip-Hop', ['0.0s-4.0s', '4.0s-8.0s'])
+    assert data['global_cues'] == {'energy_level': 'high', 'mood': 'aggressive and confident',
+                                   'key_characteristics': ['bounce', 'isolation']}
+    for segment in data['segments']:
+        jsonschema.validate(segment, SEGMENT_SCHEMA)
+    assert data['segments'][1]['time'] == '4.0s-8.0s'
+
+    # JSON中的 true/false 不是编码：布尔动态被跳过，布尔片段编号被拒绝
+    decoded = decode_segment([0, 0, 1, 0, [True, 2, False], [True, 1], 0], 'Hip-Hop', '')
+    assert decoded['motifs'] == [decode_segment([0, 0, 1, 0, [2], [1], 0], 'Hip-Hop', '')['motifs'][0]]
+    assert decoded['moves'] == [move_table('Hip-Hop')[1]]
+
+    for bad_row in ([0, 5, 1, 0, [], [1], 0], [0, 0, 1, 0, [], [99999], 0], [0, 0, 1], {'idx': 0},
+                    [True, 0, 1, 0, [], [1], 0], [0, False, 1, 0, [], [1], 0]):
+        try:
+            decode_segment(bad_row, 'Hip-Hop', '')
+            assert False, f"应当拒绝 {bad_row}"
+        except ValueError:
+            pass
+
+    print("✅ 响应解码正确")
+
+def test_stream_parser_emits_arrays():
+    """测试流式解析器逐个产出数组形式的片段"""
+    print("📡 测试流式解析数组片段...")
+
+    received = []
+    parser = SegmentStreamParser(lambda index, item: received.append((index, item)))
+    text = '{"g":[1,"calm","flow"],"segments":[[0,1,2,0,[1],[3,4],0],[1,0,0,2,[],[5],1]]}'
+    for i in range(0, len(text), 7):
+        parser.feed(text[i:i + 7])
+        if i + 7 <= text.index('],[1,'):
+            assert not received
+    assert received == [(0, [0, 1, 2, 0, [1], [3, 4], 0]), (1, [1, 0, 0, 2, [], [5], 1])]
+
+    print("✅ 流式解析数组片段正确")
+
+if __name__ == "__main__":
+    test_move_ids_and_round_trip()
+    test_decode_response()
+    test_stream_parser_emits_arrays()
+    print("\n🎉 紧凑输出格式测试完成！")
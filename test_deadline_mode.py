@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+截止时间模式测试脚本
+验证LLM结果在截止前到达时替换备用片段、超时时按时返回备用片段
+"""
+
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault('OPENAI_API_KEY', 'mock')
+
+import config
+from mock_openai_server import LatencyModel, MockChatBackend, MockOpenAIServer
+
+def create_segments(num_segments=6):
+    """创建测试片段"""
+    return [{'start_time': i * 4.0, 'end_time': (i + 1) * 4.0, 'beat_count': 8, 'tempo': 120.0}
+            for i in range(num_segments)]
+
+def run_with_server(latency, func):
+    """在模拟服务上运行"""
+    original = config.OPENAI_BASE_URL
+    try:
+        with MockOpenAIServer(MockChatBackend(LatencyModel.parse(latency))) as server:
+            config.OPENAI_BASE_URL = server.base_url
+            return func()
+    finally:
+        config.OPENAI_BASE_URL = original
+
+def test_structured_deadline():
+    """测试结构化编舞的截止时间模式"""
+    print("⏱️ 测试结构化编舞截止时间...")
+
+    from enhanced_llm_choreographer import EnhancedLLMChoreographer
+
+    def generate(deadline):
+        choreographer = EnhancedLLMChoreographer()
+        received = []
+        started = time.time()
+        result = choreographer.generate_enhanced_choreography(
+            {'bpm': 120.0}, create_segments(), 'Hip-Hop', cache_mode='off', deadline=deadline,
+            on_segment=lambda index, segment: received.append(index))
+        assert sorted(received) == list(range(6))
+        assert choreographer._validate_json_schema(result)
+        return result, time.time() - started
+
+    result, _ = run_with_server('fixed:0.05', lambda: generate(10.0))
+    assert result['deadline_metadata']['upgraded_segments'] == list(range(6))
+    assert result['global_cues']['mood'].startswith('mock')
+
+    result, elapsed = run_with_server('fixed:2', lambda: generate(0.3))
+    assert result['deadline_metadata']['upgraded_segments'] == []
+    assert result['deadline_metadata']['fallback_segments'] == list(range(6))
+    assert elapsed < 1.5
+
+    print("✅ 结构化编舞截止时间正确")
+
+def test_segment_deadline():
+    """测试逐片段编舞的截止时间模式"""
+    print("⏱️ 测试逐片段编舞截止时间...")
+
+    from llm_choreographer import LLMChoreographer
+
+    def generate():
+        choreographer = LLMChoreographer()
+        choreographer.cache_mode = 'off'
+        started = time.time()
+        result = choreographer.generate_full_choreography(create_segments(), 120.0, 'Hip-Hop', deadline=0.3)
+        return result, time.time() - started
+
+    result, elapsed = run_with_server('fixed:2', generate)
+    assert elapsed < 1.5
+    assert result['deadline_metadata']['upgraded_segments'] == []
+    assert all(segment['dance_elements'] for segment in result['segments'])
+
+    print("✅ 逐片段编舞截止时间正确")
+
+def test_segment_fallbacks_not_counted_as_upgrades():
+    """测试熔断时片段方法返回的默认结构不计入LLM升级"""
+    print("🚫 测试熔断时的升级统计...")
+
+    from llm_choreographer import LLMChoreographer
+
+    def generate():
+        choreographer = LLMChoreographer()
+        choreographer.cache_mode = 'off'
+        choreographer.breaker.opened_at = time.monotonic()
+        try:
+            return choreographer.generate_full_choreography(create_segments(), 120.0, 'Hip-Hop', deadline=5.0)
+        finally:
+            choreographer.breaker.record_success()
+
+    result = run_with_server('fixed:0.01', generate)
+    assert result['deadline_metadata']['upgraded_segments'] == []
+    assert result['deadline_metadata']['fallback_segments'] == list(range(6))
+    assert all(segment['dance_elements'] for segment in result['segments'])
+
+    print("✅ 熔断时的升级统计正确")
+
+if __name__ == "__main__":
+    test_structured_deadline()
+    test_segment_deadline()
+    test_segment_fallbacks_not_counted_as_upgrades()
+    print("\n🎉 截止时间模式测试完成！")
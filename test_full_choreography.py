@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+逐片段编舞并发测试脚本
+验证乱序完成时结果仍按片段顺序存放、单个片段失败只影响该片段，以及每个片段只回调一次
+"""
+
+import sys
+import os
+import json
+import re
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault('OPENAI_API_KEY', 'mock')
+
+import config
+from mock_openai_server import MockChatBackend, MockOpenAIServer
+
+NUM_SEGMENTS = 6
+FAILING_SEGMENT = 2
+
+class ReversedOrderBackend(MockChatBackend):
+    """片段请求按局部速度倒序完成，并在响应中写回局部速度以便核对片段位置"""
+
+    def build_reply(self, messages):
+        prompt = "\n".join(m.get('content', '') for m in messages if m.get('role') != 'system')
+        match = re.search(r'本段局部速度:\s*([\d.]+)', prompt)
+        if match is None:
+            return super().build_reply(messages)
+        tempo = float(match.group(1))
+        # 越靠前的片段越晚完成
+        time.sleep((NUM_SEGMENTS - 1 - (tempo - 120.0)) * 0.1)
+        data = json.loads(super().build_reply(messages))
+        data['rhythm_analysis'] = f"局部速度 {tempo:.1f}"
+        return json.dumps(data, ensure_ascii=False)
+
+def create_segments():
+    """创建局部速度各不相同的片段，其中一个缺少 beat_count 会在片段方法中抛出异常"""
+    segments = [{'start_time': i * 4.0, 'end_time': (i + 1) * 4.0, 'beat_count': 8, 'tempo': 120.0 + i}
+                for i in range(NUM_SEGMENTS)]
+    del segments[FAILING_SEGMENT]['beat_count']
+    return segments
+
+def test_concurrency_contract():
+    """测试乱序完成、单片段失败和 on_segment 回调"""
+    print("🔀 测试逐片段编舞的并发约定...")
+
+    from llm_choreographer import LLMChoreographer
+
+    original = config.OPENAI_BASE_URL
+    try:
+        with MockOpenAIServer(ReversedOrderBackend()) as server:
+            config.OPENAI_BASE_URL = server.base_url
+            choreographer = LLMChoreographer()
+            received = []
+            result = choreographer.generate_full_choreography(
+                create_segments(), 120.0, 'Hip-Hop', cache_mode='off', deadline=10.0,
+                on_segment=lambda index, segment: received.append((index, segment)))
+    finally:
+        config.OPENAI_BASE_URL = original
+
+    succeeded = [i for i in range(NUM_SEGMENTS) if i != FAILING_SEGMENT]
+
+    # 每个片段只回调一次，回调按完成先后（与片段顺序相反），回调内容就是最终结果
+    order = [index for index, _ in received]
+    assert sorted(order) == list(range(NUM_SEGMENTS))
+    assert order == [FAILING_SEGMENT] + succeeded[::-1]
+    for index, segment in received:
+        assert segment is result['segments'][index]
+
+    # 结果按片段顺序存放
+    for i in succeeded:
+        assert result['segments'][i]['rhythm_analysis'] == f"局部速度 {120.0 + i:.1f}"
+
+    # 失败的片段使用默认结构，不影响其他片段
+    assert result['segments'][FAILING_SEGMENT] == choreographer._fallback_segment_choreography(120.0)
+    assert result['deadline_metadata']['upgraded_segments'] == succeeded
+    assert result['deadline_metadata']['fallback_segments'] == [FAILING_SEGMENT]
+    assert result['summary'].startswith('整体风格')
+
+    print("✅ 逐片段编舞并发约定正确")
+
+if __name__ == "__main__":
+    test_concurrency_contract()
+    print("\n🎉 逐片段编舞并发测试完成！")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+增量JSON解析器测试脚本
+验证任意切分的流式文本、字符串内的括号、截断响应和重试重置
+"""
+
+import sys
+import os
+import json
+import random
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from incremental_json import SegmentStreamParser
+
+def create_test_response(num_segments=4):
+    """创建带代码块标记的测试响应"""
+    data = {
+        "style": "Hip-Hop",
+        "global_cues": {"energy_level": "high", "mood": "括号 } ] 和 \"引号\"", "key_characteristics": ["bounce"]},
+        "segments": [
+            {"idx": i, "time": f"{i * 4}s", "moves": ["two-step", "chest-pop}"], "extra": {"nested": [1, {"k": "]"}]}}
+            for i in range(num_segments)
+        ],
+        "notes": [{"idx": 99}]
+    }
+    return data, "```json\n" + json.dumps(data, ensure_ascii=False, indent=2) + "\n```"
+
+def test_chunked_stream():
+    """测试任意切分的文本逐个产出片段"""
+    print("🧩 测试流式切分...")
+
+    data, text = create_test_response()
+    for seed in range(5):
+        random.seed(seed)
+        received = []
+        parser = SegmentStreamParser(lambda index, item: received.append((index, item)))
+        position = 0
+        while position < len(text):
+            size = random.randint(1, 9)
+            parser.feed(text[position:position + size])
+            position += size
+        assert [index for index, _ in received] == [0, 1, 2, 3]
+        assert [item for _, item in received] == data['segments']
+        assert parser.text == text
+
+    print("✅ 流式切分正确")
+
+def test_truncated_response():
+    """测试截断的响应只产出已闭合的片段"""
+    print("✂️ 测试截断响应...")
+
+    _, text = create_test_response()
+    cut = text.index('"idx": 2')
+    received = []
+    parser = SegmentStreamParser(lambda index, item: received.append(item['idx']))
+    parser.feed(text[:cut])
+    assert received == [0, 1]
+
+    print("✅ 截断响应正确")
+
+def test_reset():
+    """测试重试时重置解析器"""
+    print("🔁 测试重置...")
+
+    _, text = create_test_response(2)
+    received = []
+    parser = SegmentStreamParser(lambda index, item: received.append(index))
+    parser.feed(text[:text.index('"idx": 1')])
+    parser.reset()
+    parser.feed(text)
+    assert received == [0, 0, 1]
+    assert parser.text == text
+
+    print("✅ 重置正确")
+
+if __name__ == "__main__":
+    test_chunked_stream()
+    test_truncated_response()
+    test_reset()
+    print("\n🎉 增量JSON解析器测试完成！")
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+多关键词匹配器测试脚本
+验证与逐个子串判断的结果一致、重叠关键词和同义词替换
+"""
+
+import sys
+import os
+import random
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from action_database import ACTION_INDEX, MOVE_KEYWORDS, SYNONYMS, get_synonym_replacement, replace_synonyms
+from keyword_matcher import KeywordMatcher, normalize
+
+def test_matches_naive_substring_scan():
+    """测试结果与 any(normalize(keyword) in normalize(text)) 一致"""
+    print("🔍 测试与逐个子串判断一致...")
+
+    matcher = KeywordMatcher(MOVE_KEYWORDS)
+    texts = ACTION_INDEX.names + ['Headspin-Jump', 'AIR-FLARE', 'quick_run', 'full_turn', 'Air_Step', '', 'spiral']
+    for text, labels in zip(texts, matcher.classify(texts)):
+        expected = {label for label, keywords in MOVE_KEYWORDS.items()
+                    if any(normalize(keyword) in normalize(text) for keyword in keywords)}
+        assert labels == expected, (text, labels, expected)
+
+    # 下划线与连字符等同：LLM输出的两种写法都能命中
+    for transition in ('full-turn', 'full_turn', 'level-drop', 'travel_diagonal'):
+        assert 'complex_transition' in matcher.classify([transition])[0], transition
+    assert matcher.classify(['air-step', 'AIR_STEP']) == [frozenset({'air_transition'})] * 2
+    assert KeywordMatcher({'a': ['x_y']}).matches(['X-Y']) == [frozenset({'x-y'})]
+
+    # 重叠和互为前缀的关键词都能找到
+    overlapping = KeywordMatcher({'short': ['sp', 'in'], 'long': ['spin', 'headspin']})
+    assert overlapping.matches(['headspin']) == [frozenset({'sp', 'in', 'spin', 'headspin'})]
+    assert KeywordMatcher({}).classify(['anything']) == [frozenset()]
+
+    print("✅ 匹配结果一致")
+
+def test_synonym_replacement():
+    """测试同义词替换与原有规则一致"""
+    print("🔄 测试同义词替换...")
+
+    random.seed(3)
+    replaced = replace_synonyms(['Body-Wave', 'freeze-spin', 'step-touch'])
+    assert replaced[0].startswith('body-') and replaced[0][5:] in SYNONYMS['wave']
+    # 按SYNONYMS的顺序取第一个词根：freeze 在 spin 之前
+    assert replaced[1].endswith('-spin') and replaced[1][:-5] in SYNONYMS['freeze']
+    assert replaced[2] == 'step-touch'
+    assert get_synonym_replacement('Step') == 'Step'
+
+    print("✅ 同义词替换正确")
+
+if __name__ == "__main__":
+    test_matches_naive_substring_scan()
+    test_synonym_replacement()
+    print("\n🎉 多关键词匹配器测试完成！")
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+LLM响应缓存测试脚本
+验证键规范化、回放/重新采样模式、TTL过期、大小淘汰和生成器转交缓存模式
+"""
+
+import sys
+import os
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import soundfile as sf
+
+import config
+from choreography_generator import ChoreographyGenerator
+from audio_processor import AudioProcessor
+from llm_cache import LLMResponseCache, cached_completion
+from llm_telemetry import start_generation
+
+def create_test_cache(**kwargs):
+    """创建临时缓存"""
+    return LLMResponseCache(os.path.join(tempfile.mkdtemp(), 'llm.sqlite3'), **kwargs)
+
+def test_key_normalization():
+    """测试仅空白不同的消息得到相同的键"""
+    print("🔑 测试缓存键规范化...")
+
+    a = [{"role": "user", "content": "BPM: 120\r\n能量: 高  \n\n\n\n请返回JSON"}]
+    b = [{"role": "user", "content": "BPM: 120\n能量: 高\n\n请返回JSON\n"}]
+    key_a = LLMResponseCache.make_key("gpt-3.5-turbo", a, temperature=0.8, max_tokens=800)
+    key_b = LLMResponseCache.make_key("gpt-3.5-turbo", b, temperature=0.8, max_tokens=800)
+    assert key_a == key_b
+    assert key_a != LLMResponseCache.make_key("gpt-3.5-turbo", a, temperature=0.9, max_tokens=800)
+    assert key_a != LLMResponseCache.make_key("gpt-4o-mini", a, temperature=0.8, max_tokens=800)
+
+    print("✅ 缓存键规范化正确")
+
+def test_replay_and_fresh_modes():
+    """测试回放和重新采样模式"""
+    print("🔁 测试缓存模式...")
+
+    cache = create_test_cache()
+    messages = [{"role": "user", "content": "生成编舞"}]
+    calls = []
+
+    def call():
+        calls.append(1)
+        return f"response-{len(calls)}"
+
+    params = {'temperature': 0.9, 'max_tokens': 100}
+    assert cached_completion(cache, 'replay', 'm', messages, params, call) == "response-1"
+    assert cached_completion(cache, 'replay', 'm', messages, params, call) == "response-1"
+    assert cached_completion(cache, 'fresh', 'm', messages, params, call) == "response-2"
+    assert cached_completion(cache, 'replay', 'm', messages, params, call) == "response-2"
+    assert cached_completion(cache, 'off', 'm', messages, params, call) == "response-3"
+    assert len(calls) == 3
+
+    print("✅ 回放/重新采样模式正确")
+
+def test_ttl_and_size_eviction():
+    """测试TTL过期和按大小淘汰"""
+    print("🧹 测试过期和淘汰...")
+
+    cache = create_test_cache(ttl_seconds=0.2)
+    cache.put('k', 'm', 'value')
+    assert cache.get('k') == 'value'
+    time.sleep(0.3)
+    assert cache.get('k') is None
+
+    cache = create_test_cache(max_bytes=250)
+    for i in range(5):
+        cache.put(f'k{i}', 'm', 'x' * 100)
+        time.sleep(0.01)
+    assert cache.get('k0') is None
+    assert cache.get('k4') == 'x' * 100
+
+    print("✅ 过期和淘汰正确")
+
+def test_replay_is_opt_in():
+    """测试默认缓存模式重新采样，回放需要显式指定 cache_mode='replay'"""
+    print("🎲 测试默认缓存模式...")
+
+    if 'LLM_CACHE_MODE' not in os.environ:
+        assert config.LLM_CACHE_MODE == 'fresh'
+
+    cache = create_test_cache()
+    messages = [{"role": "user", "content": "生成编舞"}]
+    calls = []
+
+    def call():
+        calls.append(1)
+        return f"response-{len(calls)}"
+
+    params = {'temperature': 0.8, 'max_tokens': 800}
+    assert cached_completion(cache, 'fresh', 'm', messages, params, call) == "response-1"
+    assert cached_completion(cache, 'fresh', 'm', messages, params, call) == "response-2"
+    assert cached_completion(cache, 'replay', 'm', messages, params, call) == "response-2"
+    assert len(calls) == 2
+
+    print("✅ 回放需要显式指定")
+
+class RecordingChoreographer:
+    """记录每次请求收到的缓存模式"""
+
+    def __init__(self):
+        self.cache_modes = []
+
+    def start_telemetry(self):
+        return start_generation()
+
+    def generate_choreography_style(self, bpm, audio_features, cache_mode=None):
+        self.cache_modes.append(('style', cache_mode))
+        return 'Hip-Hop'
+
+    def generate_full_choreography(self, segments, bpm, dance_style, audio_features=None, cache_mode=None,
+                                   on_segment=None, deadline=None):
+        self.cache_modes.append(('segments', cache_mode))
+        return {'dance_style': dance_style, 'segments': []}
+
+def test_generator_forwards_cache_mode():
+    """测试生成器入口把 cache_mode 转交给LLM编舞器，不必设置进程级环境变量"""
+    print("📨 测试生成器转交缓存模式...")
+
+    sample_rate = 22050
+    audio = np.zeros(sample_rate * 6, dtype=np.float32)
+    audio[(np.arange(0.25, 6.0, 0.5) * sample_rate).astype(int)] = 1.0
+    path = os.path.join(tempfile.mkdtemp(), 'clicks.wav')
+    sf.write(path, audio, sample_rate)
+
+    generator = ChoreographyGenerator.__new__(ChoreographyGenerator)
+    generator.audio_processor = AudioProcessor()
+    generator.style_classifier = None
+    generator.llm_choreographer = RecordingChoreographer()
+    original = config.STYLE_LABELS_PATH
+    config.STYLE_LABELS_PATH = os.path.join(tempfile.mkdtemp(), 'labels.jsonl')
+    try:
+        generator.generate_choreography_from_file(path, cache_mode='replay')
+        generator.generate_choreography_from_file(path)
+    finally:
+        config.STYLE_LABELS_PATH = original
+
+    assert generator.llm_choreographer.cache_modes == [('style', 'replay'), ('segments', 'replay'),
+                                                       ('style', None), ('segments', None)]
+
+    print("✅ 生成器转交缓存模式正确")
+
+if __name__ == "__main__":
+    test_key_normalization()
+    test_replay_and_fresh_modes()
+    test_ttl_and_size_eviction()
+    test_replay_is_opt_in()
+    test_generator_forwards_cache_mode()
+    print("\n🎉 LLM响应缓存测试完成！")
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+OpenAI客户端池测试脚本
+验证按密钥和base_url复用客户端、空闲淘汰和HTTP长连接复用
+"""
+
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from llm_clients import ClientPool
+from mock_openai_server import MockOpenAIServer
+
+def test_client_reuse_and_eviction():
+    """测试客户端复用和空闲淘汰"""
+    print("♻️ 测试客户端复用...")
+
+    pool = ClientPool(idle_seconds=0.2)
+    client = pool.get('key-a')
+    assert pool.get('key-a') is client
+    assert pool.get('key-a', 'http://127.0.0.1:1/v1') is not client
+    assert pool.get('key-b') is not client
+    assert len(pool) == 3 and pool.stats['created'] == 3 and pool.stats['reused'] == 1
+
+    time.sleep(0.3)
+    assert pool.get('key-a') is not client
+    assert pool.stats['evicted'] == 3 and len(pool) == 1
+    pool.close_all()
+    assert len(pool) == 0
+
+    print("✅ 客户端复用和淘汰正确")
+
+def test_keepalive_connections():
+    """测试多个请求复用同一条连接"""
+    print("🔗 测试长连接复用...")
+
+    pool = ClientPool()
+    with MockOpenAIServer() as server:
+        for _ in range(5):
+            client = pool.get('mock', server.base_url)
+            client.chat.completions.create(model='m', messages=[{"role": "user", "content": "hi"}])
+        assert server.backend.stats['requests'] == 5
+        assert server.backend.stats['connections'] == 1
+    pool.close_all()
+
+    print("✅ 长连接复用正确")
+
+if __name__ == "__main__":
+    test_client_reuse_and_eviction()
+    test_keepalive_connections()
+    print("\n🎉 客户端池测试完成！")
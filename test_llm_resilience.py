@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+OpenAI容错层测试脚本
+验证退避重试、Retry-After、熔断器和截止时间
+"""
+
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from types import SimpleNamespace
+
+import openai
+from llm_resilience import (CircuitBreaker, CircuitOpenError, DeadlineExceeded,
+                            call_with_retry, retry_after_seconds)
+
+def make_rate_limit_error(retry_after=None):
+    """构造429错误"""
+    headers = {'retry-after': str(retry_after)} if retry_after is not None else {}
+    response = SimpleNamespace(status_code=429, headers=headers, request=None)
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+def make_bad_request_error():
+    """构造400错误"""
+    response = SimpleNamespace(status_code=400, headers={}, request=None)
+    return openai.BadRequestError("bad request", response=response, body=None)
+
+def test_retry_then_success():
+    """测试限流后重试成功"""
+    print("🔁 测试退避重试...")
+
+    attempts = []
+
+    def request(timeout):
+        attempts.append(timeout)
+        if len(attempts) < 3:
+            raise make_rate_limit_error()
+        return "ok"
+
+    breaker = CircuitBreaker(failure_threshold=5)
+    assert call_with_retry(request, breaker, max_retries=4, deadline=10, base_delay=0.01, max_delay=0.05) == "ok"
+    assert len(attempts) == 3
+    assert breaker.state == 'closed' and breaker.failures == 0
+    # 每次尝试拿到的超时是剩余的截止时间
+    assert attempts[0] > attempts[-1]
+
+    print("✅ 退避重试正确")
+
+def test_retry_after_and_deadline():
+    """测试Retry-After解析和截止时间"""
+    print("⏱️ 测试Retry-After和截止时间...")
+
+    assert retry_after_seconds(make_rate_limit_error(2)) == 2.0
+
+    def request(timeout):
+        raise make_rate_limit_error(5)
+
+    started = time.time()
+    try:
+        call_with_retry(request, None, max_retries=4, deadline=1.0, base_delay=0.01, max_delay=10)
+        assert False, "应当超过截止时间"
+    except DeadlineExceeded:
+        pass
+    # 不会白等Retry-After
+    assert time.time() - started < 0.5
+
+    # Retry-After超过max_delay时仍等待完整时长
+    attempts = []
+
+    def hinted(timeout):
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise make_rate_limit_error(0.2)
+        return "ok"
+
+    assert call_with_retry(hinted, None, max_retries=2, deadline=5, base_delay=0.01, max_delay=0.05) == "ok"
+    assert attempts[1] - attempts[0] >= 0.2
+
+    print("✅ Retry-After和截止时间正确")
+
+def test_non_retryable_error():
+    """测试不可重试的错误直接抛出"""
+    print("🚫 测试不可重试错误...")
+
+    attempts = []
+
+    def request(timeout):
+        attempts.append(1)
+        raise make_bad_request_error()
+
+    try:
+        call_with_retry(request, CircuitBreaker(), max_retries=4, deadline=10, base_delay=0.01)
+        assert False
+    except openai.BadRequestError:
+        pass
+    assert len(attempts) == 1
+
+    print("✅ 不可重试错误直接抛出")
+
+def test_circuit_breaker():
+    """测试熔断和半开探测"""
+    print("🔌 测试熔断器...")
+
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+
+    def failing(timeout):
+        raise make_rate_limit_error()
+
+    for _ in range(2):
+        try:
+            call_with_retry(failing, breaker, max_retries=0, deadline=10)
+        except openai.RateLimitError:
+            pass
+    assert breaker.state == 'open'
+
+    started = time.time()
+    try:
+        call_with_retry(lambda timeout: "ok", breaker, deadline=10)
+        assert False
+    except CircuitOpenError:
+        pass
+    assert time.time() - started < 0.05
+
+    time.sleep(0.25)
+    assert breaker.state == 'half_open'
+    assert call_with_retry(lambda timeout: "ok", breaker, deadline=10) == "ok"
+    assert breaker.state == 'closed'
+
+    print("✅ 熔断器正确")
+
+def test_non_retryable_errors_do_not_reset_breaker():
+    """测试4xx既不重置失败计数，也不结束半开状态"""
+    print("🧮 测试4xx与熔断器...")
+
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.2)
+
+    def rate_limited(timeout):
+        raise make_rate_limit_error()
+
+    def bad_request(timeout):
+        raise make_bad_request_error()
+
+    # 400和429交替出现，429累计到阈值仍会熔断
+    for request in (rate_limited, bad_request, rate_limited, bad_request, rate_limited):
+        try:
+            call_with_retry(request, breaker, max_retries=0, deadline=10)
+        except (openai.RateLimitError, openai.BadRequestError):
+            pass
+    assert breaker.state == 'open'
+
+    # 半开探测遇到400：探测名额释放，但仍处于半开状态
+    time.sleep(0.25)
+    try:
+        call_with_retry(bad_request, breaker, max_retries=0, deadline=10)
+    except openai.BadRequestError:
+        pass
+    assert breaker.state == 'half_open' and breaker.failures == 3
+    assert call_with_retry(lambda timeout: "ok", breaker, deadline=10) == "ok"
+    assert breaker.state == 'closed'
+
+    print("✅ 4xx不影响熔断状态")
+
+if __name__ == "__main__":
+    test_retry_then_success()
+    test_retry_after_and_deadline()
+    test_non_retryable_error()
+    test_circuit_breaker()
+    test_non_retryable_errors_do_not_reset_breaker()
+    print("\n🎉 容错层测试完成！")
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+LLM调用遥测测试脚本
+验证token用量、重试、缓存命中的记录，按阶段汇总和JSONL输出
+"""
+
+import sys
+import os
+import json
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from types import SimpleNamespace
+
+from llm_telemetry import LLMTelemetry, estimate_cost
+
+def test_tracked_calls():
+    """测试请求、重试和缓存命中的记录"""
+    print("📈 测试调用记录...")
+
+    process = LLMTelemetry()
+    sink_path = os.path.join(tempfile.mkdtemp(), 'telemetry.jsonl')
+    telemetry = LLMTelemetry(parent=process, sink_path=sink_path)
+    messages = [{"role": "user", "content": "生成编舞"}]
+
+    # 一次重试后成功，使用API返回的usage
+    with telemetry.track('segment', 'gpt-3.5-turbo', messages) as call:
+        call.attempt()
+        call.attempt()
+        call.first_byte()
+        call.set_usage(SimpleNamespace(prompt_tokens=100, completion_tokens=50))
+        call.complete("ok")
+
+    # 命中缓存：没有发出请求，不计费
+    with telemetry.track('summary', 'gpt-3.5-turbo', messages) as call:
+        call.complete("cached")
+
+    # 请求失败
+    try:
+        with telemetry.track('segment', 'gpt-3.5-turbo', messages) as call:
+            call.attempt()
+            raise TimeoutError("timeout")
+    except TimeoutError:
+        pass
+
+    summary = telemetry.summary()
+    assert summary['calls'] == 3
+    assert summary['cached_calls'] == 1
+    assert summary['failed_calls'] == 1
+    assert summary['retries'] == 1
+    assert summary['by_stage']['segment']['calls'] == 2
+    assert summary['by_stage']['summary']['prompt_tokens'] == 0
+    assert summary['most_expensive'][0]['prompt_tokens'] == 100
+    assert summary['ttfb_seconds']['p50'] is not None
+    assert summary['cost_usd'] > estimate_cost('gpt-3.5-turbo', 100, 50) - 1e-9
+
+    assert process.summary()['calls'] == 3
+    with open(sink_path, encoding='utf-8') as f:
+        lines = [json.loads(line) for line in f]
+    assert [line['stage'] for line in lines] == ['segment', 'summary', 'segment']
+    assert all(line['generation_id'] == telemetry.generation_id for line in lines)
+
+    print("✅ 调用记录正确")
+
+if __name__ == "__main__":
+    test_tracked_calls()
+    print("\n🎉 LLM调用遥测测试完成！")
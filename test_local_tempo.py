@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+局部速度测试脚本
+用匀加速的合成点击音轨验证逐拍速度、片段速度，以及整轨和片段速度漂移使用同一单位
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import librosa
+
+from local_tempo import estimate_beat_tempo, estimate_local_tempo
+
+SR = 22050
+HOP_LENGTH = 512
+
+def create_accelerating_beats(start_bpm=100.0, end_bpm=130.0, duration=30.0):
+    """速度随时间线性增加的节拍时间"""
+    rate = (end_bpm - start_bpm) / duration
+    beat_times = [0.5]
+    while beat_times[-1] < duration:
+        beat_times.append(beat_times[-1] + 60.0 / (start_bpm + rate * beat_times[-1]))
+    return np.array(beat_times), rate
+
+def test_accelerating_click_track():
+    """测试匀加速点击音轨的局部速度和速度漂移"""
+    print("⏩ 测试匀加速点击音轨...")
+
+    beat_times, rate = create_accelerating_beats()
+    clicks = librosa.clicks(times=beat_times, sr=SR, length=int((beat_times[-1] + 1.0) * SR))
+    onset_envelope = librosa.onset.onset_strength(y=clicks, sr=SR, hop_length=HOP_LENGTH)
+
+    segments = [{'start_time': start, 'end_time': start + 10.0} for start in (0.0, 10.0, 20.0)]
+    result = estimate_local_tempo(beat_times, segments, onset_envelope=onset_envelope,
+                                  sr=SR, hop_length=HOP_LENGTH)
+
+    # 逐拍速度跟随实际速度
+    expected = 100.0 + rate * beat_times
+    assert np.all(np.abs(result['beat_tempo'][:-1] - expected[:-1]) < 2.0)
+
+    # 片段速度接近片段内节拍的中位速度，片段漂移接近片段内首尾的速度变化
+    for segment, info in zip(segments, result['segments']):
+        inside = beat_times[(beat_times >= segment['start_time']) & (beat_times <= segment['end_time'])]
+        assert abs(info['tempo'] - (100.0 + rate * np.median(inside))) < 3.0, info['tempo']
+        assert abs(info['tempo_drift'] - rate * np.ptp(inside)) < 1.5, info['tempo_drift']
+
+    # 整轨漂移与片段漂移同一单位：整轨首尾速度变化约为各片段之和
+    assert abs(result['tempo_drift'] - rate * np.ptp(beat_times)) < 1.5, result['tempo_drift']
+    assert abs(result['tempo_drift'] - sum(info['tempo_drift'] for info in result['segments'])) < 3.0
+
+    print("✅ 局部速度和速度漂移正确")
+
+def test_steady_and_degenerate_grids():
+    """测试匀速节拍没有漂移，节拍过少时返回零"""
+    print("🎚️ 测试匀速和退化的节拍网格...")
+
+    steady = np.arange(0.0, 20.0, 0.5)
+    result = estimate_local_tempo(steady, [{'start_beat': 0, 'end_beat': 15}])
+    assert abs(result['global_tempo'] - 120.0) < 1e-6
+    assert abs(result['tempo_drift']) < 1e-6
+    assert abs(result['segments'][0]['tempo_drift']) < 1e-6
+
+    assert len(estimate_beat_tempo(np.array([1.0]))) == 1
+    single = estimate_local_tempo(np.array([1.0]), [{'start_time': 0.0, 'end_time': 2.0}])
+    assert single['tempo_drift'] == 0.0
+    assert single['segments'][0] == {'tempo': 0.0, 'tempo_drift': 0.0, 'beat_tempos': [0.0]}
+
+    print("✅ 匀速和退化网格正确")
+
+if __name__ == "__main__":
+    test_accelerating_click_track()
+    test_steady_and_degenerate_grids()
+    print("\n🎉 局部速度测试完成！")
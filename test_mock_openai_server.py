@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+本地模拟OpenAI服务测试脚本
+验证确定性响应、流式输出、429注入和编舞生成器离线运行
+"""
+
+import sys
+import os
+import json
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import openai
+
+import config
+from mock_openai_server import LatencyModel, MockChatBackend, MockOpenAIServer
+
+def create_segments(num_segments=3):
+    """创建测试片段"""
+    return [{'start_time': i * 4.0, 'end_time': (i + 1) * 4.0, 'beat_count': 8, 'tempo': 120.0}
+            for i in range(num_segments)]
+
+def test_deterministic_replies():
+    """测试相同请求得到相同响应"""
+    print("🎲 测试确定性响应...")
+
+    messages = [{"role": "user", "content": "舞蹈风格: Hip-Hop\n请返回 rhythm_analysis 等字段"}]
+    first = MockChatBackend(seed=7).build_reply(messages)
+    assert first == MockChatBackend(seed=7).build_reply(messages)
+    data = json.loads(first)
+    assert len(data['dance_elements']) == 4 and 1 <= data['difficulty'] <= 5
+
+    assert LatencyModel.parse('fixed:0.25').sample(None) == 0.25
+    assert LatencyModel.parse('none').sample(None) == 0.0
+
+    print("✅ 确定性响应正确")
+
+def test_streaming_and_rate_limit():
+    """测试流式输出和429注入"""
+    print("📡 测试流式输出和429注入...")
+
+    with MockOpenAIServer(MockChatBackend(rate_limit_rate=1.0, retry_after=3)) as server:
+        client = openai.OpenAI(api_key='mock', base_url=server.base_url, max_retries=0)
+        try:
+            client.chat.completions.create(model='m', messages=[{"role": "user", "content": "hi"}])
+            assert False, "应当返回429"
+        except openai.RateLimitError as e:
+            assert e.response.headers.get('retry-after') == '3'
+
+    with MockOpenAIServer() as server:
+        client = openai.OpenAI(api_key='mock', base_url=server.base_url, max_retries=0)
+        messages = [{"role": "user", "content": "请总结。舞蹈风格: House"}]
+        full = client.chat.completions.create(model='m', messages=messages).choices[0].message.content
+        chunks = client.chat.completions.create(model='m', messages=messages, stream=True)
+        streamed = "".join(chunk.choices[0].delta.content or "" for chunk in chunks if chunk.choices)
+        assert streamed == full and 'House' in full
+
+    print("✅ 流式输出和429注入正确")
+
+def test_choreographer_against_mock():
+    """测试结构化编舞通过base URL离线生成"""
+    print("🎭 测试离线结构化编舞...")
+
+    os.environ.setdefault('OPENAI_API_KEY', 'mock')
+    original = config.OPENAI_BASE_URL
+    try:
+        with MockOpenAIServer() as server:
+            config.OPENAI_BASE_URL = server.base_url
+            from enhanced_llm_choreographer import EnhancedLLMChoreographer
+            choreographer = EnhancedLLMChoreographer()
+            received = []
+            result = choreographer.generate_enhanced_choreography(
+                {'bpm': 120.0}, create_segments(), 'Hip-Hop', cache_mode='off',
+                on_segment=lambda index, segment: received.append(index))
+            assert received == [0, 1, 2]
+            assert [segment['time'] for segment in result['segments']] == ['0.0s-4.0s', '4.0s-8.0s', '8.0s-12.0s']
+            assert result['global_cues']['mood'].startswith('mock')
+    finally:
+        config.OPENAI_BASE_URL = original
+
+    print("✅ 离线结构化编舞正确")
+
+if __name__ == "__main__":
+    test_deterministic_replies()
+    test_streaming_and_rate_limit()
+    test_choreographer_against_mock()
+    print("\n🎉 模拟OpenAI服务测试完成！")
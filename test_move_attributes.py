@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+动作属性表测试脚本
+验证向量化评分与逐片段规则一致、参考评级并入、未知动作的缓存回退和属性权重
+"""
+
+import sys
+import os
+import random
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from action_database import ACTION_DIMENSIONS, ACTION_INDEX, MOVE_MATCHER
+from move_attributes import MOVE_ATTRIBUTES, REFERENCE_LABELS, _transition_points, move_labels, score_segments
+
+def _per_segment_scores(segment, profile):
+    """逐片段的原有评分规则，作为对照"""
+    *moves, transition = MOVE_MATCHER.classify(segment.get('moves', []) + [segment.get('transition', '')])
+    pro = profile == 'pro'
+    difficulty = 0
+    for labels in moves:
+        if 'complex' in labels:
+            difficulty += 4 if pro else 3
+        elif 'rotation' in labels or (pro and 'control' in labels):
+            difficulty += 2
+        else:
+            difficulty += 1
+    difficulty += {'floor': 3 if pro else 2, 'high': 2 if pro else 1}.get(segment.get('level', 'mid'), 0)
+    if 'complex_transition' in transition or (pro and 'air_transition' in transition):
+        difficulty += 3 if pro else 2
+    energy = {'strong': 4 if pro else 3, 'medium': 2}.get(segment.get('accent', 'medium'), 1)
+    for labels in moves:
+        if 'high_energy' in labels or (pro and 'explosive' in labels):
+            energy += 3 if pro else 2
+        elif 'medium_energy' in labels or (pro and 'dynamic' in labels):
+            energy += 1
+    if pro:
+        audio = segment.get('audio_features', {})
+        tempo = audio.get('tempo', 120)
+        difficulty += 2 if tempo > 140 else 1 if tempo > 120 else 0
+        difficulty += 1 if abs(audio.get('tempo_drift', 0.0)) > 5 else 0
+        difficulty_labels = ["初级"] * 5 + ["中级"] * 4 + ["高级"] * 4
+        energy_labels = ["低能量"] * 4 + ["中等能量"] * 3 + ["高能量"] * 3
+        return (difficulty_labels[difficulty] if difficulty < 13 else "专业级",
+                energy_labels[energy] if energy < 10 else "超高能量")
+    return ("初级" if difficulty <= 3 else "中级" if difficulty <= 6 else "高级",
+            "低能量" if energy <= 2 else "中等能量" if energy <= 4 else "高能量")
+
+def test_vectorized_matches_per_segment_rules():
+    """测试向量化评分与逐片段规则一致（不含参考评级的动作）"""
+    print("🧮 测试向量化评分...")
+
+    random.seed(5)
+    plain = [name for name in ACTION_INDEX.names if not REFERENCE_LABELS.get(name)]
+    invented = ['Spin-Kick-Combo', 'quick-bounce', 'explosive-drop', 'air_step-glide', 'mystery-move']
+    segments = []
+    for _ in range(200):
+        segments.append({
+            'moves': random.sample(plain + invented, random.randint(0, 6)),
+            'transition': random.choice(ACTION_DIMENSIONS['transition'] + ['full-turn', 'air-step']),
+            'level': random.choice(ACTION_DIMENSIONS['level']),
+            'accent': random.choice(['strong', 'medium', 'weak']),
+            'audio_features': {'tempo': random.choice([100, 125, 150]),
+                               'tempo_drift': random.choice([0.0, -6.0, 3.0])}
+        })
+    segments.append({})
+
+    for profile in ('basic', 'pro'):
+        difficulties, energy_levels = score_segments(segments, profile)
+        for segment, difficulty, energy_level in zip(segments, difficulties, energy_levels):
+            assert (difficulty, energy_level) == _per_segment_scores(segment, profile), (profile, segment)
+
+    assert score_segments([]) == ([], [])
+
+    # LLM输出的过渡名称使用连字符，下划线写法同样计分
+    for transition in ('full-turn', 'level-drop', 'travel-diagonal', 'level_drop'):
+        assert _transition_points(transition, 'basic') == 2 and _transition_points(transition, 'pro') == 3
+    assert _transition_points('air-step', 'basic') == 0 and _transition_points('air-step', 'pro') == 3
+    assert _transition_points('quarter-turn', 'pro') == 0
+
+    print("✅ 向量化评分一致")
+
+def test_reference_ratings_and_fallback():
+    """测试参考评级并入类别、未知动作名称的缓存回退"""
+    print("📚 测试参考评级和回退...")
+
+    freeze = ACTION_INDEX.ids['freeze']
+    assert {'control', 'high_energy'} <= MOVE_ATTRIBUTES.labels[freeze]
+    assert MOVE_ATTRIBUTES.reference_difficulty[freeze] == 4
+    assert np.isnan(MOVE_ATTRIBUTES.reference_energy[ACTION_INDEX.ids['two-step']])
+
+    # 参考库中的名称写法（"Freeze"）在回退路径中同样对齐
+    assert move_labels('Freeze') == MOVE_ATTRIBUTES.labels[freeze]
+    move_labels.cache_clear()
+    score_segments([{'moves': ['llm-invented-move', 'llm-invented-move'], 'transition': 'half-turn'}])
+    assert move_labels.cache_info().misses == 1
+
+    # 参考评级让定格动作在专业方案中计入高能量
+    assert score_segments([{'moves': ['freeze'], 'accent': 'weak'}], 'pro')[1] == ["中等能量"]
+
+    print("✅ 参考评级和回退正确")
+
+def test_level_and_plane_weights():
+    """测试层次和平面权重"""
+    print("📐 测试层次和平面权重...")
+
+    levels = ACTION_DIMENSIONS['level']
+    planes = ACTION_DIMENSIONS['plane']
+    assert MOVE_ATTRIBUTES.level_weights.shape == (len(ACTION_INDEX.names), len(levels))
+    assert np.allclose(MOVE_ATTRIBUTES.level_weights.sum(axis=1), 1.0)
+    assert np.allclose(MOVE_ATTRIBUTES.plane_weights.sum(axis=1), 1.0)
+
+    windmill = ACTION_INDEX.ids['windmill']
+    assert MOVE_ATTRIBUTES.level_weights[windmill, levels.index('floor')] == 1.0
+    assert MOVE_ATTRIBUTES.plane_weights[windmill, planes.index('transverse')] == 1.0
+    assert MOVE_ATTRIBUTES.level_weights[ACTION_INDEX.ids['two-step'], levels.index('mid')] == 1.0
+
+    print("✅ 层次和平面权重正确")
+
+if __name__ == "__main__":
+    test_vectorized_matches_per_segment_rules()
+    test_reference_ratings_and_fallback()
+    test_level_and_plane_weights()
+    print("\n🎉 动作属性表测试完成！")
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+起音层测试脚本
+验证节拍跟踪和节拍显著度与直接调用librosa一致，以及片段重音强度对空片段的处理
+"""
+
+import sys
+import os
+import warnings
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import librosa
+
+from audio_feature_bank import AudioFeatureBank
+
+SR = 22050
+HOP_LENGTH = 512
+
+def create_click_track(bpm=120.0, duration=12.0):
+    """匀速点击音轨，每四拍一个重拍"""
+    beat_times = np.arange(0.5, duration - 0.5, 60.0 / bpm)
+    clicks = librosa.clicks(times=beat_times[1::4], sr=SR, length=int(duration * SR))
+    clicks = clicks + 0.4 * librosa.clicks(times=beat_times, sr=SR, length=int(duration * SR))
+    return clicks.astype(np.float32), beat_times
+
+def test_track_beats_matches_librosa():
+    """测试基于缓存包络的节拍跟踪与 librosa.beat.beat_track 一致"""
+    print("🥁 测试节拍跟踪...")
+
+    y, _ = create_click_track()
+    onset = AudioFeatureBank(y, SR, hop_length=HOP_LENGTH).onset
+    tempo, beats = onset.track_beats()
+
+    expected_tempo, expected_beats = librosa.beat.beat_track(y=y, sr=SR, hop_length=HOP_LENGTH)
+    assert np.allclose(onset.envelope, librosa.onset.onset_strength(y=y, sr=SR, hop_length=HOP_LENGTH), atol=1e-4)
+    assert abs(tempo - float(np.atleast_1d(expected_tempo)[0])) < 1e-6
+    assert np.array_equal(beats, expected_beats)
+    assert abs(tempo - 120.0) < 5.0
+    # 第二次调用直接返回缓存
+    assert onset.track_beats()[1] is beats
+
+    print("✅ 节拍跟踪一致")
+
+def test_beat_salience_matches_librosa():
+    """测试节拍显著度与直接由librosa包络计算的结果一致"""
+    print("📈 测试节拍显著度...")
+
+    y, _ = create_click_track()
+    onset = AudioFeatureBank(y, SR, hop_length=HOP_LENGTH).onset
+    tracked = librosa.frames_to_time(onset.track_beats()[1], sr=SR, hop_length=HOP_LENGTH)
+
+    envelope = librosa.onset.onset_strength(y=y, sr=SR, hop_length=HOP_LENGTH)
+    frames = np.clip(librosa.time_to_frames(tracked, sr=SR, hop_length=HOP_LENGTH), 0, len(envelope) - 1)
+    ratio = np.mean(envelope[frames]) / np.mean(envelope)
+    assert abs(onset.beat_salience(tracked) - np.clip(1.0 - 1.0 / ratio, 0.0, 1.0)) < 1e-4
+
+    # 跟踪到的节拍落在起音峰值上，显著度高；错开半拍时显著度低
+    assert onset.beat_salience(tracked) > 0.5
+    assert onset.beat_salience(tracked + 0.25) < onset.beat_salience(tracked)
+    assert onset.beat_salience(np.zeros(0)) == 0.0
+
+    print("✅ 节拍显著度一致")
+
+def test_segment_accent_strength_empty_segments():
+    """测试空片段、超出节拍范围的片段和空节拍网格的重音强度"""
+    print("🔇 测试空片段的重音强度...")
+
+    y, beat_times = create_click_track()
+    onset = AudioFeatureBank(y, SR, hop_length=HOP_LENGTH).onset
+    segments = [
+        {'start_beat': 0, 'end_beat': 7},
+        {'start_beat': 5, 'end_beat': 4},
+        {'start_beat': len(beat_times) + 3, 'end_beat': len(beat_times) + 8},
+        {'start_beat': 8, 'end_beat': len(beat_times) + 8}
+    ]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        strengths = onset.segment_accent_strength(beat_times, segments)
+        assert onset.segment_accent_strength(beat_times, []).shape == (0,)
+        assert np.array_equal(onset.segment_accent_strength(np.zeros(0), segments), np.zeros(len(segments)))
+
+    peaks = onset.beat_peaks(beat_times)
+    assert np.isclose(strengths[0], np.mean(peaks[:8]) / np.median(peaks))
+    assert strengths[1] == 0.0 and strengths[2] == 0.0
+    assert np.isclose(strengths[3], np.mean(peaks[8:]) / np.median(peaks))
+    assert np.all(np.isfinite(strengths))
+
+    print("✅ 空片段的重音强度为0")
+
+if __name__ == "__main__":
+    test_track_beats_matches_librosa()
+    test_beat_salience_matches_librosa()
+    test_segment_accent_strength_empty_segments()
+    print("\n🎉 起音层测试完成！")
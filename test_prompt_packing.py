@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+按token预算打包测试脚本
+验证打包边界（单个超预算片段、恰好等于预算）以及多批次合并时片段编号统一为全局编号
+"""
+
+import sys
+import os
+import json
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault('OPENAI_API_KEY', 'mock')
+
+import config
+from mock_openai_server import MockChatBackend, MockOpenAIServer
+from prompt_packing import pack_segments
+
+class BatchLocalIdxBackend(MockChatBackend):
+    """像部分真实模型一样按批内序号编号，并多返回一个片段"""
+
+    def _structured_choreography(self, system, prompt, rng):
+        data = json.loads(super()._structured_choreography(system, prompt, rng))
+        data['segments'].append(dict(data['segments'][-1]))
+        for offset, segment in enumerate(data['segments']):
+            segment['idx'] = offset
+        return json.dumps(data, ensure_ascii=False)
+
+def create_segments(num_segments=5):
+    """创建测试片段"""
+    return [{'start_time': i * 4.0, 'end_time': (i + 1) * 4.0, 'beat_count': 8, 'tempo': 120.0}
+            for i in range(num_segments)]
+
+def test_pack_boundaries():
+    """测试打包边界"""
+    print("📦 测试打包边界...")
+
+    assert pack_segments([], 100, overhead=10) == []
+    # 恰好等于预算时仍在同一批，多1个token就拆分
+    assert pack_segments([30, 30, 30], 100, overhead=10) == [[0, 1, 2]]
+    assert pack_segments([30, 30, 31], 100, overhead=10) == [[0, 1], [2]]
+    # 单个超出预算的片段独占一批，前后的片段不受影响
+    assert pack_segments([150], 100, overhead=10) == [[0]]
+    assert pack_segments([20, 150, 20, 20], 100, overhead=10) == [[0], [1], [2, 3]]
+    # 开销本身超出预算时每个片段独占一批
+    assert pack_segments([5, 5, 5], 10, overhead=10) == [[0], [1], [2]]
+
+    print("✅ 打包边界正确")
+
+def test_run_batches_renumbers_idx():
+    """测试多批次合并时片段编号为全局编号、多余片段被丢弃、每个片段只回调一次"""
+    print("🔢 测试批次合并的片段编号...")
+
+    from enhanced_llm_choreographer import EnhancedLLMChoreographer
+
+    original_url, original_budget = config.OPENAI_BASE_URL, config.LLM_BATCH_MAX_TOKENS
+    try:
+        for stream in (False, True):
+            backend = BatchLocalIdxBackend()
+            with MockOpenAIServer(backend) as server:
+                config.OPENAI_BASE_URL = server.base_url
+                choreographer = EnhancedLLMChoreographer()
+                choreographer.compact_output = False
+                # 每批恰好容纳两个片段
+                config.LLM_BATCH_MAX_TOKENS = (choreographer.output_overhead_tokens
+                                               + 2 * choreographer.output_tokens_per_segment)
+                received = []
+                result = choreographer.generate_enhanced_choreography(
+                    {'bpm': 120.0}, create_segments(), 'Hip-Hop', cache_mode='off', stream=stream,
+                    on_segment=lambda index, segment: received.append(index))
+
+            assert backend.stats['requests'] == 3, backend.stats
+            assert [segment['idx'] for segment in result['segments']] == list(range(5))
+            assert [segment['time'] for segment in result['segments']] == \
+                [f"{i * 4.0:.1f}s-{(i + 1) * 4.0:.1f}s" for i in range(5)]
+            assert sorted(received) == list(range(5))
+            assert choreographer._validate_json_schema(result)
+    finally:
+        config.OPENAI_BASE_URL, config.LLM_BATCH_MAX_TOKENS = original_url, original_budget
+
+    print("✅ 批次合并的片段编号正确")
+
+if __name__ == "__main__":
+    test_pack_boundaries()
+    test_run_batches_renumbers_idx()
+    print("\n🎉 按token预算打包测试完成！")
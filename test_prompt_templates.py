@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+预编译提示模板测试脚本
+验证静态前缀只编译一次、动态内容只出现在用户消息中以及token计数
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from prompt_packing import estimate_tokens
+from prompt_templates import get_template, template_token_report
+
+def test_static_prefix_is_shared():
+    """测试同一风格的请求共享同一个静态系统消息"""
+    print("🧩 测试静态前缀复用...")
+
+    template = get_template('structured', 'Hip-Hop')
+    assert get_template('structured', 'Hip-Hop') is template
+    assert get_template('structured', 'House') is not template
+
+    first = template.partial(candidates='chest-pop, freeze', avoid='无')
+    second = template.partial(candidates='running-man', avoid='two-step')
+    values = dict(bpm='120.0', energy_level='high', segment_count=1, segment_tempo_lines='- 片段0: 0.0s-4.0s',
+                  batch_note='', context_note='')
+    messages_a = first.render(**values)
+    messages_b = second.render(**values)
+
+    assert [m['role'] for m in messages_a] == ['system', 'user']
+    assert messages_a[0]['content'] == messages_b[0]['content'] == template.system
+    assert '候选动作池' not in template.system and 'Hip-Hop' in template.system
+    assert messages_a[1]['content'].startswith('候选动作池：chest-pop, freeze')
+    assert '舞蹈风格: Hip-Hop' in messages_b[1]['content']
+
+    print("✅ 静态前缀复用正确")
+
+def test_partial_values_with_braces():
+    """测试部分填充的值中含花括号时不会被再次解析"""
+    print("🔣 测试花括号转义...")
+
+    template = get_template('segment', 'Jazz').partial(reference_text='参考: {not a field}')
+    content = template.render(bpm=100, tempo_feel='中等', local_tempo='100.0', tempo_drift='+0.0',
+                              energy_level='中', segment_beats=8)[1]['content']
+    assert content.endswith('参考: {not a field}')
+
+    print("✅ 花括号转义正确")
+
+def test_token_report():
+    """测试模板token计数"""
+    print("🔢 测试模板token计数...")
+
+    template = get_template('segment', 'Hip-Hop')
+    report = {(entry['name'], entry['style']): entry['system_tokens'] for entry in template_token_report()}
+    assert report[('segment', 'Hip-Hop')] == estimate_tokens(template.system) > 0
+    assert estimate_tokens('') == 0
+
+    print("✅ 模板token计数正确")
+
+if __name__ == "__main__":
+    test_static_prefix_is_shared()
+    test_partial_values_with_braces()
+    test_token_report()
+    print("\n🎉 预编译提示模板测试完成！")
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+片段特征聚合测试脚本
+验证一次归约的结果与逐片段切片计算一致
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from audio_feature_bank import AudioFeatureBank
+from segment_aggregator import aggregate_segment_features, reduce_segment_frames
+
+def create_test_bank(duration=12.0, sample_rate=22050):
+    """创建测试用特征库"""
+    t = np.arange(int(sample_rate * duration)) / sample_rate
+    audio = 0.2 * np.sin(2 * np.pi * 220 * t) + 0.05 * np.random.RandomState(0).randn(len(t))
+    return AudioFeatureBank(audio.astype(np.float32), sample_rate)
+
+def test_reduceat_matches_slices():
+    """测试归约结果与逐片段切片一致"""
+    print("📊 测试片段归约...")
+
+    bank = create_test_bank()
+    segments = [
+        {'start_time': 0.0, 'end_time': 3.5},
+        {'start_time': 4.0, 'end_time': 7.5},
+        {'start_time': 8.0, 'end_time': 12.0}
+    ]
+
+    results = aggregate_segment_features(bank, segments)
+    assert len(results) == len(segments)
+
+    for segment, result in zip(segments, results):
+        frames = bank.frame_slice(segment['start_time'], segment['end_time'])
+        centroid = bank.spectral_centroid[frames]
+        assert np.isclose(result['energy'], np.mean(bank.rms[frames]))
+        assert np.isclose(result['brightness'], np.mean(centroid))
+        assert np.isclose(result['complexity'], np.std(centroid) / np.mean(centroid), rtol=1e-4)
+        assert np.allclose(result['mfcc_mean'], np.mean(bank.mfcc[:, frames], axis=1), rtol=1e-4, atol=1e-3)
+
+    print(f"✅ {len(results)} 个片段的归约结果与切片计算一致")
+
+def test_empty_segments():
+    """测试空片段列表"""
+    print("📊 测试空片段列表...")
+
+    stats = reduce_segment_frames(create_test_bank(duration=2.0), [])
+    assert stats['energy'].shape == (0,)
+    assert stats['mfcc_mean'].shape == (0, 13)
+
+    print("✅ 空片段列表处理正确")
+
+if __name__ == "__main__":
+    test_reduceat_matches_slices()
+    test_empty_segments()
+    print("\n🎉 片段特征聚合测试完成！")
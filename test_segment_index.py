@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+片段编舞近邻索引测试脚本
+验证相似度阈值、多样性规则、重复条目、持久化和默认模式下的生成复用
+"""
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault('OPENAI_API_KEY', 'mock')
+
+import config
+from mock_openai_server import MockChatBackend, MockOpenAIServer
+from segment_index import SegmentIndex, segment_vector
+
+def create_test_segment(tempo=120.0, energy=0.2, brightness=2000.0):
+    """创建带统计特征的测试片段"""
+    return {'tempo': tempo, 'energy': energy, 'brightness': brightness, 'complexity': 0.3,
+            'mfcc_mean': [-200.0, 80.0] + [0.0] * 11}
+
+def create_test_choreography(elements):
+    """创建字段完整的片段编舞"""
+    return {'rhythm_analysis': '节奏稳定', 'dance_elements': elements, 'key_tips': '卡拍',
+            'difficulty': 3, 'energy_level': 3, 'reference_moves': elements[:1]}
+
+def test_threshold_and_style():
+    """测试相似度阈值和风格分区"""
+    print("🔍 测试近邻查找...")
+
+    index = SegmentIndex(None, min_similarity=0.5, top_k=1)
+    index.insert('Hip-Hop', segment_vector(create_test_segment(), 120.0), create_test_choreography(['wave']))
+
+    choreography, similarity, _ = index.lookup('Hip-Hop', segment_vector(create_test_segment(energy=0.21), 120.0))
+    assert choreography['dance_elements'] == ['wave'] and similarity > 0.8
+    assert index.lookup('Hip-Hop', segment_vector(create_test_segment(tempo=160.0), 120.0)) is None
+    assert index.lookup('House', segment_vector(create_test_segment(), 120.0)) is None
+    assert segment_vector({'start_time': 0.0}, 120.0) is None
+
+    print("✅ 近邻查找正确")
+
+def test_diversity_rules():
+    """测试同一生成内不重复、相邻片段不重叠"""
+    print("🎨 测试多样性规则...")
+
+    index = SegmentIndex(None, min_similarity=0.3, top_k=5)
+    assert index.insert('Hip-Hop', segment_vector(create_test_segment(), 120.0), create_test_choreography(['wave']))
+    assert index.insert('Hip-Hop', segment_vector(create_test_segment(energy=0.25), 120.0),
+                        create_test_choreography(['pop', 'lock']))
+    # 几乎相同的条目和字段不完整的结果不入库
+    assert not index.insert('Hip-Hop', segment_vector(create_test_segment(), 120.0), create_test_choreography(['x']))
+    assert not index.insert('Hip-Hop', segment_vector(create_test_segment(energy=0.4), 120.0), {'dance_elements': []})
+    assert len(index) == 2
+
+    vector = segment_vector(create_test_segment(), 120.0)
+    _, _, first_id = index.lookup('Hip-Hop', vector, avoid_elements=['pop'])
+    assert first_id == 'Hip-Hop:0'
+    choreography, _, second_id = index.lookup('Hip-Hop', vector, exclude={first_id})
+    assert second_id == 'Hip-Hop:1' and choreography['dance_elements'] == ['pop', 'lock']
+    assert index.lookup('Hip-Hop', vector, exclude={first_id, second_id}) is None
+
+    print("✅ 多样性规则正确")
+
+def test_persistence():
+    """测试增量写入和重新加载"""
+    print("💾 测试持久化...")
+
+    path = os.path.join(tempfile.mkdtemp(), 'segment_index.jsonl')
+    index = SegmentIndex(path)
+    index.insert('House', segment_vector(create_test_segment(), 124.0), create_test_choreography(['jack']))
+    index.insert('House', segment_vector(create_test_segment(tempo=128.0, energy=0.3), 124.0),
+                 create_test_choreography(['skate']))
+
+    reloaded = SegmentIndex(path, min_similarity=0.9)
+    assert len(reloaded) == 2
+    choreography, _, _ = reloaded.lookup('House', segment_vector(create_test_segment(), 124.0))
+    assert choreography['dance_elements'] == ['jack']
+
+    print("✅ 持久化正确")
+
+def test_default_mode_generation_uses_index():
+    """测试默认缓存模式的逐片段生成直接复用索引中的相似片段"""
+    print("⚡ 测试默认模式下的索引复用...")
+
+    from llm_choreographer import LLMChoreographer
+
+    indexed = create_test_choreography(['wave', 'pop'])
+    segments = [{**create_test_segment(energy=0.21), 'start_time': 0.0, 'end_time': 4.0, 'beat_count': 8},
+                {**create_test_segment(tempo=160.0), 'start_time': 4.0, 'end_time': 8.0, 'beat_count': 8}]
+
+    original = config.OPENAI_BASE_URL
+    try:
+        for use_index, expected_hits, expected_requests in ((True, [0], 2), (False, [], 3)):
+            backend = MockChatBackend()
+            with MockOpenAIServer(backend) as server:
+                config.OPENAI_BASE_URL = server.base_url
+                choreographer = LLMChoreographer()
+                choreographer.segment_index = SegmentIndex(None, min_similarity=0.5, top_k=1)
+                choreographer.segment_index.insert('Hip-Hop', segment_vector(create_test_segment(), 120.0), indexed)
+                assert choreographer.cache_mode == config.LLM_CACHE_MODE
+                result = choreographer.generate_full_choreography(segments, 120.0, 'Hip-Hop', use_index=use_index)
+
+            assert result['index_hits'] == expected_hits
+            # 片段数加一次总结
+            assert backend.stats['requests'] == expected_requests, backend.stats
+            assert (result['segments'][0] == indexed) == use_index
+    finally:
+        config.OPENAI_BASE_URL = original
+
+    print("✅ 默认模式下的索引复用正确")
+
+if __name__ == "__main__":
+    test_threshold_and_style()
+    test_diversity_rules()
+    test_persistence()
+    test_default_mode_generation_uses_index()
+    print("\n🎉 片段索引测试完成！")
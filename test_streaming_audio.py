@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+流式音频加载测试脚本
+验证分块增量计算的帧级特征与整轨特征库一致
+"""
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import soundfile as sf
+from audio_feature_bank import AudioFeatureBank
+from streaming_audio import stream_feature_bank
+
+def create_test_file(duration=8.0, sample_rate=22050):
+    """创建测试用音频文件"""
+    t = np.arange(int(sample_rate * duration)) / sample_rate
+    audio = 0.2 * np.sin(2 * np.pi * 220 * t) + 0.05 * np.random.RandomState(0).randn(len(t))
+    audio = audio.astype(np.float32)
+    path = os.path.join(tempfile.mkdtemp(), 'test.wav')
+    sf.write(path, audio, sample_rate, subtype='FLOAT')
+    return path, audio
+
+def test_streaming_matches_full_bank():
+    """测试流式特征与整轨特征一致"""
+    print("🌊 测试流式特征提取...")
+
+    path, audio = create_test_file()
+    bank = AudioFeatureBank(audio, 22050)
+    # 块长度故意不与帧移对齐
+    streamed = stream_feature_bank(path, block_seconds=1.37)
+
+    assert streamed.n_frames == bank.n_frames
+    assert np.isclose(streamed.duration, bank.duration)
+    for name in ('spectral_centroid', 'spectral_rolloff', 'spectral_bandwidth',
+                 'rms', 'chroma'):
+        assert np.allclose(getattr(streamed, name), getattr(bank, name), rtol=1e-3, atol=1e-4), name
+    # 过零率在首尾帧的填充方式不同（零填充 vs 边缘填充），只差一两个过零点
+    assert np.allclose(streamed.zero_crossing_rate, bank.zero_crossing_rate, atol=2e-3)
+    assert streamed.onset.envelope.shape == bank.onset.envelope.shape
+
+    print(f"✅ {streamed.n_frames} 帧的流式特征与整轨计算一致")
+
+if __name__ == "__main__":
+    test_streaming_matches_full_bank()
+    print("\n🎉 流式音频加载测试完成！")
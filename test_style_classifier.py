@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+本地风格分类器测试脚本
+验证先验模型、样本拟合与持久化、离群拒绝，以及只有拟合模型置信度足够时才跳过LLM
+"""
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+import config
+from choreography_generator import ChoreographyGenerator
+from style_classifier import STYLE_PRIORS, StyleClassifier, feature_vector, load_labels, record_label
+
+def create_features(centroid=2000.0, energy=0.2, mfcc_offset=0.0):
+    """创建分析结果格式的音频特征"""
+    return {'spectral_centroid_mean': centroid, 'energy_mean': energy,
+            'mfcc_mean': [-200.0 + mfcc_offset] + [10.0] * 12, 'chroma_mean': [0.4] * 12}
+
+def test_prior_model():
+    """测试先验模型的分类和缺失特征"""
+    print("🧭 测试先验模型...")
+
+    classifier = StyleClassifier.prior()
+    style, confidence = classifier.predict(78.0, create_features(1500.0, 0.09))
+    assert style == 'Contemporary' and confidence > 0.9
+
+    # 缺少MFCC和色度时按均值补齐，结果不变
+    vector = feature_vector(78.0, {'spectral_centroid_mean': 1500.0, 'energy_mean': 0.09})
+    assert np.isnan(vector[3:]).all()
+    assert classifier.predict(78.0, {'spectral_centroid_mean': 1500.0, 'energy_mean': 0.09})[0] == 'Contemporary'
+
+    print("✅ 先验模型正确")
+
+def test_fit_and_persistence():
+    """测试样本记录、拟合和npz持久化"""
+    print("💾 测试拟合与持久化...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        labels_path = os.path.join(directory, 'labels.jsonl')
+        rng = np.random.default_rng(0)
+        for _ in range(10):
+            record_label(120.0 + rng.normal(), create_features(mfcc_offset=rng.normal() - 40.0), 'House', labels_path)
+            record_label(120.0 + rng.normal(), create_features(mfcc_offset=rng.normal() + 40.0), 'Jazz', labels_path)
+        record_label(120.0, create_features(), '不存在的风格', labels_path)
+
+        vectors, labels = load_labels(labels_path)
+        assert len(vectors) == 20
+        classifier = StyleClassifier.fit(vectors, labels)
+        model_path = os.path.join(directory, 'model.npz')
+        classifier.save(model_path)
+        loaded = StyleClassifier.load(model_path)
+
+        assert loaded.fitted and not StyleClassifier.prior().fitted
+        assert loaded.styles == ['Jazz', 'House']
+        style, confidence = loaded.predict(120.0, create_features(mfcc_offset=-40.0))
+        assert style == 'House' and confidence > 0.9
+        assert loaded.predict(120.0, create_features(mfcc_offset=0.0))[1] < 0.9
+
+    print("✅ 拟合与持久化正确")
+
+class RecordingChoreographer:
+    """记录风格推荐请求的编舞器"""
+
+    def __init__(self):
+        self.style_requests = 0
+
+    def generate_choreography_style(self, bpm, audio_features, cache_mode=None):
+        self.style_requests += 1
+        return 'Jazz'
+
+def create_fitted_classifier(styles=('Hip-Hop', 'House', 'Contemporary'), samples=30):
+    """按风格先验附近的样本拟合分类器"""
+    rng = np.random.default_rng(1)
+    vectors, labels = [], []
+    for style in styles:
+        tempo, centroid, energy = STYLE_PRIORS[style]
+        for _ in range(samples):
+            vectors.append(feature_vector(tempo + rng.normal(0, 3), create_features(
+                centroid + rng.normal(0, 100), energy + rng.normal(0, 0.01), rng.normal(0, 5))))
+            labels.append(style)
+    return StyleClassifier.fit(vectors, labels)
+
+def test_outlier_rejection():
+    """测试远离所有质心的输入置信度为0"""
+    print("📏 测试离群拒绝...")
+
+    classifier = create_fitted_classifier()
+    style, confidence = classifier.predict(92.0, create_features(1900.0, 0.20))
+    assert style == 'Hip-Hop' and confidence > 0.9
+    # softmax本身仍会偏向最近的质心，但距离超出训练样本的范围
+    assert classifier.predict(170.0, create_features(3500.0, 0.35)) == ('House', 0.0)
+    assert classifier.predict(40.0, create_features(1500.0, 0.09))[1] == 0.0
+
+    print("✅ 离群拒绝正确")
+
+def test_llm_only_when_fitted_and_confident():
+    """测试先验模型不跳过LLM、拟合模型只在置信度足够时跳过，并抽样核对"""
+    print("📞 测试置信度阈值...")
+
+    original = (config.STYLE_LABELS_PATH, config.STYLE_LABEL_AUDIT_RATE)
+    with tempfile.TemporaryDirectory() as directory:
+        config.STYLE_LABELS_PATH = os.path.join(directory, 'labels.jsonl')
+        config.STYLE_LABEL_AUDIT_RATE = 0.0
+        try:
+            generator = ChoreographyGenerator.__new__(ChoreographyGenerator)
+            generator.llm_choreographer = RecordingChoreographer()
+
+            # 先验模型即使置信度很高也请求LLM，并记录标注
+            generator.style_classifier = StyleClassifier.prior()
+            prior = generator.classify_style(78.0, create_features(1500.0, 0.09))
+            assert prior['source'] == 'llm' and prior['local_style'] == 'Contemporary'
+            assert prior['confidence'] > 0.9
+            assert generator.llm_choreographer.style_requests == 1
+
+            generator.style_classifier = create_fitted_classifier()
+            confident = generator.classify_style(78.0, create_features(1500.0, 0.09))
+            assert confident['source'] == 'local' and confident['style'] == 'Contemporary'
+            assert generator.llm_choreographer.style_requests == 1
+
+            # 离群的输入
+            outlier = generator.classify_style(170.0, create_features(3500.0, 0.35))
+            assert outlier['source'] == 'llm' and outlier['confidence'] == 0.0
+            assert generator.llm_choreographer.style_requests == 2
+
+            # 抽样核对：置信度足够也请求LLM，并记录样本
+            config.STYLE_LABEL_AUDIT_RATE = 1.0
+            audited = generator.classify_style(78.0, create_features(1500.0, 0.09))
+            assert audited['source'] == 'llm' and audited['local_style'] == 'Contemporary'
+            assert generator.llm_choreographer.style_requests == 3
+            assert len(load_labels(config.STYLE_LABELS_PATH)[1]) == 3
+        finally:
+            config.STYLE_LABELS_PATH, config.STYLE_LABEL_AUDIT_RATE = original
+
+    print("✅ 置信度阈值正确")
+
+if __name__ == "__main__":
+    test_prior_model()
+    test_fit_and_persistence()
+    test_outlier_rejection()
+    test_llm_only_when_fitted_and_confident()
+    print("\n🎉 本地风格分类器测试完成！")